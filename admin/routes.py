@@ -1,25 +1,53 @@
-from flask import Blueprint, render_template, jsonify, request, send_file, session, redirect, url_for, flash
-from core.database import Database
-from core.order_manager import OrderManager
-from core.user_manager import UserManager
-from core.menu_manager import MenuManager
-import io
-import csv
+from flask import Blueprint, render_template, jsonify, request, session, redirect, url_for, flash, current_app, Response, stream_with_context
+from core.app_services import service_proxy
+from core.rate_limiter import SHED
+from services.performance_monitor import monitor as performance_monitor
+from services.analytics import AnalyticsService
+from core.menu_sync import file_format_for, read_menu_file
+from utils.validators import parse_date, parse_limit, parse_order_filters
+from utils.formatters import format_line_items, format_sse_event, iter_csv, iter_ndjson, iter_gzip
 from datetime import datetime
 import os
+import shutil
+import tempfile
+import time
 from functools import wraps
-import json
+from werkzeug.local import LocalProxy
 
 admin_bp = Blueprint('admin', __name__, template_folder='../templates/admin')
 
-db = Database()
-order_manager = OrderManager(db)
-user_manager = UserManager(db)
-menu_manager = MenuManager(db)
+# The managers are owned by the app (see create_app) and shared with the
+# webhook, so admin views see the same caches and pools.
+analytics = service_proxy('analytics')
+order_manager = service_proxy('order_manager')
+user_manager = service_proxy('user_manager')
+menu_manager = service_proxy('menu_manager')
+response_cache = service_proxy('response_cache')
+order_changes = service_proxy('order_changes')
+db = service_proxy('db')
+shards = LocalProxy(lambda: current_app.extensions['orderbot'])
+
+ORDER_STREAM_BATCH = 200
+# Views that read through Database.get_read_connection, which may lag the
+# primary by up to DATABASE_READ_MAX_AGE seconds in "backup" read mode.
+SNAPSHOT_ENDPOINTS = {'api_orders', 'api_analytics', 'api_orders_export', 'api_outlets_analytics'}
 
 ADMIN_USERNAME = os.environ.get('ADMIN_USERNAME', 'admin')
 ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', 'admin123')
 
+@admin_bp.after_request
+def report_snapshot_age(response):
+    endpoint = (request.endpoint or '').rsplit('.', 1)[-1]
+    if endpoint not in SNAPSHOT_ENDPOINTS or response.status_code >= 400:
+        return response
+    if endpoint == 'api_outlets_analytics':
+        databases = [services.db for _, services in shards]
+    else:
+        databases = [db._get_current_object()]
+    response.headers['X-Snapshot-Age'] = f'{max(database.snapshot_age() for database in databases):.1f}'
+    response.headers['X-Snapshot-Max-Age'] = f'{max(database.read_max_age for database in databases):.1f}'
+    return response
+
 # --- Auth Decorator ---
 def login_required(f):
     @wraps(f)
@@ -54,39 +82,88 @@ def dashboard():
 @admin_bp.route('/api/orders')
 @login_required
 def api_orders():
-    orders = order_manager.get_all_orders()
-    for o in orders:
-        o['customer_name'] = o.get('user_phone', 'Customer')
-        o['payment_method'] = o.get('payment_method', 'pay_cash')
-    return jsonify({'status': 'success', 'orders': orders})
+    def build():
+        orders, next_cursor = order_manager.list_orders(
+            limit=parse_limit(request.args.get('limit')),
+            cursor=request.args.get('cursor'),
+            **filters
+        )
+        for o in orders:
+            o['customer_name'] = o.get('user_phone', 'Customer')
+            o['payment_method'] = o.get('payment_method', 'pay_cash')
+        return {'status': 'success', 'orders': orders, 'next_cursor': next_cursor}, None
+    try:
+        filters = parse_order_filters(request.args)
+        version, updated_at = order_manager.get_orders_version_info()
+        return response_cache.respond(request.full_path, version, build, updated_at, cache_control='private, no-cache')
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+@admin_bp.route('/api/orders/stream')
+@login_required
+def api_orders_stream():
+    # Sends each order once when it is created and again whenever it
+    # changes. Browsers resume with Last-Event-ID after a reconnect, so a
+    # dashboard only ever receives the orders it has not seen yet.
+    last_seen = request.args.get('since', request.headers.get('Last-Event-ID'))
+    try:
+        since = int(last_seen) if last_seen else order_manager.get_orders_version()
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'since must be an integer version'}), 400
+    max_seconds = current_app.config['ORDER_STREAM_MAX_SECONDS']
+    heartbeat = current_app.config['ORDER_STREAM_HEARTBEAT_SECONDS']
+    limiter = current_app.extensions['order_stream_limiter']
+    if limiter.acquire(None)[0] == SHED:
+        # EventSource clients pick the retry delay up from the body.
+        response = Response(f'retry: {int(heartbeat * 1000)}\n\n', status=503, mimetype='text/event-stream')
+        response.headers['Retry-After'] = str(int(heartbeat))
+        return response
+    # Bound to this request's outlet up front: the stream outlives the
+    # request context, so it must not go through the proxies.
+    manager, notifier = order_manager._get_current_object(), order_changes._get_current_object()
+    def events(since):
+        deadline = time.monotonic() + max_seconds
+        latest = since
+        yield f'retry: 2000\nevent: ready\ndata: {since}\n\n'
+        while True:
+            changes = manager.get_changes(since, limit=ORDER_STREAM_BATCH)
+            for order in changes:
+                order['customer_name'] = order.get('user_phone', 'Customer')
+                order['payment_method'] = order.get('payment_method', 'pay_cash')
+                yield format_sse_event('order', order, event_id=order['version'])
+            if len(changes) == ORDER_STREAM_BATCH:
+                since = changes[-1]['version']
+                continue
+            # Everything up to ``latest`` was committed before the query
+            # ran, so the client is now caught up to at least that version.
+            since = max(changes[-1]['version'] if changes else since, latest)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            latest = notifier.wait(since, min(heartbeat, remaining),
+                                        poll=manager.get_orders_version)
+            if latest <= since:
+                yield ': keepalive\n\n'
+    response = Response(events(since), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    # Runs however the stream ends, including a client that disconnects
+    # before the first event.
+    response.call_on_close(limiter.release)
+    return response
 
 @admin_bp.route('/api/orders/<int:order_id>')
 @login_required
 def api_order_detail(order_id):
-    orders = order_manager.get_all_orders()
-    order = next((o for o in orders if o['id'] == order_id), None)
+    order = order_manager.get_order(order_id)
     if not order:
         return jsonify({'status': 'error', 'message': 'Order not found'}), 404
-    # Parse items JSON and fetch menu details
-    try:
-        items = []
-        cart = order.get('items')
-        if isinstance(cart, str):
-            cart = json.loads(cart)
-        total = 0
-        for item_id, item in cart.items():
-            menu_item = menu_manager.get_item_by_name_or_id(item_id)
-            subtotal = item['price'] * item['quantity']
-            total += subtotal
-            items.append({
-                'name': menu_item['name'] if menu_item else item.get('name', str(item_id)),
-                'quantity': item['quantity'],
-                'price': item['price'],
-                'subtotal': subtotal
-            })
-    except Exception as e:
-        items = []
-    order['items'] = items
+    order['items'] = [{
+        'name': item['name'],
+        'quantity': item['quantity'],
+        'price': item['price'],
+        'subtotal': item['price'] * item['quantity']
+    } for item in order['items']]
     order['customer_name'] = order.get('user_phone', 'Customer')
     order['customer_phone'] = order.get('user_phone', '')
     order['customer_address'] = order.get('delivery_address', '')
@@ -94,40 +171,163 @@ def api_order_detail(order_id):
     order['estimated_delivery'] = order.get('created_at', '')
     return jsonify({'status': 'success', 'order': order})
 
+@admin_bp.route('/api/orders/<int:order_id>/status', methods=['POST'])
+@login_required
+def api_order_status(order_id):
+    data = request.get_json(silent=True) or request.form
+    status = data.get('status', '')
+    try:
+        order = order_manager.update_order_status(order_id, status)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    if not order:
+        return jsonify({'status': 'error', 'message': 'Order not found'}), 404
+    return jsonify({'status': 'success', 'order': order})
+
 @admin_bp.route('/api/analytics')
 @login_required
 def api_analytics():
-    orders = order_manager.get_all_orders()
-    total_orders = len(orders)
-    total_revenue = sum(float(o.get('total_amount', 0)) for o in orders)
-    # Popular items
-    item_counts = {}
-    for o in orders:
-        cart = o.get('items')
-        if isinstance(cart, str):
-            cart = json.loads(cart)
-        for item_id, item in cart.items():
-            name = item.get('name', str(item_id))
-            item_counts[name] = item_counts.get(name, 0) + item['quantity']
-    popular_items = [{'name': k, 'quantity': v} for k, v in sorted(item_counts.items(), key=lambda x: x[1], reverse=True)[:10]]
-    # Payment methods (currently only cash)
-    payment_methods = [{'method': 'pay_cash', 'count': total_orders}]
+    granularity = request.args.get('granularity', 'day')
+    def build():
+        summary = analytics.get_summary(start_date, end_date)
+        timeseries = analytics.get_timeseries(start_date, end_date, granularity)
+        popular_items = [{'name': item['name'], 'quantity': item['quantity']} for item in summary['popular_items']]
+        # Payment methods (currently only cash)
+        payment_methods = [{'method': 'pay_cash', 'count': summary['total_orders']}]
+        return {
+            'status': 'success',
+            'start_date': start_date,
+            'end_date': end_date,
+            'total_orders': summary['total_orders'],
+            'total_revenue': summary['total_revenue'],
+            'popular_items': popular_items,
+            'payment_methods': payment_methods,
+            'status_counts': summary['status_counts'],
+            'timeseries': timeseries
+        }, None
+    try:
+        start_date, end_date = analytics.resolve_range(
+            request.args.get('period'),
+            parse_date(request.args.get('start_date'), 'start_date'),
+            parse_date(request.args.get('end_date'), 'end_date'),
+        )
+        # The rollups only change together with orders. A relative period
+        # resolves to different dates tomorrow, so the dates are part of the key.
+        version, updated_at = order_manager.get_orders_version_info()
+        key = f'{request.full_path}|{start_date}|{end_date}'
+        return response_cache.respond(key, version, build, updated_at, cache_control='private, no-cache')
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+@admin_bp.route('/api/outlets')
+@login_required
+def api_outlets():
+    return jsonify({'status': 'success', 'outlets': [tenant.to_dict() for tenant in shards.tenants.values()]})
+
+@admin_bp.route('/api/outlets/analytics')
+@login_required
+def api_outlets_analytics():
+    # Cross-outlet report: every shard is queried in parallel and the
+    # per-outlet summaries are combined here.
+    try:
+        start_date, end_date = AnalyticsService.resolve_range(
+            request.args.get('period'),
+            parse_date(request.args.get('start_date'), 'start_date'),
+            parse_date(request.args.get('end_date'), 'end_date'),
+        )
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    results = shards.fan_out(lambda services: services.analytics.get_summary(start_date, end_date))
+    outlets = []
+    status_counts = {}
+    popular = {}
+    total_orders = 0
+    total_revenue = 0.0
+    for slug, (summary, error) in results.items():
+        outlet = {'slug': slug, 'name': shards.tenants[slug].name}
+        if error:
+            outlet['error'] = error
+            outlets.append(outlet)
+            continue
+        outlet.update(total_orders=summary['total_orders'], total_revenue=summary['total_revenue'])
+        outlets.append(outlet)
+        total_orders += summary['total_orders']
+        total_revenue += summary['total_revenue']
+        for status, count in summary['status_counts'].items():
+            status_counts[status] = status_counts.get(status, 0) + count
+        # Item ids are per-shard, so outlets' items are combined by name.
+        for item in summary['popular_items']:
+            popular[item['name']] = popular.get(item['name'], 0) + item['quantity']
+    popular_items = sorted(({'name': name, 'quantity': quantity} for name, quantity in popular.items()),
+                           key=lambda item: item['quantity'], reverse=True)[:10]
     return jsonify({
         'status': 'success',
+        'start_date': start_date,
+        'end_date': end_date,
         'total_orders': total_orders,
         'total_revenue': total_revenue,
         'popular_items': popular_items,
-        'payment_methods': payment_methods
+        'status_counts': status_counts,
+        'outlets': outlets,
     })
 
+@admin_bp.route('/api/menu/sync', methods=['POST'])
+@login_required
+def api_menu_sync():
+    # Takes the menu file as a multipart upload ("file") or as the raw
+    # request body; ?full=1 disables items missing from the file and
+    # ?dry_run=1 only reports what would change.
+    upload = request.files.get('file')
+    if upload:
+        stream = upload.stream
+        file_format = request.args.get('format') or file_format_for(upload.filename or '')
+    else:
+        # Spooled first so a slow upload doesn't hold the write lock that
+        # sync_items takes while it reads the rows.
+        stream = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        shutil.copyfileobj(request.stream, stream)
+        stream.seek(0)
+        file_format = request.args.get('format') or {'text/csv': 'csv', 'application/x-ndjson': 'ndjson'}.get(
+            request.mimetype, 'json')
+    try:
+        summary = menu_manager.sync_items(
+            read_menu_file(stream, file_format),
+            full=request.args.get('full') in ('1', 'true'),
+            dry_run=request.args.get('dry_run') in ('1', 'true'),
+        )
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify({'status': 'success', 'dry_run': request.args.get('dry_run') in ('1', 'true'), **summary})
+
+@admin_bp.route('/api/metrics')
+@login_required
+def api_metrics():
+    return jsonify({'status': 'success', 'metrics': performance_monitor.snapshot()})
+
 @admin_bp.route('/api/orders/export')
 @login_required
 def api_orders_export():
-    orders = order_manager.get_all_orders()
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['Order ID', 'Customer', 'Amount', 'Status', 'Date'])
-    for o in orders:
-        writer.writerow([o['id'], o.get('user_phone', ''), o.get('total_amount', ''), o.get('status', ''), o.get('created_at', '')])
-    output.seek(0)
-    return send_file(io.BytesIO(output.getvalue().encode()), mimetype='text/csv', as_attachment=True, download_name=f'orders_{datetime.now().date()}.csv')
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({'status': 'error', 'message': 'format must be csv or ndjson'}), 400
+    try:
+        filters = parse_order_filters(request.args)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    orders = order_manager.iter_orders(**filters)
+    if export_format == 'csv':
+        rows = ([o['id'], o.get('user_phone', ''), o.get('total_amount', ''), o.get('status', ''), o.get('created_at', ''),
+                 format_line_items(o['items'])] for o in orders)
+        chunks = iter_csv(['Order ID', 'Customer', 'Amount', 'Status', 'Date', 'Items'], rows)
+        mimetype = 'text/csv'
+    else:
+        chunks = iter_ndjson(orders)
+        mimetype = 'application/x-ndjson'
+    filename = f'orders_{datetime.now().date()}.{export_format}'
+    if request.args.get('gzip') in ('1', 'true'):
+        chunks = iter_gzip(chunks)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
@@ -1,180 +1,95 @@
-from flask import Flask, request, jsonify
-from twilio.rest import Client
+from flask import Blueprint, Flask, abort, current_app, g, request, jsonify
+from twilio.request_validator import RequestValidator
 from twilio.twiml.messaging_response import MessagingResponse
+import logging
 import os
 from datetime import datetime
-import json
-import re
-from core.database import Database
-from core.menu_manager import MenuManager
-from core.order_manager import OrderManager
-from core.user_manager import UserManager
+from core.app_services import service_proxy
+from core.rate_limiter import LIMITED, SHED, WebhookLimiter
+from core.tenancy import ShardMap
+from services.performance_monitor import monitor as performance_monitor
+from utils.validators import parse_limit, parse_order_filters
 from config import Config
 from admin import admin_bp
 
-app = Flask(__name__)
-app.config.from_object(Config)
+logger = logging.getLogger(__name__)
 
-twilio_client = Client(Config.TWILIO_ACCOUNT_SID, Config.TWILIO_AUTH_TOKEN)
+public_bp = Blueprint('public', __name__)
 
-db = Database()
-menu_manager = MenuManager(db)
-order_manager = OrderManager(db)
-user_manager = UserManager(db)
+db = service_proxy('db')
+menu_manager = service_proxy('menu_manager')
+order_manager = service_proxy('order_manager')
+user_manager = service_proxy('user_manager')
+notification_manager = service_proxy('notification_manager')
+sessions = service_proxy('sessions')
+bot = service_proxy('bot')
+dedup_store = service_proxy('dedup_store')
+message_dispatcher = service_proxy('message_dispatcher')
+response_cache = service_proxy('response_cache')
 
-app.register_blueprint(admin_bp)
+def build_twiml(text=None):
+    response = MessagingResponse()
+    if text:
+        response.message(text)
+    return str(response)
 
-USER_STATES = {
-    'MENU_BROWSING': 'menu_browsing',
-    'ADDING_TO_CART': 'adding_to_cart',
-    'QUANTITY_INPUT': 'quantity_input',
-    'LOCATION_INPUT': 'location_input',
-    'ORDER_CONFIRMATION': 'order_confirmation'
-}
+# Prebuilt so turning a message away costs no TwiML rendering.
+EMPTY_TWIML = build_twiml()
+SLOW_DOWN_TWIML = build_twiml("⏳ You're sending messages too fast. Please wait a moment and try again.")
+BUSY_TWIML = build_twiml("🙏 We're very busy right now. Please try again in a minute.")
 
-class WhatsAppBot:
-    def __init__(self):
-        self.user_sessions = {}
-    def get_user_state(self, phone_number):
-        return self.user_sessions.get(phone_number, {
-            'state': USER_STATES['MENU_BROWSING'],
-            'cart': {},
-            'current_item': None,
-            'location': None
-        })
-    def update_user_state(self, phone_number, state_data):
-        self.user_sessions[phone_number] = state_data
-    def process_message(self, phone_number, message_body):
-        user = user_manager.get_or_create_user(phone_number)
-        user_state = self.get_user_state(phone_number)
-        message_body = message_body.strip().lower()
-        if user_state['state'] == USER_STATES['MENU_BROWSING']:
-            return self.handle_menu_browsing(phone_number, message_body, user_state)
-        elif user_state['state'] == USER_STATES['QUANTITY_INPUT']:
-            return self.handle_quantity_input(phone_number, message_body, user_state)
-        elif user_state['state'] == USER_STATES['LOCATION_INPUT']:
-            return self.handle_location_input(phone_number, message_body, user_state)
-        elif user_state['state'] == USER_STATES['ORDER_CONFIRMATION']:
-            return self.handle_order_confirmation(phone_number, message_body, user_state)
-        else:
-            return self.handle_menu_browsing(phone_number, message_body, user_state)
-    def handle_menu_browsing(self, phone_number, message_body, user_state):
-        if message_body in ['hi', 'hello', 'hey', 'start', 'menu']:
-            return self.show_welcome_menu()
-        elif message_body == 'cart':
-            return self.show_cart(user_state)
-        elif message_body == 'checkout':
-            if not user_state['cart']:
-                return "🛒 Your cart is empty! Browse our menu first."
-            user_state['state'] = USER_STATES['LOCATION_INPUT']
-            self.update_user_state(phone_number, user_state)
-            return "📍 Please share your delivery location (address):"
-        elif message_body == 'clear':
-            user_state['cart'] = {}
-            self.update_user_state(phone_number, user_state)
-            return "🗑️ Cart cleared! What would you like to order?"
-        else:
-            item = menu_manager.get_item_by_name_or_id(message_body)
-            if item:
-                user_state['current_item'] = item
-                user_state['state'] = USER_STATES['QUANTITY_INPUT']
-                self.update_user_state(phone_number, user_state)
-                return f"🍽️ *{item['name']}* - ₹{item['price']}\n\n{item['description']}\n\nHow many would you like to order?"
-            else:
-                return self.show_help_message()
-    def handle_quantity_input(self, phone_number, message_body, user_state):
+def create_app(config=Config, shards=None):
+    # Builds the Flask app around one AppServices per tenant. Schema setup
+    # and warm-up are separate steps (see gunicorn.conf.py) so importing
+    # the app stays cheap and does no I/O.
+    app = Flask(__name__)
+    app.config.from_object(config)
+    performance_monitor.configure(slow_query_ms=config.SLOW_QUERY_MS)
+    performance_monitor.init_app(app)
+    shards = shards or ShardMap.from_config(config)
+    shards.register_collectors(performance_monitor)
+    app.extensions['orderbot'] = shards
+    # One limiter per process, shared by all outlets: the concurrency cap
+    # protects this worker's threads whichever outlet a message is for.
+    limiter = WebhookLimiter(
+        rate=config.WEBHOOK_RATE_PER_SECOND,
+        burst=config.WEBHOOK_RATE_BURST,
+        max_concurrent=config.WEBHOOK_MAX_CONCURRENT,
+        max_entries=config.WEBHOOK_RATE_MAX_NUMBERS,
+    )
+    performance_monitor.register_collector('webhook_limiter', limiter.stats)
+    app.extensions['webhook_limiter'] = limiter
+    # A live order feed keeps its thread for up to ORDER_STREAM_MAX_SECONDS;
+    # capping them per worker leaves threads for the webhook.
+    stream_limiter = WebhookLimiter(rate=0, max_concurrent=config.ORDER_STREAM_MAX_CLIENTS)
+    performance_monitor.register_collector('order_stream_limiter', stream_limiter.stats)
+    app.extensions['order_stream_limiter'] = stream_limiter
+    @app.url_value_preprocessor
+    def pull_tenant(endpoint, values):
+        if values and 'tenant' in values:
+            g.tenant_slug = values.pop('tenant')
+    @app.before_request
+    def select_tenant():
+        # /t/<tenant>/... picks the outlet explicitly; otherwise a webhook
+        # is routed by the WhatsApp number it was sent to.
+        number = None
+        if request.endpoint in ('public.webhook', 'tenant_public.webhook'):
+            number = request.form.get('To', '').replace('whatsapp:', '')
+        slug = g.pop('tenant_slug', None)
         try:
-            quantity = int(message_body)
-            if quantity <= 0:
-                return "❌ Please enter a valid quantity (greater than 0)."
-            item = user_state['current_item']
-            item_id = item['id']
-            if item_id in user_state['cart']:
-                user_state['cart'][item_id]['quantity'] += quantity
-            else:
-                user_state['cart'][item_id] = {
-                    'name': item['name'],
-                    'price': item['price'],
-                    'quantity': quantity
-                }
-            user_state['state'] = USER_STATES['MENU_BROWSING']
-            user_state['current_item'] = None
-            self.update_user_state(phone_number, user_state)
-            return f"✅ Added {quantity} x {item['name']} to cart!\n\nType 'cart' to view cart or 'menu' to continue ordering."
-        except ValueError:
-            return "❌ Please enter a valid number for quantity."
-    def handle_location_input(self, phone_number, message_body, user_state):
-        if len(message_body) < 10:
-            return "❌ Please provide a detailed address with area/landmark."
-        user_state['location'] = message_body
-        user_state['state'] = USER_STATES['ORDER_CONFIRMATION']
-        self.update_user_state(phone_number, user_state)
-        return self.show_order_summary(user_state)
-    def handle_order_confirmation(self, phone_number, message_body, user_state):
-        if message_body in ['yes', 'y', 'confirm', 'order']:
-            order_id = order_manager.create_order(
-                phone_number, 
-                user_state['cart'], 
-                user_state['location']
-            )
-            user_state['cart'] = {}
-            user_state['state'] = USER_STATES['MENU_BROWSING']
-            user_state['location'] = None
-            self.update_user_state(phone_number, user_state)
-            return f"🎉 Order confirmed! Order ID: #{order_id}\n\n💰 Payment: Cash on Delivery\n⏰ Estimated delivery: 30-45 minutes\n\nThank you for ordering with us!"
-        elif message_body in ['no', 'n', 'cancel']:
-            user_state['state'] = USER_STATES['MENU_BROWSING']
-            self.update_user_state(phone_number, user_state)
-            return "❌ Order cancelled. Type 'menu' to start over."
-        else:
-            return "Please reply with 'yes' to confirm or 'no' to cancel the order."
-    def show_welcome_menu(self):
-        menu_text = "🍽️ *Welcome to Tasty Bites Restaurant!*\n\n"
-        menu_text += "📋 *Our Menu:*\n\n"
-        categories = menu_manager.get_menu_by_category()
-        for category, items in categories.items():
-            menu_text += f"*{category}:*\n"
-            for item in items:
-                menu_text += f"• {item['name']} - ₹{item['price']}\n"
-            menu_text += "\n"
-        menu_text += "💡 *How to order:*\n"
-        menu_text += "• Type item name to add to cart\n"
-        menu_text += "• Type 'cart' to view your cart\n"
-        menu_text += "• Type 'checkout' to place order\n"
-        menu_text += "• Type 'clear' to empty cart\n"
-        return menu_text
-    def show_cart(self, user_state):
-        if not user_state['cart']:
-            return "🛒 Your cart is empty! Browse our menu to add items."
-        cart_text = "🛒 *Your Cart:*\n\n"
-        total = 0
-        for item_id, item in user_state['cart'].items():
-            subtotal = item['price'] * item['quantity']
-            total += subtotal
-            cart_text += f"• {item['name']} x{item['quantity']} - ₹{subtotal}\n"
-        cart_text += f"\n💰 *Total: ₹{total}*\n\n"
-        cart_text += "Type 'checkout' to proceed with order or continue browsing!"
-        return cart_text
-    def show_order_summary(self, user_state):
-        summary = "📋 *Order Summary:*\n\n"
-        total = 0
-        for item_id, item in user_state['cart'].items():
-            subtotal = item['price'] * item['quantity']
-            total += subtotal
-            summary += f"• {item['name']} x{item['quantity']} - ₹{subtotal}\n"
-        summary += f"\n💰 *Total: ₹{total}*\n"
-        summary += f"📍 *Delivery Address:* {user_state['location']}\n"
-        summary += f"💳 *Payment:* Cash on Delivery\n\n"
-        summary += "Reply 'yes' to confirm or 'no' to cancel."
-        return summary
-    def show_help_message(self):
-        return ("❓ I didn't understand that. Try:\n\n"
-                "• Type 'menu' to see our menu\n"
-                "• Type an item name to order\n"
-                "• Type 'cart' to view your cart\n"
-                "• Type 'checkout' to place order")
-bot = WhatsAppBot()
-@app.route('/')
+            g.orderbot = shards.resolve(slug, number)
+        except KeyError:
+            if slug is not None:
+                abort(404)
+            # No default outlet: only cross-outlet views can be served.
+            g.orderbot = None
+    app.register_blueprint(public_bp)
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(public_bp, url_prefix='/t/<tenant>', name='tenant_public')
+    app.register_blueprint(admin_bp, url_prefix='/t/<tenant>', name='tenant_admin')
+    return app
+
+@public_bp.route('/')
 def home():
     return '''
     <h1>Welcome to the WhatsApp Order Bot!</h1>
@@ -185,37 +100,87 @@ def home():
     </ul>
     <p>See the README for setup and testing instructions.</p>
     '''
-@app.route('/webhook', methods=['POST'])
+@public_bp.route('/webhook', methods=['POST'])
 def webhook():
+    if current_app.config['TWILIO_VALIDATE_SIGNATURE']:
+        validator = RequestValidator(current_app.config['TWILIO_AUTH_TOKEN'])
+        if not validator.validate(request.url, request.form, request.headers.get('X-Twilio-Signature', '')):
+            return 'Invalid signature', 403
     try:
         phone_number = request.form.get('From', '').replace('whatsapp:', '')
         message_body = request.form.get('Body', '')
-        response_text = bot.process_message(phone_number, message_body)
-        response = MessagingResponse()
-        response.message(response_text)
-        return str(response)
+        message_sid = request.form.get('MessageSid')
+        if not phone_number:
+            return 'Missing sender', 400
+        # Rejected messages get a 200 so Twilio doesn't retry them into
+        # the same overload.
+        limiter = current_app.extensions['webhook_limiter']
+        outcome, first = limiter.acquire(phone_number)
+        if outcome == LIMITED:
+            return SLOW_DOWN_TWIML if first else EMPTY_TWIML
+        if outcome == SHED:
+            return BUSY_TWIML
+        try:
+            return handle_message(phone_number, message_body, message_sid)
+        finally:
+            limiter.release()
     except Exception as e:
-        print(f"Error processing webhook: {e}")
+        logger.exception(f"Error processing webhook: {e}")
         response = MessagingResponse()
         response.message("Sorry, something went wrong. Please try again.")
         return str(response)
-@app.route('/status', methods=['GET'])
+def handle_message(phone_number, message_body, message_sid):
+    # Twilio retries a webhook it thinks timed out; replaying the same
+    # MessageSid could add items twice or place a second order.
+    if message_sid and dedup_store.seen(message_sid):
+        return EMPTY_TWIML
+    if current_app.config['WEBHOOK_ASYNC'] and message_dispatcher.submit(phone_number, message_body):
+        return EMPTY_TWIML
+    with performance_monitor.timer('webhook_stage_duration_seconds', stage='process'):
+        response_text = bot.process_message(phone_number, message_body)
+    with performance_monitor.timer('webhook_stage_duration_seconds', stage='twiml'):
+        response = MessagingResponse()
+        response.message(response_text)
+        return str(response)
+@public_bp.route('/metrics', methods=['GET'])
+def metrics():
+    return performance_monitor.metrics_response()
+@public_bp.route('/status', methods=['GET'])
 def status():
     return jsonify({
         'status': 'running',
         'timestamp': datetime.now().isoformat(),
         'total_users': user_manager.get_total_users(),
-        'total_orders': order_manager.get_total_orders()
+        'total_orders': order_manager.get_total_orders(),
+        'database_pool': db.pool_stats(),
+        'sessions': sessions.stats(),
+        'notifications': notification_manager.stats()
     })
-@app.route('/orders', methods=['GET'])
+@public_bp.route('/orders', methods=['GET'])
 def get_orders():
-    orders = order_manager.get_all_orders()
-    return jsonify(orders)
-@app.route('/menu', methods=['GET'])
+    def build():
+        orders, next_cursor = order_manager.list_orders(
+            limit=parse_limit(request.args.get('limit')),
+            cursor=request.args.get('cursor'),
+            **filters
+        )
+        return orders, {'X-Next-Cursor': next_cursor} if next_cursor else None
+    try:
+        filters = parse_order_filters(request.args)
+        version, updated_at = order_manager.get_orders_version_info()
+        return response_cache.respond(request.full_path, version, build, updated_at, cache_control='private, no-cache')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+@public_bp.route('/menu', methods=['GET'])
 def get_menu():
-    menu = menu_manager.get_all_items()
-    return jsonify(menu)
+    catalog = menu_manager.get_catalog()
+    return response_cache.respond(
+        request.full_path, catalog.version, lambda: (menu_manager.get_all_items(), None), catalog.updated_at,
+        cache_control=f"public, max-age={current_app.config['MENU_CACHE_MAX_AGE']}",
+    )
+app = create_app()
+
 if __name__ == '__main__':
-    db.init_db()
-    menu_manager.load_sample_menu()
+    app.extensions['orderbot'].prepare_database()
+    app.extensions['orderbot'].start()
     app.run(debug=True, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
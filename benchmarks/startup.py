@@ -0,0 +1,116 @@
+"""Startup-time benchmark.
+
+Measures, each in a fresh interpreter, how long it takes to import the app
+module, prepare the database (schema + sample menu), warm up the shared
+state and answer the first /webhook message, and compares the first
+message with and without warm-up. With --gunicorn it also times how long
+a spawned gunicorn takes to answer /status with and without --preload.
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 10 --gunicorn --workers 4
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+def measure_child(warm_up):
+    timings = {}
+    started = time.perf_counter()
+    import app as appmod
+    timings['import_ms'] = (time.perf_counter() - started) * 1000
+    shards = appmod.app.extensions['orderbot']
+    started = time.perf_counter()
+    shards.prepare_database()
+    timings['prepare_database_ms'] = (time.perf_counter() - started) * 1000
+    if warm_up:
+        started = time.perf_counter()
+        shards.warm_up()
+        timings['warm_up_ms'] = (time.perf_counter() - started) * 1000
+    client = appmod.app.test_client()
+    started = time.perf_counter()
+    client.post('/webhook', data={'From': 'whatsapp:+10000000000', 'Body': 'hi'})
+    timings['first_message_ms'] = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    client.post('/webhook', data={'From': 'whatsapp:+10000000001', 'Body': 'hi'})
+    timings['second_message_ms'] = (time.perf_counter() - started) * 1000
+    return timings
+
+def run_child(db_path, warm_up):
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}')
+    env.setdefault('TWILIO_ACCOUNT_SID', 'ACbenchmark')
+    env.setdefault('TWILIO_AUTH_TOKEN', 'benchmark')
+    args = [sys.executable, '-m', 'benchmarks.startup', '--child']
+    if warm_up:
+        args.append('--warm-up')
+    output = subprocess.run(args, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def time_gunicorn(db_path, workers, preload, timeout=60.0):
+    port = free_port()
+    # WEB_CONCURRENCY rather than --workers, so gunicorn.conf.py shares
+    # sessions and dedup through sqlite when there are several workers.
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}', GUNICORN_PRELOAD=str(preload),
+               WEB_CONCURRENCY=str(workers))
+    env.setdefault('TWILIO_ACCOUNT_SID', 'ACbenchmark')
+    env.setdefault('TWILIO_AUTH_TOKEN', 'benchmark')
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}',
+                               'app:app'], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/status', timeout=2):
+                    return (time.perf_counter() - started) * 1000
+            except Exception:
+                time.sleep(0.02)
+        raise RuntimeError('gunicorn did not become ready')
+    finally:
+        server.terminate()
+        server.wait()
+
+def summarize(samples):
+    keys = sorted({key for sample in samples for key in sample})
+    return {key: round(statistics.median(sample[key] for sample in samples if key in sample), 1) for key in keys}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='App startup benchmark')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--gunicorn', action='store_true', help='also time a spawned gunicorn until /status answers')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--warm-up', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        print(json.dumps(measure_child(args.warm_up)))
+        return 0
+
+    workdir = tempfile.mkdtemp(prefix='orderbot-startup-')
+    for warm_up in (False, True):
+        # The first run creates the schema; later runs measure a restart
+        # against an existing database, which is the common case.
+        db_path = os.path.join(workdir, f'startup-{int(warm_up)}.db')
+        samples = [run_child(db_path, warm_up) for _ in range(args.runs)]
+        print(f"{'with' if warm_up else 'without'} warm-up (median of {args.runs}): {summarize(samples[1:] or samples)}")
+    if args.gunicorn:
+        for preload in (False, True):
+            db_path = os.path.join(workdir, f'gunicorn-{int(preload)}.db')
+            samples = [time_gunicorn(db_path, args.workers, preload) for _ in range(args.runs)]
+            print(f"gunicorn {'--preload' if preload else 'no preload'}, {args.workers} workers: "
+                  f"ready in {round(statistics.median(samples), 1)} ms (median of {args.runs})")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,323 @@
+"""Load test for the /webhook conversation flow.
+
+Runs scripted customer conversations (hi -> item -> quantity -> checkout ->
+address -> yes) from many simulated phone numbers, either in-process via
+the Flask test client or over HTTP against a running or spawned gunicorn,
+and reports throughput, per-step latency percentiles, database round trips
+per message and peak RSS. Results can be saved as a JSON baseline and
+compared against a previous run.
+
+    python -m benchmarks.webhook_load --conversations 2000 --concurrency 32
+    python -m benchmarks.webhook_load --mode http --spawn-gunicorn --workers 4
+    python -m benchmarks.webhook_load --save benchmarks/baselines/local.json
+    python -m benchmarks.webhook_load --compare benchmarks/baselines/local.json
+"""
+import argparse
+import json
+import os
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+STEPS = ('greeting', 'item', 'quantity', 'checkout', 'address', 'confirm')
+# What each step's reply must contain; anything else means the
+# conversation went off script (lost session, misparsed item, ...).
+EXPECTED_REPLIES = {
+    'greeting': 'Welcome to',
+    'item': 'How many would you like',
+    'quantity': 'to cart',
+    'checkout': 'delivery location',
+    'address': 'Order Summary',
+    'confirm': 'Order confirmed',
+}
+BENCHMARK_PHONE_PREFIX = '+9180000'
+ROUND_TRIPS_RE = re.compile(r'round trips (\d+)')
+
+CATEGORIES = ['Appetizers', 'Main Course', 'Breads', 'Rice', 'Beverages', 'Desserts', 'Combos', 'Specials']
+ADJECTIVES = ['Spicy', 'Classic', 'Smoky', 'Crispy', 'Creamy', 'Tandoori', 'Royal', 'Garlic', 'Masala', 'Herbed']
+DISHES = ['Paneer', 'Chicken', 'Mutton', 'Prawn', 'Mushroom', 'Aloo', 'Gobi', 'Fish', 'Egg', 'Veg']
+STYLES = ['Tikka', 'Curry', 'Biryani', 'Kebab', 'Roll', 'Pulao', 'Korma', 'Fry', 'Masala', 'Bowl']
+
+def synthetic_menu(size, seed):
+    rng = random.Random(seed)
+    seen = set()
+    items = []
+    while len(items) < size:
+        name = f'{rng.choice(ADJECTIVES)} {rng.choice(DISHES)} {rng.choice(STYLES)}'
+        if name in seen:
+            name = f'{name} {len(items)}'
+        seen.add(name)
+        items.append((name, f'House special {name.lower()}', rng.randrange(40, 600, 10), rng.choice(CATEGORIES)))
+    return items
+
+def seed_database(db_path, menu_size, order_count, seed):
+    from core.database import Database
+    from core.order_manager import OrderManager
+    from services.analytics import AnalyticsService
+    db = Database(db_path)
+    db.init_db()
+    rng = random.Random(seed)
+    with db.get_connection() as conn:
+        conn.executemany('INSERT INTO menu_items (name, description, price, category) VALUES (?, ?, ?, ?)',
+                         synthetic_menu(menu_size, seed))
+        db.bump_version(conn, 'menu')
+        menu = [dict(row) for row in conn.execute('SELECT id, name, price FROM menu_items')]
+        phones = [f'+9170000{index:05d}' for index in range(max(1, order_count // 5))]
+        conn.executemany('INSERT OR IGNORE INTO users (phone_number) VALUES (?)', [(phone,) for phone in phones])
+        started = datetime.utcnow() - timedelta(days=180)
+        orders = []
+        for index in range(order_count):
+            cart = {}
+            for item in rng.sample(menu, k=min(len(menu), rng.randint(1, 4))):
+                cart[str(item['id'])] = {'name': item['name'], 'price': item['price'], 'quantity': rng.randint(1, 3)}
+            total = sum(line['price'] * line['quantity'] for line in cart.values())
+            created_at = (started + timedelta(seconds=index * 180 * 86400 // max(1, order_count))).strftime('%Y-%m-%d %H:%M:%S')
+            orders.append((rng.choice(phones), json.dumps(cart), total, 'Benchmark street, near the park', created_at))
+        conn.executemany('''
+            INSERT INTO orders (user_phone, items, total_amount, delivery_address, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', orders)
+        conn.commit()
+    OrderManager(db).migrate_order_items()
+    AnalyticsService(db).backfill()
+    db.close()
+    return [item['name'] for item in menu]
+
+def script_for(rng, menu_names):
+    return [
+        ('greeting', 'hi'),
+        ('item', rng.choice(menu_names)),
+        ('quantity', str(rng.randint(1, 3))),
+        ('checkout', 'checkout'),
+        ('address', f'{rng.randint(1, 999)} Benchmark Road, near City Park'),
+        ('confirm', 'yes'),
+    ]
+
+class InProcessClient:
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+    def post(self, phone, body):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.post('/webhook', data={'From': f'whatsapp:{phone}', 'Body': body,
+                                                 'MessageSid': f'SM{os.urandom(8).hex()}'})
+        return response.status_code, response.headers.get('Server-Timing', ''), response.get_data(as_text=True)
+
+class HttpClient:
+    def __init__(self, url):
+        self.url = url.rstrip('/') + '/webhook'
+    def post(self, phone, body):
+        data = urllib.parse.urlencode({'From': f'whatsapp:{phone}', 'Body': body,
+                                       'MessageSid': f'SM{os.urandom(8).hex()}'}).encode()
+        with urllib.request.urlopen(self.url, data=data, timeout=30) as response:
+            return response.status, response.headers.get('Server-Timing', ''), response.read().decode()
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+def run_load(client, menu_names, conversations, concurrency, seed):
+    latencies = {step: [] for step in STEPS}
+    round_trips = {step: [] for step in STEPS}
+    errors = []
+    lock = threading.Lock()
+    def converse(index):
+        rng = random.Random(seed + index)
+        phone = f'{BENCHMARK_PHONE_PREFIX}{index:06d}'
+        for step, body in script_for(rng, menu_names):
+            started = time.perf_counter()
+            try:
+                status, timing, reply = client.post(phone, body)
+            except Exception as e:
+                with lock:
+                    errors.append(f'{step}: {e}')
+                return
+            elapsed = time.perf_counter() - started
+            match = ROUND_TRIPS_RE.search(timing)
+            with lock:
+                latencies[step].append(elapsed)
+                if match:
+                    round_trips[step].append(int(match.group(1)))
+            # The rest of a conversation that went off script would only
+            # measure error replies.
+            if status != 200:
+                with lock:
+                    errors.append(f'{phone} {step}: HTTP {status}')
+                return
+            if EXPECTED_REPLIES[step] not in reply:
+                with lock:
+                    errors.append(f'{phone} {step} {body!r}: unexpected reply {reply[:120]!r}')
+                return
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(converse, range(conversations)))
+    return time.perf_counter() - started, latencies, round_trips, errors
+
+def count_orders(db_path):
+    # Orders placed by the benchmark's phone numbers, read straight from
+    # the file so it doesn't depend on the server under test.
+    import sqlite3
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute('SELECT COUNT(*) FROM orders WHERE user_phone LIKE ?',
+                            (f'{BENCHMARK_PHONE_PREFIX}%',)).fetchone()[0]
+    finally:
+        conn.close()
+
+def summarize(args, elapsed, latencies, round_trips, errors, peak_rss_kb):
+    messages = sum(len(values) for values in latencies.values())
+    all_latencies = [value for values in latencies.values() for value in values]
+    steps = {}
+    for step in STEPS:
+        values = latencies[step]
+        trips = round_trips[step]
+        steps[step] = {
+            'count': len(values),
+            'p50_ms': round(percentile(values, 0.50) * 1000, 3),
+            'p95_ms': round(percentile(values, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(values, 0.99) * 1000, 3),
+            'db_round_trips_mean': round(sum(trips) / len(trips), 2) if trips else None,
+        }
+    return {
+        'timestamp': datetime.utcnow().isoformat(timespec='seconds'),
+        'mode': args.mode,
+        'conversations': args.conversations,
+        'concurrency': args.concurrency,
+        'menu_items': args.menu_items,
+        'seed_orders': args.seed_orders,
+        'elapsed_s': round(elapsed, 3),
+        'messages': messages,
+        'throughput_msgs_per_s': round(messages / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(all_latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(all_latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(all_latencies, 0.99) * 1000, 3),
+        'errors': len(errors),
+        'peak_rss_mb': round(peak_rss_kb / 1024, 1),
+        'steps': steps,
+    }
+
+def print_report(report):
+    print(f"{report['messages']} messages in {report['elapsed_s']}s "
+          f"({report['throughput_msgs_per_s']} msg/s), errors: {report['errors']}, "
+          f"orders placed: {report['orders_placed']}, peak RSS {report['peak_rss_mb']} MB")
+    print(f"overall p50 {report['p50_ms']} ms  p95 {report['p95_ms']} ms  p99 {report['p99_ms']} ms")
+    print(f"{'step':<10}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'db trips':>10}")
+    for step, stats in report['steps'].items():
+        trips = '-' if stats['db_round_trips_mean'] is None else stats['db_round_trips_mean']
+        print(f"{step:<10}{stats['count']:>8}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}{trips:>10}")
+
+def compare(report, baseline, tolerance):
+    regressions = []
+    if report['throughput_msgs_per_s'] < baseline['throughput_msgs_per_s'] * (1 - tolerance):
+        regressions.append(f"throughput {baseline['throughput_msgs_per_s']} -> {report['throughput_msgs_per_s']} msg/s")
+    for step, stats in report['steps'].items():
+        before = baseline.get('steps', {}).get(step)
+        if before and before['p95_ms'] and stats['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{step} p95 {before['p95_ms']} -> {stats['p95_ms']} ms")
+    return regressions
+
+def wait_for_server(url, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url.rstrip('/') + '/status', timeout=2):
+                return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError(f'Server at {url} did not become ready')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Webhook conversation load test')
+    parser.add_argument('--mode', choices=['inprocess', 'http'], default='inprocess')
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--spawn-gunicorn', action='store_true', help='start a local gunicorn on --url for http mode')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers when spawning')
+    parser.add_argument('--conversations', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--menu-items', type=int, default=200)
+    parser.add_argument('--seed-orders', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database', help='database file to seed (defaults to a temporary file)')
+    parser.add_argument('--save', help='write the report to this JSON file')
+    parser.add_argument('--compare', help='compare against a saved JSON baseline')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed relative regression')
+    args = parser.parse_args(argv)
+
+    db_path = args.database or os.path.join(tempfile.mkdtemp(prefix='orderbot-bench-'), 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ.setdefault('TWILIO_ACCOUNT_SID', 'ACbenchmark')
+    os.environ.setdefault('TWILIO_AUTH_TOKEN', 'benchmark')
+    # Measure the full message path; a shed "busy" reply would look like a fast success.
+    os.environ.setdefault('WEBHOOK_MAX_CONCURRENT', '0')
+    # Replies are checked, so they have to come back in the webhook response.
+    os.environ['WEBHOOK_ASYNC'] = 'False'
+    print(f'Seeding {db_path}: {args.menu_items} menu items, {args.seed_orders} orders')
+    menu_names = seed_database(db_path, args.menu_items, args.seed_orders, args.seed)
+
+    server = None
+    if args.mode == 'inprocess':
+        from app import app
+        client = InProcessClient(app)
+    else:
+        if args.spawn_gunicorn:
+            bind = urllib.parse.urlparse(args.url).netloc
+            # Through WEB_CONCURRENCY rather than --workers, so gunicorn.conf.py
+            # switches sessions and dedup to sqlite when there are several.
+            env = dict(os.environ, WEB_CONCURRENCY=str(args.workers))
+            if args.workers > 1:
+                env.setdefault('SESSION_BACKEND', 'sqlite')
+                env.setdefault('WEBHOOK_DEDUP_BACKEND', 'sqlite')
+            server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--bind', bind, '--threads', '4',
+                                       '-c', 'gunicorn.conf.py', 'app:app'], env=env)
+        wait_for_server(args.url)
+        client = HttpClient(args.url)
+    orders_before = count_orders(db_path)
+    try:
+        elapsed, latencies, round_trips, errors = run_load(client, menu_names, args.conversations, args.concurrency, args.seed)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    usage = resource.RUSAGE_CHILDREN if server is not None else resource.RUSAGE_SELF
+    peak_rss_kb = resource.getrusage(usage).ru_maxrss
+    report = summarize(args, elapsed, latencies, round_trips, errors, peak_rss_kb)
+    report['orders_placed'] = count_orders(db_path) - orders_before
+    print_report(report)
+    if errors:
+        print(f'First errors: {errors[:5]}')
+    if errors or report['orders_placed'] != args.conversations:
+        print(f"FAILED: {report['orders_placed']} orders placed for {args.conversations} conversations, "
+              f"{len(errors)} conversations went off script; the timings above are not valid", file=sys.stderr)
+        return 1
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w') as handle:
+            json.dump(report, handle, indent=2)
+        print(f'Saved baseline to {args.save}')
+    if args.compare:
+        with open(args.compare) as handle:
+            regressions = compare(report, json.load(handle), args.tolerance)
+        if regressions:
+            print('Regressions against baseline:')
+            for regression in regressions:
+                print(f'  {regression}')
+            return 1
+        print('No regressions against baseline.')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
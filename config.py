@@ -8,8 +8,62 @@ class Config:
     TWILIO_ACCOUNT_SID = os.environ.get('TWILIO_ACCOUNT_SID')
     TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN')
     TWILIO_PHONE_NUMBER = os.environ.get('TWILIO_PHONE_NUMBER')
+    TWILIO_VALIDATE_SIGNATURE = os.environ.get('TWILIO_VALIDATE_SIGNATURE', 'False').lower() == 'true'
+    # Webhook Configuration
+    WEBHOOK_ASYNC = os.environ.get('WEBHOOK_ASYNC', 'False').lower() == 'true'
+    WEBHOOK_WORKERS = int(os.environ.get('WEBHOOK_WORKERS', '4'))
+    WEBHOOK_MAX_QUEUE = int(os.environ.get('WEBHOOK_MAX_QUEUE', '10000'))
+    WEBHOOK_DEDUP_BACKEND = os.environ.get('WEBHOOK_DEDUP_BACKEND', 'memory')
+    WEBHOOK_RATE_PER_SECOND = float(os.environ.get('WEBHOOK_RATE_PER_SECOND', '1.0'))
+    WEBHOOK_RATE_BURST = int(os.environ.get('WEBHOOK_RATE_BURST', '10'))
+    WEBHOOK_RATE_MAX_NUMBERS = int(os.environ.get('WEBHOOK_RATE_MAX_NUMBERS', '100000'))
+    WEBHOOK_MAX_CONCURRENT = int(os.environ.get('WEBHOOK_MAX_CONCURRENT', '32'))
+    # Outlet Configuration
+    RESTAURANT_NAME = os.environ.get('RESTAURANT_NAME', 'Tasty Bites Restaurant')
+    TENANTS_FILE = os.environ.get('TENANTS_FILE')
+    TENANT_FANOUT_WORKERS = int(os.environ.get('TENANT_FANOUT_WORKERS', '8'))
     # Database Configuration
     DATABASE_URL = os.environ.get('DATABASE_URL', 'sqlite:///restaurant_orders.db')
+    DATABASE_PATH = DATABASE_URL.replace('sqlite:///', '', 1)
+    DATABASE_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE', '8'))
+    DATABASE_POOL_TIMEOUT = float(os.environ.get('DATABASE_POOL_TIMEOUT', '10'))
+    DATABASE_BUSY_TIMEOUT_MS = int(os.environ.get('DATABASE_BUSY_TIMEOUT_MS', '5000'))
+    DATABASE_CACHE_SIZE_KB = int(os.environ.get('DATABASE_CACHE_SIZE_KB', '8192'))
+    DATABASE_SYNCHRONOUS = os.environ.get('DATABASE_SYNCHRONOUS', 'NORMAL')
+    DATABASE_READ_MODE = os.environ.get('DATABASE_READ_MODE', 'wal')
+    DATABASE_READ_POOL_SIZE = int(os.environ.get('DATABASE_READ_POOL_SIZE', '4'))
+    DATABASE_READ_MAX_AGE = float(os.environ.get('DATABASE_READ_MAX_AGE', '30'))
+    # Order Write Configuration
+    ORDER_GROUP_COMMIT_WINDOW_MS = float(os.environ.get('ORDER_GROUP_COMMIT_WINDOW_MS', '0'))
+    ORDER_GROUP_COMMIT_MAX_BATCH = int(os.environ.get('ORDER_GROUP_COMMIT_MAX_BATCH', '64'))
+    # Order Archive Configuration
+    ORDER_ARCHIVE_AFTER_DAYS = int(os.environ.get('ORDER_ARCHIVE_AFTER_DAYS', '90'))
+    ORDER_ARCHIVE_DIR = os.environ.get('ORDER_ARCHIVE_DIR', '')
+    # Menu Cache Configuration
+    MENU_VERSION_CHECK_INTERVAL = float(os.environ.get('MENU_VERSION_CHECK_INTERVAL', '1.0'))
+    MENU_CACHE_MAX_AGE = int(os.environ.get('MENU_CACHE_MAX_AGE', '5'))
+    # Recommendation Configuration
+    RECOMMENDATIONS_TOP_K = int(os.environ.get('RECOMMENDATIONS_TOP_K', '10'))
+    RECOMMENDATIONS_MAX_USERS = int(os.environ.get('RECOMMENDATIONS_MAX_USERS', '10000'))
+    RECOMMENDATIONS_REFRESH_SECONDS = float(os.environ.get('RECOMMENDATIONS_REFRESH_SECONDS', '300'))
+    # Conversation Session Configuration
+    SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'memory')
+    SESSION_TTL_SECONDS = int(os.environ.get('SESSION_TTL_SECONDS', '1800'))
+    SESSION_MAX_ENTRIES = int(os.environ.get('SESSION_MAX_ENTRIES', '10000'))
+    # User Activity Write-Behind Configuration
+    USER_TOUCH_FLUSH_INTERVAL_MS = int(os.environ.get('USER_TOUCH_FLUSH_INTERVAL_MS', '1000'))
+    USER_TOUCH_FLUSH_BATCH = int(os.environ.get('USER_TOUCH_FLUSH_BATCH', '500'))
+    # Outbound Notification Configuration
+    NOTIFICATION_WORKERS = int(os.environ.get('NOTIFICATION_WORKERS', '4'))
+    NOTIFICATION_RATE_PER_SECOND = float(os.environ.get('NOTIFICATION_RATE_PER_SECOND', '1.0'))
+    NOTIFICATION_MAX_ATTEMPTS = int(os.environ.get('NOTIFICATION_MAX_ATTEMPTS', '5'))
+    # Admin Live Order Feed Configuration
+    ORDER_STREAM_POLL_INTERVAL = float(os.environ.get('ORDER_STREAM_POLL_INTERVAL', '2.0'))
+    ORDER_STREAM_HEARTBEAT_SECONDS = float(os.environ.get('ORDER_STREAM_HEARTBEAT_SECONDS', '15'))
+    ORDER_STREAM_MAX_SECONDS = float(os.environ.get('ORDER_STREAM_MAX_SECONDS', '300'))
+    ORDER_STREAM_MAX_CLIENTS = int(os.environ.get('ORDER_STREAM_MAX_CLIENTS', '2'))
+    # Performance Monitoring Configuration
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '100'))
     # Flask Configuration
     SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-here')
     DEBUG = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
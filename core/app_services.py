@@ -0,0 +1,139 @@
+from flask import abort, g
+from werkzeug.local import LocalProxy
+from core.bot import WhatsAppBot
+from core.change_notifier import ChangeNotifier
+from core.database import Database
+from core.menu_manager import MENU_VERSION_KEY, MenuManager
+from core.message_dispatcher import MessageDispatcher, create_dedup_store
+from core.order_archive import OrderArchive, archive_directory
+from core.order_manager import OrderManager
+from core.order_writer import GroupCommitWriter
+from core.session_store import create_session_store
+from core.user_manager import UserManager
+from services.analytics import AnalyticsService
+from services.notification_manager import NotificationManager, TwilioTransport
+from services.performance_monitor import monitor as performance_monitor
+from services.recommendations import RecommendationService
+from utils.http_cache import ResponseCache
+
+class AppServices:
+    # The one set of managers shared by the webhook, the public API and the
+    # admin blueprint. Building it touches neither the database nor Twilio,
+    # so it is cheap to create in the gunicorn master before forking.
+    def __init__(self, config, transport=None, tenant=None):
+        self.config = config
+        self.tenant = tenant
+        database_path = tenant.database_path if tenant else config.DATABASE_PATH
+        restaurant_name = tenant.name if tenant else config.RESTAURANT_NAME
+        from_number = tenant.numbers[0] if tenant and tenant.numbers else config.TWILIO_PHONE_NUMBER
+        self.db = Database(
+            database_path,
+            pool_size=config.DATABASE_POOL_SIZE,
+            pool_timeout=config.DATABASE_POOL_TIMEOUT,
+            busy_timeout_ms=config.DATABASE_BUSY_TIMEOUT_MS,
+            cache_size_kb=config.DATABASE_CACHE_SIZE_KB,
+            observer=performance_monitor,
+            synchronous=config.DATABASE_SYNCHRONOUS,
+            read_mode=config.DATABASE_READ_MODE,
+            read_pool_size=config.DATABASE_READ_POOL_SIZE,
+            read_max_age=config.DATABASE_READ_MAX_AGE,
+        )
+        self.menu_manager = MenuManager(
+            self.db,
+            version_check_interval=config.MENU_VERSION_CHECK_INTERVAL,
+            restaurant_name=restaurant_name,
+        )
+        self.order_archive = OrderArchive(self.db, archive_directory(config, database_path, tenant and tenant.slug))
+        self.analytics = AnalyticsService(self.db, archive=self.order_archive)
+        self.order_changes = ChangeNotifier(poll_interval=config.ORDER_STREAM_POLL_INTERVAL)
+        self.order_writer = GroupCommitWriter(
+            self.db,
+            window=config.ORDER_GROUP_COMMIT_WINDOW_MS / 1000.0,
+            max_batch=config.ORDER_GROUP_COMMIT_MAX_BATCH,
+        )
+        self.recommendations = RecommendationService(
+            self.db,
+            top_k=config.RECOMMENDATIONS_TOP_K,
+            max_users=config.RECOMMENDATIONS_MAX_USERS,
+            refresh_interval=config.RECOMMENDATIONS_REFRESH_SECONDS,
+        )
+        self.notification_manager = NotificationManager(
+            self.db,
+            transport or TwilioTransport(config.TWILIO_ACCOUNT_SID, config.TWILIO_AUTH_TOKEN, from_number),
+            workers=config.NOTIFICATION_WORKERS,
+            rate_per_second=config.NOTIFICATION_RATE_PER_SECOND,
+            max_attempts=config.NOTIFICATION_MAX_ATTEMPTS,
+        )
+        self.order_manager = OrderManager(self.db, analytics=self.analytics, notifier=self.order_changes,
+                                          writer=self.order_writer, recommendations=self.recommendations,
+                                          archive=self.order_archive, notifications=self.notification_manager)
+        self.user_manager = UserManager(
+            self.db,
+            flush_interval=config.USER_TOUCH_FLUSH_INTERVAL_MS / 1000.0,
+            flush_batch_size=config.USER_TOUCH_FLUSH_BATCH,
+        )
+        self.sessions = create_session_store(
+            config.SESSION_BACKEND,
+            database=self.db,
+            ttl=config.SESSION_TTL_SECONDS,
+            max_entries=config.SESSION_MAX_ENTRIES,
+        )
+        self.bot = WhatsAppBot(self.menu_manager, self.order_manager, self.user_manager, self.sessions,
+                               recommendations=self.recommendations)
+        self.dedup_store = create_dedup_store(config.WEBHOOK_DEDUP_BACKEND, database=self.db)
+        self.message_dispatcher = MessageDispatcher(
+            self.process_queued_message,
+            workers=config.WEBHOOK_WORKERS,
+            max_queue=config.WEBHOOK_MAX_QUEUE,
+        )
+        self.response_cache = ResponseCache()
+    def process_queued_message(self, phone_number, message_body):
+        response_text = self.bot.process_message(phone_number, message_body)
+        self.notification_manager.enqueue(phone_number, response_text)
+    def register_collectors(self, monitor, labels=()):
+        monitor.register_collector('db_pool', self.db.pool_stats, labels)
+        monitor.register_collector('db_read', self.db.read_stats, labels)
+        monitor.register_collector('http_cache', self.response_cache.stats, labels)
+        monitor.register_collector('sessions', self.sessions.stats, labels)
+        monitor.register_collector('notifications', self.notification_manager.stats, labels)
+        monitor.register_collector('webhook_dedup', self.dedup_store.stats, labels)
+        monitor.register_collector('webhook_queue', self.message_dispatcher.stats, labels)
+        monitor.register_collector('order_stream', self.order_changes.stats, labels)
+        monitor.register_collector('order_writer', self.order_writer.stats, labels)
+        monitor.register_collector('recommendations', self.recommendations.stats, labels)
+        monitor.register_collector('order_archive', self.order_archive.stats, labels)
+    def prepare_database(self):
+        self.db.init_db()
+        self.menu_manager.load_sample_menu()
+    def warm_up(self):
+        # Builds the menu snapshot and matcher indexes, and runs the
+        # per-message version lookups once so the pooled connection has
+        # them in its statement cache before the first webhook arrives.
+        self.menu_manager.get_catalog()
+        self.recommendations.popular()
+        with self.db.get_connection() as conn:
+            self.db.get_version_info(MENU_VERSION_KEY, conn)
+            self.db.get_version(MENU_VERSION_KEY, conn)
+            self.order_manager.get_orders_version_info()
+    def start(self):
+        # Per worker, after fork: the outbox dispatcher picks up messages
+        # left pending or awaiting a retry by a previous process, without
+        # waiting for this worker's first enqueue.
+        self.notification_manager.start()
+    def reset_after_fork(self):
+        # SQLite connections must not be shared across fork(); a forked
+        # worker drops the ones it inherited and opens its own.
+        self.db.reset_after_fork()
+    def close(self):
+        self.db.close()
+
+def current_services():
+    services = g.get('orderbot')
+    if services is None:
+        abort(404)
+    return services
+
+def service_proxy(name):
+    # Module-level stand-in for one of the managers of the tenant the
+    # current request was routed to (see create_app).
+    return LocalProxy(lambda: getattr(current_services(), name))
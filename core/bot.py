@@ -1,2 +1,217 @@
-# The WhatsAppBot class is implemented in app.py for this project.
-# If you want to refactor, you can move the WhatsAppBot class here and import it in app.py.
+from services.performance_monitor import monitor as performance_monitor
+from core.order_parser import OrderParser
+from utils.constants import USER_STATES
+
+class WhatsAppBot:
+    def __init__(self, menu_manager, order_manager, user_manager, sessions, recommendations=None):
+        self.menu_manager = menu_manager
+        self.order_manager = order_manager
+        self.user_manager = user_manager
+        self.sessions = sessions
+        self.recommendations = recommendations
+        self.order_parser = OrderParser(menu_manager)
+    def get_user_state(self, phone_number):
+        return self.sessions.get(phone_number)
+    def update_user_state(self, phone_number, user_state):
+        self.sessions.save(phone_number, user_state)
+    def cart_lines(self, user_state):
+        lines = []
+        for item_id, quantity in user_state.cart.items():
+            item = self.menu_manager.get_item(item_id)
+            if item:
+                lines.append((item_id, item, quantity))
+        return lines
+    def process_message(self, phone_number, message_body):
+        self.user_manager.touch_user(phone_number)
+        user_state = self.get_user_state(phone_number)
+        message_body = message_body.strip().lower()
+        with performance_monitor.timer('bot_handler_duration_seconds', state=user_state.state):
+            if user_state.state == USER_STATES['MENU_BROWSING']:
+                return self.handle_menu_browsing(phone_number, message_body, user_state)
+            elif user_state.state == USER_STATES['QUANTITY_INPUT']:
+                return self.handle_quantity_input(phone_number, message_body, user_state)
+            elif user_state.state == USER_STATES['LOCATION_INPUT']:
+                return self.handle_location_input(phone_number, message_body, user_state)
+            elif user_state.state == USER_STATES['ORDER_CONFIRMATION']:
+                return self.handle_order_confirmation(phone_number, message_body, user_state)
+            else:
+                return self.handle_menu_browsing(phone_number, message_body, user_state)
+    def handle_menu_browsing(self, phone_number, message_body, user_state):
+        if message_body in ['hi', 'hello', 'hey', 'start', 'menu']:
+            return self.show_welcome_menu()
+        elif message_body == 'cart':
+            return self.show_cart(user_state)
+        elif message_body == 'checkout':
+            if not user_state.cart:
+                return "🛒 Your cart is empty! Browse our menu first."
+            user_state.state = USER_STATES['LOCATION_INPUT']
+            self.update_user_state(phone_number, user_state)
+            return "📍 Please share your delivery location (address):"
+        elif message_body == 'clear':
+            user_state.cart = {}
+            self.update_user_state(phone_number, user_state)
+            return "🗑️ Cart cleared! What would you like to order?"
+        elif message_body in ['top', 'bestsellers', 'popular'] and self.recommendations:
+            return self.show_bestsellers()
+        elif message_body in ['reorder', 'repeat', 'again'] and self.recommendations:
+            return self.reorder(phone_number, user_state, usual=False)
+        elif message_body in ['usual', 'my usual', 'the usual'] and self.recommendations:
+            return self.reorder(phone_number, user_state, usual=True)
+        else:
+            order = self.order_parser.parse(message_body)
+            if order.multi:
+                return self.add_parsed_order(phone_number, order, user_state)
+            item, candidates = self.menu_manager.resolve_item(message_body)
+            if item:
+                user_state.current_item_id = item['id']
+                user_state.state = USER_STATES['QUANTITY_INPUT']
+                self.update_user_state(phone_number, user_state)
+                return f"🍽️ *{item['name']}* - ₹{item['price']}\n\n{item['description']}\n\nHow many would you like to order?"
+            elif candidates:
+                return self.show_item_choices(candidates)
+            else:
+                return self.show_help_message()
+    def handle_quantity_input(self, phone_number, message_body, user_state):
+        try:
+            quantity = int(message_body)
+            if quantity <= 0:
+                return "❌ Please enter a valid quantity (greater than 0)."
+            item = self.menu_manager.get_item(user_state.current_item_id)
+            user_state.state = USER_STATES['MENU_BROWSING']
+            user_state.current_item_id = None
+            if item is None:
+                self.update_user_state(phone_number, user_state)
+                return "❌ Sorry, that item is no longer available. Type 'menu' to see what we have."
+            user_state.cart[item['id']] = user_state.cart.get(item['id'], 0) + quantity
+            self.update_user_state(phone_number, user_state)
+            return f"✅ Added {quantity} x {item['name']} to cart!\n\nType 'cart' to view cart or 'menu' to continue ordering."
+        except ValueError:
+            return "❌ Please enter a valid number for quantity."
+    def handle_location_input(self, phone_number, message_body, user_state):
+        if len(message_body) < 10:
+            return "❌ Please provide a detailed address with area/landmark."
+        user_state.location = message_body
+        user_state.state = USER_STATES['ORDER_CONFIRMATION']
+        self.update_user_state(phone_number, user_state)
+        return self.show_order_summary(user_state)
+    def handle_order_confirmation(self, phone_number, message_body, user_state):
+        if message_body in ['yes', 'y', 'confirm', 'order']:
+            cart_items = {
+                item_id: {'name': item['name'], 'price': item['price'], 'quantity': quantity}
+                for item_id, item, quantity in self.cart_lines(user_state)
+            }
+            if not cart_items:
+                user_state.cart = {}
+                user_state.state = USER_STATES['MENU_BROWSING']
+                user_state.location = None
+                self.update_user_state(phone_number, user_state)
+                return "🛒 Your cart is empty! Browse our menu first."
+            order_id = self.order_manager.create_order(
+                phone_number, 
+                cart_items, 
+                user_state.location
+            )
+            user_state.cart = {}
+            user_state.state = USER_STATES['MENU_BROWSING']
+            user_state.location = None
+            self.update_user_state(phone_number, user_state)
+            return f"🎉 Order confirmed! Order ID: #{order_id}\n\n💰 Payment: Cash on Delivery\n⏰ Estimated delivery: 30-45 minutes\n\nThank you for ordering with us!"
+        elif message_body in ['no', 'n', 'cancel']:
+            user_state.state = USER_STATES['MENU_BROWSING']
+            self.update_user_state(phone_number, user_state)
+            return "❌ Order cancelled. Type 'menu' to start over."
+        else:
+            return "Please reply with 'yes' to confirm or 'no' to cancel the order."
+    def add_parsed_order(self, phone_number, order, user_state):
+        # "2 chicken biryani, 1 mango lassi" fills the cart in one message;
+        # fragments that didn't resolve are listed so only those need a retry.
+        for item, quantity in order.lines:
+            user_state.cart[item['id']] = user_state.cart.get(item['id'], 0) + quantity
+        if order.lines:
+            self.update_user_state(phone_number, user_state)
+            reply = "✅ Added to cart:\n\n"
+            reply += "".join(f"• {quantity} x {item['name']}\n" for item, quantity in order.lines)
+        else:
+            reply = ""
+        if order.unresolved:
+            reply += "\n❓ Couldn't add:\n"
+            for fragment in order.unresolved:
+                reply += f"• {fragment.text}"
+                if fragment.candidates:
+                    reply += f" (did you mean {' or '.join(item['name'] for item in fragment.candidates[:3])}?)"
+                reply += "\n"
+        if not order.lines:
+            return reply.lstrip() + "\nType 'menu' to see what we have."
+        return reply + "\nType 'cart' to view cart, 'checkout' to place the order, or keep adding items."
+    def reorder(self, phone_number, user_state, usual=False):
+        # Rebuilds the last (or most often repeated) cart and, with the
+        # address it went to, goes straight to confirmation, so a returning
+        # customer orders with "reorder" and "yes".
+        lookup = self.recommendations.usual_order if usual else self.recommendations.last_order
+        cart, address = lookup(phone_number)
+        if not cart:
+            return "🤷 You haven't ordered with us yet. Type 'menu' to see what we have or 'top' for our bestsellers."
+        available = {item_id: quantity for item_id, quantity in cart.items() if self.menu_manager.get_item(item_id)}
+        if not available:
+            return "❌ Sorry, none of those items are available right now. Type 'menu' to see what we have."
+        user_state.cart = available
+        if address:
+            user_state.location = address
+            user_state.state = USER_STATES['ORDER_CONFIRMATION']
+            reply = self.show_order_summary(user_state)
+        else:
+            user_state.state = USER_STATES['LOCATION_INPUT']
+            reply = "📍 Please share your delivery location (address):"
+        self.update_user_state(phone_number, user_state)
+        if len(available) < len(cart):
+            reply = "⚠️ Some items from that order are no longer available and were left out.\n\n" + reply
+        return reply
+    def show_bestsellers(self):
+        lines = []
+        for item_id, _ in self.recommendations.popular():
+            item = self.menu_manager.get_item(item_id)
+            if item:
+                lines.append(f"{len(lines) + 1}. {item['name']} - ₹{item['price']}")
+        if not lines:
+            return "🔥 No bestsellers yet. Type 'menu' to see what we have."
+        return "🔥 *Bestsellers:*\n\n" + "\n".join(lines) + "\n\nType an item name to add it to your cart."
+    def show_welcome_menu(self):
+        return self.menu_manager.get_welcome_text()
+    def show_cart(self, user_state):
+        if not user_state.cart:
+            return "🛒 Your cart is empty! Browse our menu to add items."
+        cart_text = "🛒 *Your Cart:*\n\n"
+        total = 0
+        for item_id, item, quantity in self.cart_lines(user_state):
+            subtotal = item['price'] * quantity
+            total += subtotal
+            cart_text += f"• {item['name']} x{quantity} - ₹{subtotal}\n"
+        cart_text += f"\n💰 *Total: ₹{total}*\n\n"
+        cart_text += "Type 'checkout' to proceed with order or continue browsing!"
+        return cart_text
+    def show_order_summary(self, user_state):
+        summary = "📋 *Order Summary:*\n\n"
+        total = 0
+        for item_id, item, quantity in self.cart_lines(user_state):
+            subtotal = item['price'] * quantity
+            total += subtotal
+            summary += f"• {item['name']} x{quantity} - ₹{subtotal}\n"
+        summary += f"\n💰 *Total: ₹{total}*\n"
+        summary += f"📍 *Delivery Address:* {user_state.location}\n"
+        summary += f"💳 *Payment:* Cash on Delivery\n\n"
+        summary += "Reply 'yes' to confirm or 'no' to cancel."
+        return summary
+    def show_item_choices(self, candidates):
+        choices = "🤔 Did you mean:\n\n"
+        for item in candidates:
+            choices += f"• {item['name']} - ₹{item['price']}\n"
+        choices += "\nPlease type the full item name."
+        return choices
+    def show_help_message(self):
+        return ("❓ I didn't understand that. Try:\n\n"
+                "• Type 'menu' to see our menu\n"
+                "• Type an item name to order\n"
+                "• Or order several at once: '2 chicken biryani, 1 mango lassi'\n"
+                "• Type 'cart' to view your cart\n"
+                "• Type 'top' for bestsellers or 'reorder' to repeat your last order\n"
+                "• Type 'checkout' to place order")
@@ -0,0 +1,48 @@
+import threading
+import time
+
+class ChangeNotifier:
+    # Wakes streaming readers as soon as a writer in this process commits.
+    # Writers in other worker processes never call publish(), so waiters
+    # also poll the shared version counter every ``poll_interval`` seconds.
+    def __init__(self, poll_interval=2.0):
+        self.poll_interval = poll_interval
+        self.version = 0
+        self._condition = threading.Condition()
+        self._stats = {'published': 0, 'waiters': 0, 'polls': 0}
+    def publish(self, version):
+        with self._condition:
+            self._stats['published'] += 1
+            if version > self.version:
+                self.version = version
+            self._condition.notify_all()
+    def wait(self, since_version, timeout, poll=None):
+        # Returns the newest known version, which is only greater than
+        # ``since_version`` if something changed before the timeout.
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            self._stats['waiters'] += 1
+            try:
+                while True:
+                    if self.version > since_version:
+                        return self.version
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return self.version
+                    if self._condition.wait(min(remaining, self.poll_interval)) or poll is None:
+                        continue
+                    self._stats['polls'] += 1
+                    self._condition.release()
+                    try:
+                        version = poll()
+                    finally:
+                        self._condition.acquire()
+                    if version > self.version:
+                        self.version = version
+            finally:
+                self._stats['waiters'] -= 1
+    def stats(self):
+        with self._condition:
+            stats = dict(self._stats)
+            stats['version'] = self.version
+        return stats
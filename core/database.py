@@ -1,19 +1,394 @@
 import sqlite3
 import json
+import pathlib
+import threading
+import time
 from datetime import datetime
 from contextlib import contextmanager
 
-class Database:
-    def __init__(self, db_path='restaurant_orders.db'):
+class PoolTimeout(Exception):
+    pass
+
+class TracedConnection(sqlite3.Connection):
+    # Used when the Database has an observer attached: every execute and
+    # executemany call is timed and reported as one database round trip.
+    observer = None
+    def execute(self, sql, parameters=()):
+        observer = self.observer
+        if observer is None:
+            return super().execute(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            observer.observe_query(self, sql, parameters, time.perf_counter() - started)
+    def executemany(self, sql, seq_of_parameters):
+        observer = self.observer
+        if observer is None:
+            return super().executemany(sql, seq_of_parameters)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            observer.observe_query(self, sql, None, time.perf_counter() - started)
+
+SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+# Where reporting reads go: "wal" is a separate pool of read-only
+# connections (each read sees the latest commit), "backup" a private
+# in-memory copy refreshed every max_age seconds, "off" the write pool.
+READ_MODES = ('wal', 'backup', 'off')
+
+def read_only_uri(db_path):
+    return pathlib.Path(db_path).resolve().as_uri() + '?mode=ro'
+
+class ConnectionPool:
+    def __init__(self, db_path, max_size=8, timeout=10.0, busy_timeout_ms=5000,
+                 cache_size_kb=8192, health_check_interval=30.0, observer=None, synchronous='NORMAL',
+                 read_only=False):
+        # synchronous=NORMAL in WAL mode survives an app crash but can lose
+        # the last commits on power loss; FULL fsyncs every commit.
+        synchronous = synchronous.upper()
+        if synchronous not in SYNCHRONOUS_MODES:
+            raise ValueError(f"synchronous must be one of {', '.join(SYNCHRONOUS_MODES)}")
+        self.synchronous = synchronous
+        self.read_only = read_only
         self.db_path = db_path
-    @contextmanager
-    def get_connection(self):
-        conn = sqlite3.connect(self.db_path)
+        self.observer = observer
+        self.max_size = max_size
+        self.timeout = timeout
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_size_kb = cache_size_kb
+        self.health_check_interval = health_check_interval
+        self._idle = []
+        self._size = 0
+        self._cond = threading.Condition(threading.Lock())
+        self._local = threading.local()
+        self._stats = {
+            'created': 0,
+            'closed': 0,
+            'checkouts': 0,
+            'reused': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'timeouts': 0,
+            'health_check_failures': 0,
+        }
+    def _connect(self):
+        if self.read_only:
+            # mode=ro can't take the write lock at all, and query_only
+            # turns any stray write into an error instead of a lock wait.
+            conn = sqlite3.connect(read_only_uri(self.db_path), uri=True, timeout=self.busy_timeout_ms / 1000.0,
+                                   check_same_thread=False, factory=TracedConnection)
+            conn.execute('PRAGMA query_only=1')
+        else:
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000.0, check_same_thread=False,
+                                   factory=TracedConnection)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(f'PRAGMA synchronous={self.synchronous}')
         conn.row_factory = sqlite3.Row
+        conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout_ms)}')
+        conn.execute(f'PRAGMA cache_size={-int(self.cache_size_kb)}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.observer = self.observer
+        return conn
+    def _is_healthy(self, conn):
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+    def _close(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._stats['closed'] += 1
+            self._cond.notify()
+    def _take_idle(self):
+        # Prefer the connection this thread used last so each worker thread
+        # keeps a warm page cache; otherwise take the most recently returned.
+        last = getattr(self._local, 'last', None)
+        if last is not None:
+            for index, (conn, last_used) in enumerate(self._idle):
+                if conn is last:
+                    return self._idle.pop(index)
+        return self._idle.pop()
+    def acquire(self):
+        started = time.monotonic()
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, last_used = self._take_idle()
+                    self._stats['reused'] += 1
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn, last_used = None, None
+                    break
+                remaining = self.timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(f'No database connection available after {self.timeout}s')
+                waited = True
+                self._cond.wait(remaining)
+            self._stats['checkouts'] += 1
+            if waited:
+                wait_time = time.monotonic() - started
+                self._stats['waits'] += 1
+                self._stats['wait_time_total'] += wait_time
+                self._stats['wait_time_max'] = max(self._stats['wait_time_max'], wait_time)
+        if conn is not None and time.monotonic() - last_used > self.health_check_interval:
+            if not self._is_healthy(conn):
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+                with self._cond:
+                    self._stats['health_check_failures'] += 1
+                    self._stats['closed'] += 1
+                conn = None
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._stats['created'] += 1
+        self._local.last = conn
+        return conn
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._close(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+    @contextmanager
+    def connection(self):
+        # Nested checkouts on the same thread share one connection so that
+        # manager methods calling each other don't hold two pool slots.
+        held = getattr(self._local, 'held', None)
+        if held is not None:
+            self._local.depth += 1
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+        conn = self.acquire()
+        self._local.held = conn
+        self._local.depth = 1
         try:
             yield conn
         finally:
-            conn.close()
+            self._local.held = None
+            self._local.depth = 0
+            self.release(conn)
+    def holding(self):
+        return getattr(self._local, 'held', None) is not None
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._close(conn)
+    def reset_after_fork(self):
+        # The inherited connections belong to the parent process; closing
+        # them here could disturb its locks, so they are only forgotten.
+        self._idle = []
+        self._size = 0
+        self._cond = threading.Condition(threading.Lock())
+        self._local = threading.local()
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['size'] = self._size
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._size - len(self._idle)
+            stats['max_size'] = self.max_size
+        return stats
+
+class BackupSnapshot:
+    # A private in-memory copy of the database taken with the backup API.
+    # Reports on it hold no read transaction on the real file, so they
+    # can't pin the WAL or slow its checkpoints. A copy older than max_age
+    # is replaced on the next read by whichever thread gets there first;
+    # the others keep reading the previous copy rather than wait.
+    def __init__(self, db_path, max_age=30.0, observer=None):
+        self.db_path = db_path
+        self.max_age = max_age
+        self.observer = observer
+        self._conn = None
+        self._taken_at = None
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self._stats = {'refreshes': 0, 'refresh_time_total': 0.0, 'refresh_failures': 0}
+    def _copy(self):
+        started = time.monotonic()
+        source = sqlite3.connect(read_only_uri(self.db_path), uri=True)
+        try:
+            target = sqlite3.connect(':memory:', check_same_thread=False, factory=TracedConnection)
+            source.backup(target)
+        finally:
+            source.close()
+        target.row_factory = sqlite3.Row
+        target.execute('PRAGMA query_only=1')
+        target.observer = self.observer
+        with self._lock:
+            self._conn, self._taken_at = target, started
+            self._stats['refreshes'] += 1
+            self._stats['refresh_time_total'] += time.monotonic() - started
+    def _current(self):
+        with self._lock:
+            conn, taken_at = self._conn, self._taken_at
+        if conn is not None and time.monotonic() - taken_at <= self.max_age:
+            return conn
+        # Only the first stale reader refreshes; with no copy yet, everyone waits for it.
+        if self._refreshing.acquire(blocking=conn is None):
+            try:
+                with self._lock:
+                    fresh = self._conn is not None and time.monotonic() - self._taken_at <= self.max_age
+                if not fresh:
+                    self._copy()
+            except sqlite3.Error:
+                with self._lock:
+                    self._stats['refresh_failures'] += 1
+                if conn is None:
+                    raise
+            finally:
+                self._refreshing.release()
+        with self._lock:
+            return self._conn
+    @contextmanager
+    def connection(self):
+        # The copy's connection is shared by all reader threads; a refresh
+        # swaps in a new one and the old copy is freed once its readers
+        # are done with it.
+        yield self._current()
+    def age(self):
+        with self._lock:
+            return time.monotonic() - self._taken_at if self._taken_at is not None else None
+    def reset(self):
+        with self._lock:
+            self._conn, self._taken_at = None, None
+        self._refreshing = threading.Lock()
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['age'] = self.age() or 0.0
+        return stats
+
+class Database:
+    def __init__(self, db_path='restaurant_orders.db', pool_size=8, pool_timeout=10.0,
+                 busy_timeout_ms=5000, cache_size_kb=8192, observer=None, synchronous='NORMAL',
+                 read_mode='wal', read_pool_size=4, read_max_age=30.0):
+        if read_mode not in READ_MODES:
+            raise ValueError(f"read_mode must be one of {', '.join(READ_MODES)}")
+        self.db_path = db_path
+        self.read_mode = read_mode
+        self.read_max_age = read_max_age if read_mode == 'backup' else 0.0
+        self.pool = ConnectionPool(
+            db_path,
+            max_size=pool_size,
+            timeout=pool_timeout,
+            busy_timeout_ms=busy_timeout_ms,
+            cache_size_kb=cache_size_kb,
+            observer=observer,
+            synchronous=synchronous,
+        )
+        # Reports get their own connections so a long export never holds
+        # one of the slots the webhook needs to confirm an order.
+        self.read_pool = ConnectionPool(
+            db_path,
+            max_size=read_pool_size,
+            timeout=pool_timeout,
+            busy_timeout_ms=busy_timeout_ms,
+            cache_size_kb=cache_size_kb,
+            observer=observer,
+            read_only=True,
+        ) if read_mode == 'wal' else None
+        self.snapshot = BackupSnapshot(db_path, read_max_age, observer) if read_mode == 'backup' else None
+    @contextmanager
+    def get_connection(self):
+        with self.pool.connection() as conn:
+            yield conn
+    @contextmanager
+    def get_read_connection(self):
+        # For admin and reporting reads. Inside a get_connection block the
+        # caller's connection is reused, so a method that both writes and
+        # reports sees its own writes.
+        if self.read_mode == 'off' or self.pool.holding():
+            with self.pool.connection() as conn:
+                yield conn
+        elif self.snapshot is not None:
+            with self.snapshot.connection() as conn:
+                yield conn
+        else:
+            with self.read_pool.connection() as conn:
+                yield conn
+    def snapshot_age(self):
+        # How far behind the primary reporting reads may be, in seconds.
+        if self.snapshot is None:
+            return 0.0
+        return self.snapshot.age() or 0.0
+    def pool_stats(self):
+        return self.pool.stats()
+    def read_stats(self):
+        if self.snapshot is not None:
+            stats = self.snapshot.stats()
+        elif self.read_pool is not None:
+            stats = self.read_pool.stats()
+        else:
+            stats = {}
+        stats['max_age'] = self.read_max_age
+        return stats
+    def close(self):
+        self.pool.close_all()
+        if self.read_pool is not None:
+            self.read_pool.close_all()
+        if self.snapshot is not None:
+            self.snapshot.reset()
+    def reset_after_fork(self):
+        self.pool.reset_after_fork()
+        if self.read_pool is not None:
+            self.read_pool.reset_after_fork()
+        if self.snapshot is not None:
+            self.snapshot.reset()
+    def _ensure_column(self, conn, table, column, definition):
+        columns = {row['name'] for row in conn.execute(f'PRAGMA table_info({table})')}
+        if column not in columns:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    def get_version(self, name, conn=None):
+        if conn is None:
+            with self.get_connection() as conn:
+                return self.get_version(name, conn)
+        row = conn.execute('SELECT version FROM app_versions WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else 0
+    def get_version_info(self, name, conn=None):
+        # (version, updated_at) where updated_at is a Unix timestamp, or
+        # None for a counter that has never been bumped.
+        if conn is None:
+            with self.get_connection() as conn:
+                return self.get_version_info(name, conn)
+        row = conn.execute('SELECT version, updated_at FROM app_versions WHERE name = ?', (name,)).fetchone()
+        return (row[0], row[1]) if row else (0, None)
+    def bump_version(self, conn, name):
+        # Runs inside the caller's transaction so the new version becomes
+        # visible to other workers together with the data it describes.
+        conn.execute('''
+            INSERT INTO app_versions (name, version, updated_at) VALUES (?, 1, ?)
+            ON CONFLICT(name) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at
+        ''', (name, time.time()))
+        return self.get_version(name, conn)
     def init_db(self):
         with self.get_connection() as conn:
             conn.execute('''
@@ -61,4 +436,114 @@ class Database:
                     UNIQUE(user_phone, menu_item_id)
                 )
             ''')
+            self._ensure_column(conn, 'menu_items', 'aliases', 'TEXT')
+            # Stable key for menu syncs; items created before it existed are
+            # matched by name on the first sync and get their sku then.
+            self._ensure_column(conn, 'menu_items', 'sku', 'TEXT')
+            conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_menu_items_sku ON menu_items (sku)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS order_items (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    order_id INTEGER NOT NULL,
+                    menu_item_id INTEGER NOT NULL,
+                    name TEXT NOT NULL,
+                    unit_price DECIMAL(10,2) NOT NULL,
+                    quantity INTEGER NOT NULL,
+                    FOREIGN KEY (order_id) REFERENCES orders (id),
+                    FOREIGN KEY (menu_item_id) REFERENCES menu_items (id)
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items (order_id)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_order_items_menu_item_id ON order_items (menu_item_id)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders (created_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_orders_user_phone ON orders (user_phone, created_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status, created_at)')
+            self._ensure_column(conn, 'orders', 'version', 'INTEGER NOT NULL DEFAULT 0')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_orders_version ON orders (version)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS app_versions (
+                    name TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL DEFAULT 0,
+                    updated_at REAL
+                )
+            ''')
+            # Databases created before updated_at existed.
+            self._ensure_column(conn, 'app_versions', 'updated_at', 'REAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS sessions (
+                    phone_number TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_updated_at ON sessions (updated_at)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS processed_messages (
+                    message_sid TEXT PRIMARY KEY,
+                    received_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_processed_messages_received_at ON processed_messages (received_at)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS notification_outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    dedup_key TEXT UNIQUE,
+                    to_number TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    claimed_at REAL,
+                    sent_at REAL,
+                    provider_id TEXT,
+                    last_error TEXT,
+                    created_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS analytics_hourly (
+                    bucket TEXT PRIMARY KEY,
+                    order_count INTEGER NOT NULL DEFAULT 0,
+                    revenue DECIMAL(12,2) NOT NULL DEFAULT 0
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS analytics_daily (
+                    day TEXT PRIMARY KEY,
+                    order_count INTEGER NOT NULL DEFAULT 0,
+                    revenue DECIMAL(12,2) NOT NULL DEFAULT 0
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS analytics_item_daily (
+                    day TEXT NOT NULL,
+                    item_id INTEGER NOT NULL,
+                    name TEXT NOT NULL,
+                    quantity INTEGER NOT NULL DEFAULT 0,
+                    revenue DECIMAL(12,2) NOT NULL DEFAULT 0,
+                    PRIMARY KEY (day, item_id)
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS analytics_status_daily (
+                    day TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    order_count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (day, status)
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS order_archives (
+                    month TEXT PRIMARY KEY,
+                    orders INTEGER NOT NULL DEFAULT 0,
+                    first_id INTEGER,
+                    last_id INTEGER,
+                    newest TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_notification_outbox_pending
+                ON notification_outbox (status, to_number, id)
+            ''')
             conn.commit()
@@ -0,0 +1,180 @@
+import re
+import threading
+from collections import namedtuple
+
+Match = namedtuple('Match', ['item_id', 'score'])
+Resolution = namedtuple('Resolution', ['item_id', 'candidates', 'ambiguous'])
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Filler words customers wrap around item names ("i want a mango lassi please").
+STOPWORDS = frozenset({
+    'a', 'an', 'the', 'i', 'id', 'want', 'would', 'like', 'to', 'order', 'please', 'pls',
+    'plz', 'some', 'me', 'give', 'get', 'can', 'have', 'add', 'of', 'one', 'and', 'with',
+})
+
+def normalize(text):
+    return ' '.join(TOKEN_RE.findall(str(text).lower()))
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(str(text).lower()) if token not in STOPWORDS]
+
+def trigrams(token):
+    padded = f'#{token}#'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def edit_distance(a, b, limit):
+    # Optimal string alignment distance with early exit once every cell in
+    # a row exceeds ``limit``; transpositions ("biryain") count as one edit.
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if previous2 is not None and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+class ItemMatcher:
+    def __init__(self, min_score=0.5, ambiguity_margin=0.05, min_trigram_similarity=0.2):
+        self.min_score = min_score
+        self.ambiguity_margin = ambiguity_margin
+        self.min_trigram_similarity = min_trigram_similarity
+        self._entries = {}
+        self._phrases = {}
+        self._token_items = {}
+        self._trigram_tokens = {}
+        self._lock = threading.RLock()
+    @staticmethod
+    def _signature(item):
+        return (item['name'], item.get('aliases') or '')
+    def _add(self, item):
+        item_id = item['id']
+        names = [item['name']] + [alias for alias in (item.get('aliases') or '').split(',') if alias.strip()]
+        tokens = set()
+        phrases = set()
+        for name in names:
+            phrases.add(normalize(name))
+            tokens.update(tokenize(name))
+        self._entries[item_id] = (self._signature(item), frozenset(tokens), len(tokenize(item['name'])) or 1,
+                                  frozenset(phrases))
+        for phrase in phrases:
+            self._phrases.setdefault(phrase, set()).add(item_id)
+        for token in tokens:
+            holders = self._token_items.setdefault(token, set())
+            if not holders:
+                for gram in trigrams(token):
+                    self._trigram_tokens.setdefault(gram, set()).add(token)
+            holders.add(item_id)
+    def _remove(self, item_id):
+        entry = self._entries.pop(item_id, None)
+        if entry is None:
+            return
+        for phrase in entry[3]:
+            holders = self._phrases.get(phrase)
+            if holders is not None:
+                holders.discard(item_id)
+                if not holders:
+                    del self._phrases[phrase]
+        for token in entry[1]:
+            holders = self._token_items.get(token)
+            if holders is None:
+                continue
+            holders.discard(item_id)
+            if not holders:
+                del self._token_items[token]
+                for gram in trigrams(token):
+                    grams = self._trigram_tokens.get(gram)
+                    if grams is not None:
+                        grams.discard(token)
+                        if not grams:
+                            del self._trigram_tokens[gram]
+    def sync(self, items):
+        # Only items whose name/aliases changed (or that appeared or
+        # disappeared) are re-indexed, so a price update touches nothing.
+        with self._lock:
+            current = {item['id']: item for item in items}
+            changed = 0
+            for item_id in list(self._entries):
+                if item_id not in current:
+                    self._remove(item_id)
+                    changed += 1
+            for item_id, item in current.items():
+                entry = self._entries.get(item_id)
+                if entry is not None and entry[0] == self._signature(item):
+                    continue
+                self._remove(item_id)
+                self._add(item)
+                changed += 1
+            return changed
+    def _token_weights(self, token):
+        weights = {}
+        for item_id in self._token_items.get(token, ()):
+            weights[item_id] = 1.0
+        if len(token) < 3:
+            return weights
+        grams = trigrams(token)
+        shared = {}
+        for gram in grams:
+            for candidate in self._trigram_tokens.get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        limit = 1 if len(token) <= 5 else 2
+        for candidate, count in shared.items():
+            if candidate == token:
+                continue
+            if candidate.startswith(token):
+                weight = 0.9
+            else:
+                similarity = count / (len(grams) + len(trigrams(candidate)) - count)
+                if similarity < self.min_trigram_similarity:
+                    continue
+                distance = edit_distance(token, candidate, limit)
+                if distance > limit:
+                    continue
+                weight = 1.0 - 0.15 * distance
+            for item_id in self._token_items[candidate]:
+                if weights.get(item_id, 0.0) < weight:
+                    weights[item_id] = weight
+        return weights
+    def match(self, text, limit=5):
+        query = normalize(text)
+        if not query:
+            return []
+        with self._lock:
+            if query.isdigit() and int(query) in self._entries:
+                return [Match(int(query), 1.0)]
+            exact = self._phrases.get(query)
+            if exact:
+                return [Match(item_id, 1.0) for item_id in sorted(exact)][:limit]
+            tokens = tokenize(query)
+            if not tokens:
+                return []
+            totals = {}
+            matched = {}
+            for token in tokens:
+                for item_id, weight in self._token_weights(token).items():
+                    totals[item_id] = totals.get(item_id, 0.0) + weight
+                    matched[item_id] = matched.get(item_id, 0) + 1
+            results = []
+            for item_id, total in totals.items():
+                coverage = total / len(tokens)
+                specificity = min(1.0, matched[item_id] / self._entries[item_id][2])
+                results.append(Match(item_id, round(0.7 * coverage + 0.3 * specificity, 4)))
+        results.sort(key=lambda match: (-match.score, match.item_id))
+        return [match for match in results if match.score >= self.min_score][:limit]
+    def resolve(self, text, limit=5):
+        candidates = self.match(text, limit)
+        if not candidates:
+            return Resolution(None, [], False)
+        if len(candidates) > 1 and candidates[0].score - candidates[1].score <= self.ambiguity_margin:
+            top = candidates[0].score
+            tied = [match for match in candidates if top - match.score <= self.ambiguity_margin]
+            return Resolution(None, tied, True)
+        return Resolution(candidates[0].item_id, candidates, False)
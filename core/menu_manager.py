@@ -1,62 +1,227 @@
+import sys
+import threading
+import time
+from types import MappingProxyType
+from core.item_matcher import ItemMatcher
+from core.menu_sync import MENU_FIELDS, REQUIRED_FOR_INSERT, SAMPLE_MENU_PATH, read_menu_file, same_value
+
+MENU_VERSION_KEY = 'menu'
+
+class MenuCatalog:
+    __slots__ = ('version', 'updated_at', 'items_by_id', 'available', 'categories', 'welcome_text')
+    def __init__(self, version, rows, restaurant_name='Tasty Bites Restaurant', updated_at=None):
+        items = [MappingProxyType(dict(row)) for row in rows]
+        categories = {}
+        for item in items:
+            if item['available']:
+                categories.setdefault(item['category'], []).append(item)
+        self.version = version
+        self.updated_at = updated_at
+        self.items_by_id = MappingProxyType({item['id']: item for item in items})
+        self.available = tuple(item for item in items if item['available'])
+        self.categories = MappingProxyType({name: tuple(group) for name, group in categories.items()})
+        self.welcome_text = self.render_welcome_text(restaurant_name)
+    def render_welcome_text(self, restaurant_name):
+        lines = [f"🍽️ *Welcome to {restaurant_name}!*\n", "📋 *Our Menu:*\n"]
+        for category, items in self.categories.items():
+            lines.append(f"*{category}:*")
+            for item in items:
+                lines.append(f"• {item['name']} - ₹{item['price']}")
+            lines.append("")
+        lines.append("💡 *How to order:*")
+        lines.append("• Type item name to add to cart")
+        lines.append("• Or several at once: '2 biryani, 1 lassi'")
+        lines.append("• Type 'cart' to view your cart")
+        lines.append("• Type 'checkout' to place order")
+        lines.append("• Type 'clear' to empty cart")
+        lines.append("• Type 'top' for our bestsellers, 'reorder' or 'usual' to repeat an order")
+        return "\n".join(lines) + "\n"
+    def get(self, item_id):
+        item = self.items_by_id.get(item_id)
+        if item is None or not item['available']:
+            return None
+        return item
+
 class MenuManager:
-    def __init__(self, database):
+    def __init__(self, database, version_check_interval=1.0, restaurant_name='Tasty Bites Restaurant'):
         self.db = database
-    def load_sample_menu(self):
-        sample_items = [
-            {'name': 'Chicken Wings', 'description': 'Crispy chicken wings with BBQ sauce', 'price': 250, 'category': 'Appetizers'},
-            {'name': 'Veg Spring Rolls', 'description': 'Crispy vegetable spring rolls', 'price': 180, 'category': 'Appetizers'},
-            {'name': 'Paneer Tikka', 'description': 'Grilled paneer with spices', 'price': 220, 'category': 'Appetizers'},
-            {'name': 'Chicken Biryani', 'description': 'Fragrant basmati rice with chicken', 'price': 350, 'category': 'Main Course'},
-            {'name': 'Veg Biryani', 'description': 'Fragrant basmati rice with vegetables', 'price': 280, 'category': 'Main Course'},
-            {'name': 'Butter Chicken', 'description': 'Creamy tomato-based chicken curry', 'price': 320, 'category': 'Main Course'},
-            {'name': 'Dal Makhani', 'description': 'Rich and creamy black lentils', 'price': 200, 'category': 'Main Course'},
-            {'name': 'Mango Lassi', 'description': 'Creamy mango yogurt drink', 'price': 80, 'category': 'Beverages'},
-            {'name': 'Masala Chai', 'description': 'Spiced Indian tea', 'price': 40, 'category': 'Beverages'},
-            {'name': 'Fresh Lime Soda', 'description': 'Refreshing lime soda', 'price': 50, 'category': 'Beverages'},
-            {'name': 'Gulab Jamun', 'description': 'Sweet milk dumplings in syrup', 'price': 100, 'category': 'Desserts'},
-            {'name': 'Ice Cream', 'description': 'Vanilla, chocolate, or strawberry', 'price': 80, 'category': 'Desserts'},
-        ]
+        self.version_check_interval = version_check_interval
+        self.restaurant_name = restaurant_name
+        self._catalog = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.matcher = ItemMatcher()
+    def load_sample_menu(self, path=SAMPLE_MENU_PATH):
+        with self.db.get_connection() as conn:
+            if conn.execute('SELECT COUNT(*) FROM menu_items').fetchone()[0]:
+                return
+        # Matching by sku makes a concurrent load from another process a no-op.
+        with open(path, 'rb') as stream:
+            self.sync_items(read_menu_file(stream, 'json'))
+    def sync_items(self, rows, full=False, dry_run=False):
+        # Applies a whole menu file in one transaction: rows are matched to
+        # items by sku, and by case-insensitive name when the row has no
+        # sku or the item predates skus. Only changed rows are written, and
+        # the menu version is bumped once so every cache reloads a single
+        # time. With ``full``, items missing from the file are marked
+        # unavailable. ``rows`` is consumed once, inside the transaction,
+        # and only changed rows are kept, so memory follows the catalog
+        # and the changes rather than the size of the file.
+        summary = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'disabled': 0}
         with self.db.get_connection() as conn:
-            cursor = conn.execute('SELECT COUNT(*) FROM menu_items')
-            count = cursor.fetchone()[0]
-            if count == 0:
-                for item in sample_items:
-                    conn.execute('''
-                        INSERT INTO menu_items (name, description, price, category)
-                        VALUES (?, ?, ?, ?)
-                    ''', (item['name'], item['description'], item['price'], item['category']))
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                existing = [dict(row) for row in conn.execute('SELECT * FROM menu_items ORDER BY id')]
+                by_sku = {item['sku']: item for item in existing if item['sku']}
+                by_name = {}
+                for item in existing:
+                    by_name.setdefault(item['name'].lower(), item)
+                inserts, updates, seen, new_keys = [], [], set(), set()
+                for row in rows:
+                    current = by_sku.get(row.get('sku'))
+                    if current is None and row.get('name'):
+                        # A row with a sku only adopts an item that has none yet.
+                        current = by_name.get(row['name'].lower())
+                        if current is not None and row.get('sku') and current['sku']:
+                            current = None
+                    key = row.get('sku') or row.get('name', '').lower()
+                    if current is None:
+                        missing = [field for field in REQUIRED_FOR_INSERT if field not in row]
+                        if missing:
+                            raise ValueError(f"new item {key} needs {', '.join(missing)}")
+                        if key in new_keys:
+                            raise ValueError(f'{key} appears more than once')
+                        new_keys.add(key)
+                        inserts.append((row.get('sku'), row['name'], row.get('description', ''), row['price'],
+                                        row['category'], row.get('available', True), row.get('aliases', '')))
+                        continue
+                    if current['id'] in seen:
+                        raise ValueError(f'{key} appears more than once')
+                    seen.add(current['id'])
+                    merged = {field: row.get(field, current[field]) for field in MENU_FIELDS}
+                    if any(not same_value(merged[field], current[field]) for field in MENU_FIELDS):
+                        updates.append((*(merged[field] for field in MENU_FIELDS), current['id']))
+                    else:
+                        summary['unchanged'] += 1
+                disabled = [(item['id'],) for item in existing if full and item['id'] not in seen and item['available']]
+                summary.update(inserted=len(inserts), updated=len(updates), disabled=len(disabled))
+                if dry_run or not (inserts or updates or disabled):
+                    conn.rollback()
+                    return summary
+                conn.executemany('''
+                    INSERT INTO menu_items (sku, name, description, price, category, available, aliases)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', inserts)
+                conn.executemany(f'''
+                    UPDATE menu_items SET {', '.join(f'{field} = ?' for field in MENU_FIELDS)} WHERE id = ?
+                ''', updates)
+                conn.executemany('UPDATE menu_items SET available = 0 WHERE id = ?', disabled)
+                self.db.bump_version(conn, MENU_VERSION_KEY)
                 conn.commit()
-    def get_all_items(self):
+            except Exception:
+                conn.rollback()
+                raise
+        self.invalidate()
+        return summary
+    def update_item(self, item_id, **fields):
+        allowed = set(MENU_FIELDS)
+        updates = {key: value for key, value in fields.items() if key in allowed}
+        if not updates:
+            return False
+        assignments = ', '.join(f'{key} = ?' for key in updates)
+        with self.db.get_connection() as conn:
+            cursor = conn.execute(f'UPDATE menu_items SET {assignments} WHERE id = ?',
+                                  (*updates.values(), item_id))
+            if cursor.rowcount:
+                self.db.bump_version(conn, MENU_VERSION_KEY)
+            conn.commit()
+        self.invalidate()
+        return cursor.rowcount > 0
+    def set_availability(self, item_id, available):
+        return self.update_item(item_id, available=bool(available))
+    def invalidate(self):
+        with self._lock:
+            self._catalog = None
+    def _load_catalog(self):
         with self.db.get_connection() as conn:
-            cursor = conn.execute('SELECT * FROM menu_items WHERE available = TRUE')
-            return [dict(row) for row in cursor.fetchall()]
+            version, updated_at = self.db.get_version_info(MENU_VERSION_KEY, conn)
+            rows = conn.execute('SELECT * FROM menu_items ORDER BY id').fetchall()
+        return MenuCatalog(version, rows, restaurant_name=self.restaurant_name, updated_at=updated_at)
+    def get_catalog(self):
+        # The snapshot is shared read-only between threads; other workers'
+        # menu writes are picked up by polling the version row at most once
+        # per version_check_interval.
+        catalog = self._catalog
+        now = time.monotonic()
+        if catalog is not None and now - self._checked_at < self.version_check_interval:
+            return catalog
+        with self._lock:
+            catalog = self._catalog
+            if catalog is not None and now - self._checked_at < self.version_check_interval:
+                return catalog
+            if catalog is None or self.db.get_version(MENU_VERSION_KEY) != catalog.version:
+                catalog = self._load_catalog()
+                self.matcher.sync(catalog.available)
+                self._catalog = catalog
+            self._checked_at = now
+            return catalog
+    def get_welcome_text(self):
+        return self.get_catalog().welcome_text
+    def get_all_items(self):
+        return [dict(item) for item in self.get_catalog().available]
     def get_menu_by_category(self):
-        items = self.get_all_items()
-        categories = {}
-        for item in items:
-            category = item['category']
-            if category not in categories:
-                categories[category] = []
-            categories[category].append(item)
-        return categories
+        return {
+            category: [dict(item) for item in items]
+            for category, items in self.get_catalog().categories.items()
+        }
+    def get_item(self, item_id):
+        item = self.get_catalog().get(item_id)
+        return dict(item) if item else None
+    def match_items(self, text, limit=5):
+        catalog = self.get_catalog()
+        results = []
+        for match in self.matcher.match(text, limit):
+            item = catalog.get(match.item_id)
+            if item is not None:
+                results.append(dict(item, score=match.score))
+        return results
+    def resolve_item(self, text):
+        # Returns (item, candidates): item is None when nothing matched or
+        # when several items matched equally well and the caller must ask.
+        catalog = self.get_catalog()
+        resolution = self.matcher.resolve(text)
+        candidates = [dict(catalog.items_by_id[match.item_id]) for match in resolution.candidates
+                      if catalog.get(match.item_id) is not None]
+        if resolution.item_id is None:
+            return None, candidates
+        return self.get_item(resolution.item_id), candidates
     def get_item_by_name_or_id(self, identifier):
-        with self.db.get_connection() as conn:
-            cursor = conn.execute('''
-                SELECT * FROM menu_items 
-                WHERE LOWER(name) LIKE ? AND available = TRUE
-            ''', (f'%{identifier}%',))
-            result = cursor.fetchone()
-            if result:
-                return dict(result)
-            try:
-                item_id = int(identifier)
-                cursor = conn.execute('''
-                    SELECT * FROM menu_items 
-                    WHERE id = ? AND available = TRUE
-                ''', (item_id,))
-                result = cursor.fetchone()
-                if result:
-                    return dict(result)
-            except ValueError:
-                pass
-            return None
+        item, _ = self.resolve_item(identifier)
+        return item
+
+def main(argv):
+    from config import Config
+    from core.menu_sync import file_format_for
+    from core.tenancy import ShardMap
+    if len(argv) < 2 or argv[0] != 'sync':
+        print('usage: python -m core.menu_manager sync <menu.json|menu.ndjson|menu.csv> [--full] [--dry-run] [--tenant SLUG]')
+        return 1
+    path = argv[1]
+    slug = argv[argv.index('--tenant') + 1] if '--tenant' in argv[:-1] else None
+    shards = ShardMap.from_config(Config)
+    try:
+        services = shards.resolve(slug)
+        services.db.init_db()
+        with open(path, 'rb') as stream:
+            summary = services.menu_manager.sync_items(read_menu_file(stream, file_format_for(path)),
+                                                       full='--full' in argv, dry_run='--dry-run' in argv)
+    except (KeyError, ValueError) as e:
+        print(f'Menu sync failed: {e}')
+        return 1
+    finally:
+        shards.close()
+    print(f"{'Would apply' if '--dry-run' in argv else 'Applied'}: {summary}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,141 @@
+import codecs
+import csv
+import json
+import os
+
+MENU_FIELDS = ('sku', 'name', 'description', 'price', 'category', 'available', 'aliases')
+REQUIRED_FOR_INSERT = ('name', 'price', 'category')
+SAMPLE_MENU_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'sample_menu.json')
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ('1', 'true', 'yes', 'y', 'on'):
+        return True
+    if text in ('0', 'false', 'no', 'n', 'off'):
+        return False
+    raise ValueError(f'not a yes/no value: {value!r}')
+
+def same_value(new, old):
+    if isinstance(new, bool) or isinstance(old, bool):
+        return bool(new) == bool(old)
+    if isinstance(new, (int, float)) and isinstance(old, (int, float)):
+        return float(new) == float(old)
+    return (new or '') == (old or '')
+
+def normalize_row(raw):
+    # Keeps only the columns that are present, so a file with just sku and
+    # available (or sku and price) toggles those fields and nothing else.
+    row = {}
+    for field in MENU_FIELDS:
+        value = raw.get(field)
+        # A blank cell means "leave as is", except for the free-text columns.
+        if value is None or (isinstance(value, str) and not value.strip() and field not in ('description', 'aliases')):
+            continue
+        if field == 'price':
+            price = float(value)
+            if price < 0:
+                raise ValueError('price must not be negative')
+            row[field] = int(price) if price.is_integer() else price
+        elif field == 'available':
+            row[field] = parse_bool(value)
+        else:
+            row[field] = str(value).strip()
+    if not row.get('sku') and not row.get('name'):
+        raise ValueError('every item needs a sku or a name')
+    return row
+
+def iter_json_items(stream, chunk_size=64 * 1024):
+    # Yields the elements of a top-level JSON array, or of the "items"
+    # array of an object, one at a time, so only the chunk being decoded
+    # and the current item are in memory rather than the whole file.
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8-sig')()
+    buffer, pos, eof = '', 0, False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        if eof:
+            return False
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer, pos = buffer[pos:] + text.decode(chunk, final=eof), 0
+        return True
+
+    def peek():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buffer) or not fill():
+                return buffer[pos:pos + 1]
+
+    def value():
+        nonlocal pos
+        peek()
+        while True:
+            try:
+                result, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Most likely an item cut in half by the chunk boundary.
+                if not fill():
+                    raise
+                continue
+            # A number at the very end of the buffer may go on in the next chunk.
+            if end == len(buffer) and fill():
+                continue
+            pos = end
+            return result
+
+    if peek() == '{':
+        pos += 1
+        while peek() != '}':
+            key = value()
+            if peek() != ':':
+                raise ValueError('malformed JSON: expected ":"')
+            pos += 1
+            if key == 'items':
+                break
+            value()
+            if peek() == ',':
+                pos += 1
+        else:
+            return
+    if peek() != '[':
+        raise ValueError('JSON menu must be a list of items or {"items": [...]}')
+    pos += 1
+    if peek() == ']':
+        return
+    while True:
+        yield value()
+        separator = peek()
+        pos += 1
+        if separator == ']':
+            return
+        if separator != ',':
+            raise ValueError('malformed JSON: expected "," or "]"')
+
+def read_menu_file(stream, file_format):
+    # ``stream`` is a binary file object. Nothing is loaded whole: CSV and
+    # NDJSON (one item object per line) are read line by line, and JSON
+    # (a list of items or {"items": [...]}) item by item.
+    if file_format == 'csv':
+        rows = csv.DictReader(line.decode('utf-8-sig') for line in stream)
+    elif file_format == 'ndjson':
+        rows = (json.loads(line.decode('utf-8-sig')) for line in stream if line.strip())
+    elif file_format == 'json':
+        rows = iter_json_items(stream)
+    else:
+        raise ValueError('format must be csv, json or ndjson')
+    for line, raw in enumerate(rows, start=2 if file_format == 'csv' else 1):
+        try:
+            yield normalize_row(raw)
+        except (ValueError, TypeError, AttributeError) as e:
+            raise ValueError(f'{"line" if file_format == "csv" else "item"} {line}: {e}')
+
+def file_format_for(path):
+    path = path.lower()
+    if path.endswith('.csv'):
+        return 'csv'
+    return 'ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'json'
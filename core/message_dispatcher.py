@@ -0,0 +1,125 @@
+import logging
+import queue
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+class MemoryDedupStore:
+    def __init__(self, max_entries=100000, ttl=86400):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'checked': 0, 'duplicates': 0}
+    def seen(self, message_sid):
+        # Records the id and reports whether it had been recorded before.
+        now = time.monotonic()
+        with self._lock:
+            self._stats['checked'] += 1
+            recorded_at = self._seen.get(message_sid)
+            if recorded_at is not None and now - recorded_at <= self.ttl:
+                self._stats['duplicates'] += 1
+                return True
+            self._seen[message_sid] = now
+            self._seen.move_to_end(message_sid)
+            while len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
+            return False
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._seen)
+        return stats
+
+class SQLiteDedupStore:
+    # Shared by all workers, so a Twilio retry that lands on a different
+    # worker than the original delivery is still recognised.
+    def __init__(self, database, ttl=86400, sweep_interval=300.0):
+        self.db = database
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._swept_at = time.time()
+        self._lock = threading.Lock()
+        self._stats = {'checked': 0, 'duplicates': 0}
+    def seen(self, message_sid):
+        now = time.time()
+        with self.db.get_connection() as conn:
+            cursor = conn.execute('''
+                INSERT OR IGNORE INTO processed_messages (message_sid, received_at) VALUES (?, ?)
+            ''', (message_sid, now))
+            if now - self._swept_at > self.sweep_interval:
+                self._swept_at = now
+                conn.execute('DELETE FROM processed_messages WHERE received_at < ?', (now - self.ttl,))
+            conn.commit()
+        duplicate = cursor.rowcount == 0
+        with self._lock:
+            self._stats['checked'] += 1
+            self._stats['duplicates'] += int(duplicate)
+        return duplicate
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+def create_dedup_store(backend, database=None, max_entries=100000):
+    if backend == 'sqlite':
+        return SQLiteDedupStore(database)
+    if backend == 'memory':
+        return MemoryDedupStore(max_entries=max_entries)
+    raise ValueError(f'Unknown dedup backend: {backend}')
+
+class MessageDispatcher:
+    def __init__(self, handler, workers=4, max_queue=10000):
+        self.handler = handler
+        self.workers = workers
+        self._queues = [queue.Queue(maxsize=max(1, max_queue // workers)) for _ in range(workers)]
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stats = {'accepted': 0, 'rejected': 0, 'processed': 0, 'failed': 0}
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+    def start(self):
+        # Started on first submit so gunicorn forks before threads exist.
+        with self._lock:
+            if self._threads:
+                return
+            for index, work_queue in enumerate(self._queues):
+                thread = threading.Thread(target=self._worker, args=(work_queue,), name=f'webhook-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+    def stop(self, timeout=5.0):
+        for work_queue in self._queues:
+            work_queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+    def submit(self, phone_number, message_body):
+        # All messages from one number go to the same worker queue, so a
+        # customer's messages are handled strictly in arrival order.
+        self.start()
+        shard = zlib.crc32(phone_number.encode()) % self.workers
+        try:
+            self._queues[shard].put_nowait((phone_number, message_body))
+        except queue.Full:
+            self._count('rejected')
+            return False
+        self._count('accepted')
+        return True
+    def _worker(self, work_queue):
+        while True:
+            job = work_queue.get()
+            if job is None:
+                return
+            try:
+                self.handler(*job)
+                self._count('processed')
+            except Exception:
+                self._count('failed')
+                logger.exception('Failed to process queued message from %s', job[0])
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['queued'] = sum(work_queue.qsize() for work_queue in self._queues)
+        return stats
@@ -0,0 +1,126 @@
+import gzip
+import json
+import os
+import threading
+from collections import OrderedDict
+
+def archive_directory(config, database_path, slug=None):
+    if config.ORDER_ARCHIVE_DIR:
+        return os.path.join(config.ORDER_ARCHIVE_DIR, slug or 'default')
+    return os.path.splitext(database_path)[0] + '-archive'
+
+def order_matches(order, status=None, user_phone=None, start_date=None, end_date=None):
+    # Same filters as build_order_filters, for orders read back from files.
+    return ((not status or order['status'] == status)
+            and (not user_phone or order['user_phone'] == user_phone)
+            and (not start_date or order['created_at'] >= start_date)
+            and (not end_date or order['created_at'][:10] <= end_date))
+
+class OrderArchive:
+    # Cold storage for finished orders: one gzip'd NDJSON file per month
+    # of created_at, only ever appended to (each append is a new gzip
+    # member). The order_archives table in the hot database is the
+    # manifest, updated in the same transaction that deletes the rows, so
+    # readers know which months exist without listing the directory.
+    def __init__(self, database, directory, cached_months=4):
+        self.db = database
+        self.directory = directory
+        self.cached_months = cached_months
+        self._months = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'appended': 0, 'month_reads': 0, 'month_cache_hits': 0}
+    def path(self, month):
+        return os.path.join(self.directory, f'orders-{month}.ndjson.gz')
+    def append(self, conn, orders):
+        # The file is fsynced before the caller deletes the rows; a crash
+        # in between leaves the orders in both places, and the duplicate
+        # copy in the file is dropped on read.
+        by_month = OrderedDict()
+        for order in orders:
+            by_month.setdefault(order['created_at'][:7], []).append(order)
+        os.makedirs(self.directory, exist_ok=True)
+        for month, batch in by_month.items():
+            with open(self.path(month), 'ab') as raw:
+                with gzip.GzipFile(fileobj=raw, mode='ab') as out:
+                    for order in batch:
+                        out.write(json.dumps(order, separators=(',', ':'), default=str).encode() + b'\n')
+                raw.flush()
+                os.fsync(raw.fileno())
+            conn.execute('''
+                INSERT INTO order_archives (month, orders, first_id, last_id, newest, updated_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(month) DO UPDATE SET
+                    orders = orders + excluded.orders,
+                    first_id = MIN(first_id, excluded.first_id),
+                    last_id = MAX(last_id, excluded.last_id),
+                    newest = MAX(newest, excluded.newest),
+                    updated_at = CURRENT_TIMESTAMP
+            ''', (month, len(batch), min(o['id'] for o in batch), max(o['id'] for o in batch),
+                  max(o['created_at'] for o in batch)))
+        with self._lock:
+            self._stats['appended'] += len(orders)
+    def months(self, conn=None):
+        if conn is None:
+            with self.db.get_connection() as conn:
+                return self.months(conn)
+        return [dict(row) for row in conn.execute('SELECT * FROM order_archives ORDER BY month').fetchall()]
+    def horizon(self, conn=None):
+        # created_at of the newest archived order, or None. Queries that
+        # only reach back to after this never open a file.
+        if conn is None:
+            with self.db.get_connection() as conn:
+                return self.horizon(conn)
+        return conn.execute('SELECT MAX(newest) FROM order_archives').fetchone()[0]
+    def count(self, conn=None):
+        if conn is None:
+            with self.db.get_connection() as conn:
+                return self.count(conn)
+        return conn.execute('SELECT COALESCE(SUM(orders), 0) FROM order_archives').fetchone()[0]
+    def read_month(self, month):
+        # Orders of one month sorted by (created_at, id). Decoded months
+        # are cached keyed by file size, so an append invalidates them.
+        path = self.path(month)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return []
+        with self._lock:
+            cached = self._months.get(month)
+            if cached and cached[0] == size:
+                self._months.move_to_end(month)
+                self._stats['month_cache_hits'] += 1
+                return cached[1]
+        orders = {}
+        with gzip.open(path, 'rt', encoding='utf-8') as lines:
+            for line in lines:
+                order = json.loads(line)
+                orders[order['id']] = order
+        orders = sorted(orders.values(), key=lambda o: (o['created_at'], o['id']))
+        with self._lock:
+            self._stats['month_reads'] += 1
+            self._months[month] = (size, orders)
+            self._months.move_to_end(month)
+            while len(self._months) > self.cached_months:
+                self._months.popitem(last=False)
+        return orders
+    def iter_orders(self, status=None, user_phone=None, start_date=None, end_date=None, reverse=False):
+        # Only months overlapping the requested range are opened.
+        months = [m['month'] for m in self.months()
+                  if (not start_date or m['month'] >= start_date[:7]) and (not end_date or m['month'] <= end_date[:7])]
+        for month in (reversed(months) if reverse else months):
+            orders = self.read_month(month)
+            for order in (reversed(orders) if reverse else orders):
+                if order_matches(order, status, user_phone, start_date, end_date):
+                    yield dict(order)
+    def find(self, order_id):
+        months = [m['month'] for m in self.months() if m['first_id'] <= order_id <= m['last_id']]
+        for month in months:
+            for order in self.read_month(month):
+                if order['id'] == order_id:
+                    return dict(order)
+        return None
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['cached_months'] = len(self._months)
+        return stats
@@ -1,34 +1,155 @@
+import base64
+import heapq
 import json
+import sys
+from datetime import datetime, timedelta, timezone
+from core.order_writer import GroupCommitWriter
+from utils.constants import ARCHIVED_ORDER_STATUSES, ORDER_STATUSES
+
+ORDERS_VERSION_KEY = 'orders'
+
+def encode_cursor(created_at, order_id):
+    raw = json.dumps([created_at, order_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, order_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return str(created_at), int(order_id)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+def build_order_filters(status=None, user_phone=None, start_date=None, end_date=None, alias='o'):
+    clauses = []
+    params = []
+    if status:
+        clauses.append(f'{alias}.status = ?')
+        params.append(status)
+    if user_phone:
+        clauses.append(f'{alias}.user_phone = ?')
+        params.append(user_phone)
+    if start_date:
+        clauses.append(f'{alias}.created_at >= ?')
+        params.append(start_date)
+    if end_date:
+        clauses.append(f"{alias}.created_at < date(?, '+1 day')")
+        params.append(end_date)
+    return clauses, params
 class OrderManager:
-    def __init__(self, database):
+    def __init__(self, database, analytics=None, notifier=None, writer=None, recommendations=None, archive=None,
+                 notifications=None):
         self.db = database
+        self.analytics = analytics
+        self.notifier = notifier
+        self.notifications = notifications
+        self.recommendations = recommendations
+        self.archive = archive
+        self.writer = writer or GroupCommitWriter(database)
+    def _mark_changed(self, conn, order_id):
+        # Every write stamps the order with the next value of a shared
+        # counter, so "everything changed since version N" is an index
+        # range scan on orders.version.
+        version = self.db.bump_version(conn, ORDERS_VERSION_KEY)
+        conn.execute('UPDATE orders SET version = ? WHERE id = ?', (version, order_id))
+        return version
+    def _publish(self, version):
+        if self.notifier:
+            self.notifier.publish(version)
     def create_order(self, user_phone, cart_items, delivery_address):
+        order_id, version = self.writer.submit(
+            lambda conn: self._insert_order(conn, user_phone, cart_items, delivery_address))
+        self._publish(version)
+        if self.recommendations:
+            self.recommendations.record_order(user_phone, self.parse_line_items(cart_items), delivery_address)
+        return order_id
+    def _insert_order(self, conn, user_phone, cart_items, delivery_address):
         total_amount = sum(item['price'] * item['quantity'] for item in cart_items.values())
+        created_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        cursor = conn.execute('''
+            INSERT INTO orders (user_phone, items, total_amount, delivery_address, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (user_phone, json.dumps(cart_items), total_amount, delivery_address, created_at))
+        order_id = cursor.lastrowid
+        line_items = self.parse_line_items(cart_items)
+        conn.executemany('''
+            INSERT INTO order_items (order_id, menu_item_id, name, unit_price, quantity)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(order_id, item['item_id'], item['name'], item['price'], item['quantity']) for item in line_items])
+        conn.execute('''
+            UPDATE users 
+            SET order_count = order_count + 1, 
+                total_spent = total_spent + ?,
+                last_interaction = CURRENT_TIMESTAMP
+            WHERE phone_number = ?
+        ''', (total_amount, user_phone))
+        conn.executemany('''
+            INSERT INTO order_frequency (user_phone, menu_item_id, frequency, last_ordered)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(user_phone, menu_item_id) DO UPDATE SET
+                frequency = frequency + excluded.frequency,
+                last_ordered = CURRENT_TIMESTAMP
+        ''', [(user_phone, item['item_id'], item['quantity']) for item in line_items])
+        if self.analytics:
+            self.analytics.record_order(conn, created_at, total_amount, 'pending', line_items)
+        return order_id, self._mark_changed(conn, order_id)
+    def update_order_status(self, order_id, status):
+        if status not in ORDER_STATUSES:
+            raise ValueError(f'Unknown order status: {status}')
         with self.db.get_connection() as conn:
-            cursor = conn.execute('''
-                INSERT INTO orders (user_phone, items, total_amount, delivery_address)
-                VALUES (?, ?, ?, ?)
-            ''', (user_phone, json.dumps(cart_items), total_amount, delivery_address))
-            order_id = cursor.lastrowid
-            conn.execute('''
-                UPDATE users 
-                SET order_count = order_count + 1, 
-                    total_spent = total_spent + ?,
-                    last_interaction = CURRENT_TIMESTAMP
-                WHERE phone_number = ?
-            ''', (total_amount, user_phone))
-            for item_id, item_data in cart_items.items():
-                conn.execute('''
-                    INSERT INTO order_frequency (user_phone, menu_item_id, frequency, last_ordered)
-                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-                    ON CONFLICT(user_phone, menu_item_id) DO UPDATE SET
-                        frequency = frequency + ?,
-                        last_ordered = CURRENT_TIMESTAMP
-                ''', (user_phone, item_id, item_data['quantity'], item_data['quantity']))
+            # Take the write lock before reading the old status; otherwise two
+            # concurrent changes both see it and the status rollup drifts.
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT id, user_phone, status, created_at FROM orders WHERE id = ?', (order_id,)).fetchone()
+            if row is None:
+                return None
+            if row['status'] == status:
+                order = dict(row)
+                order['previous_status'] = status
+                return order
+            conn.execute('UPDATE orders SET status = ? WHERE id = ?', (status, order_id))
+            if self.analytics:
+                self.analytics.record_status_change(conn, row['created_at'], row['status'], status)
+            # The customer's update commits or rolls back with the status.
+            outbox_id = None
+            if self.notifications:
+                outbox_id = self.notifications.notify_order_status(order_id, row['user_phone'], status, conn=conn)
+            version = self._mark_changed(conn, order_id)
             conn.commit()
-            return order_id
-    def get_all_orders(self):
+        self._publish(version)
+        if outbox_id:
+            self.notifications.submit(outbox_id, row['user_phone'])
+        order = dict(row)
+        order['previous_status'] = order['status']
+        order['status'] = status
+        order['version'] = version
+        return order
+    def get_orders_version(self):
+        return self.db.get_version(ORDERS_VERSION_KEY)
+    def get_orders_version_info(self):
+        # Read from the same place as the reports it validates, so an ETag
+        # never vouches for a newer version than the body it was built from.
+        with self.db.get_read_connection() as conn:
+            return self.db.get_version_info(ORDERS_VERSION_KEY, conn)
+    def get_changes(self, since_version, limit=100):
+        # Orders created or updated after ``since_version``, oldest change
+        # first; the last order's version is the client's next checkpoint.
         with self.db.get_connection() as conn:
+            rows = conn.execute('''
+                SELECT o.*, u.order_count, u.total_spent
+                FROM orders o
+                JOIN users u ON o.user_phone = u.phone_number
+                WHERE o.version > ?
+                ORDER BY o.version
+                LIMIT ?
+            ''', (since_version, limit)).fetchall()
+            orders = [dict(row) for row in rows]
+            line_items = self.get_line_items(conn, orders)
+        for order in orders:
+            order['items'] = line_items[order['id']]
+        return orders
+    def get_all_orders(self):
+        with self.db.get_read_connection() as conn:
             cursor = conn.execute('''
                 SELECT o.*, u.order_count, u.total_spent
                 FROM orders o
@@ -36,18 +157,216 @@ class OrderManager:
                 ORDER BY o.created_at DESC
             ''')
             return [dict(row) for row in cursor.fetchall()]
-    def get_user_orders(self, user_phone):
+    def get_order(self, order_id):
+        with self.db.get_connection() as conn:
+            cursor = conn.execute('''
+                SELECT o.*, u.order_count, u.total_spent
+                FROM orders o
+                JOIN users u ON o.user_phone = u.phone_number
+                WHERE o.id = ?
+            ''', (order_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return self._find_archived(conn, order_id)
+            order = dict(row)
+            order['items'] = self.get_line_items(conn, [order])[order['id']]
+            return order
+    def _find_archived(self, conn, order_id):
+        order = self.archive.find(order_id) if self.archive else None
+        if order is not None:
+            self._attach_user_totals(conn, [order])
+        return order
+    def _attach_user_totals(self, conn, orders):
+        # Archived orders carry only their own columns; hot queries join
+        # users for order_count and total_spent, so add the same fields.
+        phones = list({order['user_phone'] for order in orders})
+        if not phones:
+            return
+        placeholders = ', '.join('?' * len(phones))
+        rows = conn.execute(f'''
+            SELECT phone_number, order_count, total_spent FROM users WHERE phone_number IN ({placeholders})
+        ''', phones).fetchall()
+        totals = {row['phone_number']: row for row in rows}
+        for order in orders:
+            user = totals.get(order['user_phone'])
+            order['order_count'] = user['order_count'] if user else 0
+            order['total_spent'] = user['total_spent'] if user else 0
+    def _needs_archive(self, conn, start_date=None, oldest=None):
+        # The archive is only opened when the requested range reaches back
+        # past the newest archived order: no start date (or an older one),
+        # and the hot rows alone didn't already fill the page with newer
+        # orders.
+        if self.archive is None:
+            return False
+        horizon = self.archive.horizon(conn)
+        if horizon is None or (start_date and start_date > horizon):
+            return False
+        return oldest is None or oldest <= horizon
+    def archive_orders(self, before, batch_size=500):
+        # Moves finished orders created before ``before`` out of the hot
+        # tables in small committed batches. The rollup tables,
+        # order_frequency and the users totals already count them and are
+        # left alone, so reports don't change.
+        archived = 0
+        placeholders = ', '.join('?' * len(ARCHIVED_ORDER_STATUSES))
+        while True:
+            with self.db.get_connection() as conn:
+                rows = conn.execute(f'''
+                    SELECT o.* FROM orders o
+                    WHERE o.created_at < ? AND o.status IN ({placeholders})
+                    ORDER BY o.created_at, o.id
+                    LIMIT ?
+                ''', (before, *ARCHIVED_ORDER_STATUSES, batch_size)).fetchall()
+                if not rows:
+                    return archived
+                orders = [dict(row) for row in rows]
+                line_items = self.get_line_items(conn, orders)
+                for order in orders:
+                    order['items'] = line_items[order['id']]
+                self.archive.append(conn, orders)
+                ids = [order['id'] for order in orders]
+                id_placeholders = ', '.join('?' * len(ids))
+                conn.execute(f'DELETE FROM order_items WHERE order_id IN ({id_placeholders})', ids)
+                conn.execute(f'DELETE FROM orders WHERE id IN ({id_placeholders})', ids)
+                conn.commit()
+            archived += len(orders)
+    def get_line_items(self, conn, orders):
+        # One indexed query for a whole batch of orders. Orders written
+        # before order_items existed and not yet migrated fall back to
+        # their JSON blob.
+        line_items = {order['id']: [] for order in orders}
+        if not line_items:
+            return line_items
+        placeholders = ', '.join('?' * len(line_items))
+        rows = conn.execute(f'''
+            SELECT order_id, menu_item_id, name, unit_price, quantity
+            FROM order_items
+            WHERE order_id IN ({placeholders})
+            ORDER BY order_id, id
+        ''', list(line_items)).fetchall()
+        for row in rows:
+            line_items[row['order_id']].append({
+                'item_id': row['menu_item_id'], 'name': row['name'],
+                'price': row['unit_price'], 'quantity': row['quantity'],
+            })
+        for order in orders:
+            if not line_items[order['id']] and order.get('items'):
+                line_items[order['id']] = self.parse_line_items(order['items'])
+        return line_items
+    def migrate_order_items(self, batch_size=500):
+        # Copies line items out of the legacy JSON blob in small committed
+        # batches, so it can run against a live database and be resumed:
+        # orders that already have order_items rows are skipped.
+        migrated = 0
+        last_id = 0
+        while True:
+            with self.db.get_connection() as conn:
+                rows = conn.execute('''
+                    SELECT o.id, o.items FROM orders o
+                    WHERE o.id > ? AND NOT EXISTS (SELECT 1 FROM order_items i WHERE i.order_id = o.id)
+                    ORDER BY o.id
+                    LIMIT ?
+                ''', (last_id, batch_size)).fetchall()
+                if not rows:
+                    return migrated
+                conn.executemany('''
+                    INSERT INTO order_items (order_id, menu_item_id, name, unit_price, quantity)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', [(row['id'], item['item_id'], item['name'], item['price'], item['quantity'])
+                      for row in rows for item in self.parse_line_items(row['items'])])
+                conn.commit()
+            migrated += len(rows)
+            last_id = rows[-1]['id']
+    def list_orders(self, limit=50, cursor=None, status=None, user_phone=None, start_date=None, end_date=None):
+        # Keyset pagination on (created_at, id): each page is an index range
+        # scan starting where the previous page stopped, so deep pages cost
+        # the same as the first one.
+        clauses, params = build_order_filters(status, user_phone, start_date, end_date)
+        if cursor:
+            clauses.append('(o.created_at, o.id) < (?, ?)')
+            params.extend(decode_cursor(cursor))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        with self.db.get_read_connection() as conn:
+            rows = conn.execute(f'''
+                SELECT o.*, u.order_count, u.total_spent
+                FROM orders o
+                JOIN users u ON o.user_phone = u.phone_number
+                {where}
+                ORDER BY o.created_at DESC, o.id DESC
+                LIMIT ?
+            ''', (*params, limit + 1)).fetchall()
+            rows = [dict(row) for row in rows]
+            # Same line item shape as archived orders and the live feed.
+            line_items = self.get_line_items(conn, rows)
+            for order in rows:
+                order['items'] = line_items[order['id']]
+            oldest = rows[-1]['created_at'] if len(rows) > limit else None
+            if self._needs_archive(conn, start_date, oldest):
+                archived = []
+                before = decode_cursor(cursor) if cursor else None
+                for order in self.archive.iter_orders(status, user_phone, start_date, end_date, reverse=True):
+                    if before and (order['created_at'], order['id']) >= before:
+                        continue
+                    archived.append(order)
+                    if len(archived) > limit:
+                        break
+                self._attach_user_totals(conn, archived)
+                rows = heapq.nlargest(limit + 1, rows + archived, key=lambda o: (o['created_at'], o['id']))
+        orders = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit:
+            last = orders[-1]
+            next_cursor = encode_cursor(last['created_at'], last['id'])
+        return orders, next_cursor
+    def iter_orders(self, status=None, user_phone=None, start_date=None, end_date=None, chunk_size=500):
+        # Archived orders, when the range reaches them, are merged in
+        # (created_at, id) order with the hot ones.
+        hot = self._iter_hot_orders(status, user_phone, start_date, end_date, chunk_size)
+        with self.db.get_read_connection() as conn:
+            needs_archive = self._needs_archive(conn, start_date)
+        if not needs_archive:
+            return hot
+        archived = self.archive.iter_orders(status, user_phone, start_date, end_date)
+        return heapq.merge(archived, hot, key=lambda o: (o['created_at'], o['id']))
+    def _iter_hot_orders(self, status=None, user_phone=None, start_date=None, end_date=None, chunk_size=500):
+        clauses, params = build_order_filters(status, user_phone, start_date, end_date)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        with self.db.get_read_connection() as conn:
+            cursor = conn.execute(f'''
+                SELECT o.* FROM orders o
+                {where}
+                ORDER BY o.created_at, o.id
+            ''', params)
+            while True:
+                orders = [dict(row) for row in cursor.fetchmany(chunk_size)]
+                if not orders:
+                    break
+                line_items = self.get_line_items(conn, orders)
+                for order in orders:
+                    order['items'] = line_items[order['id']]
+                    yield order
+    @staticmethod
+    def parse_line_items(items):
+        cart = json.loads(items) if isinstance(items, str) else (items or {})
+        return [
+            {'item_id': int(item_id), 'name': item.get('name', str(item_id)),
+             'price': item['price'], 'quantity': item['quantity']}
+            for item_id, item in cart.items()
+        ]
+    def get_user_orders(self, user_phone, limit=20):
         with self.db.get_connection() as conn:
             cursor = conn.execute('''
                 SELECT * FROM orders 
                 WHERE user_phone = ? 
-                ORDER BY created_at DESC
-            ''', (user_phone,))
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            ''', (user_phone, limit))
             return [dict(row) for row in cursor.fetchall()]
     def get_total_orders(self):
-        with self.db.get_connection() as conn:
+        with self.db.get_read_connection() as conn:
             cursor = conn.execute('SELECT COUNT(*) FROM orders')
-            return cursor.fetchone()[0]
+            total = cursor.fetchone()[0]
+            return total + self.archive.count(conn) if self.archive else total
     def get_popular_items(self, limit=10):
         with self.db.get_connection() as conn:
             cursor = conn.execute('''
@@ -59,3 +378,36 @@ class OrderManager:
                 LIMIT ?
             ''', (limit,))
             return [dict(row) for row in cursor.fetchall()]
+
+def main(argv):
+    from config import Config
+    from core.tenancy import ShardMap
+    if argv[:1] not in (['migrate-items'], ['archive']):
+        print('usage: python -m core.order_manager migrate-items | archive [days] [--vacuum] [--tenant SLUG]')
+        return 1
+    slug = argv[argv.index('--tenant') + 1] if '--tenant' in argv[:-1] else None
+    days = int(argv[1]) if len(argv) > 1 and argv[1].isdigit() else Config.ORDER_ARCHIVE_AFTER_DAYS
+    before = (datetime.now(timezone.utc) - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+    shards = ShardMap.from_config(Config)
+    try:
+        for slug, services in shards.select(slug):
+            services.db.init_db()
+            if argv[0] == 'migrate-items':
+                print(f'{slug}: migrated line items for {services.order_manager.migrate_order_items()} orders')
+                continue
+            # Meant for a nightly cron job; run one at a time, the archive
+            # files are appended to without locking.
+            archived = services.order_manager.archive_orders(before)
+            if '--vacuum' in argv and archived:
+                with services.db.get_connection() as conn:
+                    conn.execute('VACUUM')
+            print(f'{slug}: archived {archived} orders created before {before}')
+    except KeyError as e:
+        print(f'Unknown tenant: {e}')
+        return 1
+    finally:
+        shards.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,99 @@
+import re
+from collections import namedtuple
+
+ParsedLine = namedtuple('ParsedLine', ['item', 'quantity'])
+Unresolved = namedtuple('Unresolved', ['text', 'candidates'])
+ParsedOrder = namedtuple('ParsedOrder', ['lines', 'unresolved', 'multi'])
+
+NUMBER_WORDS = {
+    'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5,
+    'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12,
+}
+QUANTITY = r'(?P<qty>\d{1,3}|' + '|'.join(sorted(NUMBER_WORDS, key=len, reverse=True)) + r')'
+UNIT = r'(?:x|×|nos?|pcs?|plates?|portions?)'
+
+# "2 chicken biryani, 1 mango lassi and 3 gulab jamun": hard separators
+# split first; "and"/"plus" only split when the text around them is not
+# itself a menu item name.
+HARD_SPLIT_RE = re.compile(r'\s*(?:[,;\n&+]|\bthen\b)\s*')
+SOFT_SPLIT_RE = re.compile(r'\s+(?:and|plus)\s+')
+LEADING_QTY_RE = re.compile(rf'^{QUANTITY}\s*{UNIT}?\s+(?:of\s+)?(?P<name>.+)$')
+TRAILING_QTY_RE = re.compile(rf'^(?P<name>.+?)\s*(?:{UNIT}\s*(?P<qty>\d{{1,3}})|\s(?P<qty2>\d{{1,3}})\s*{UNIT}?)$')
+
+def split_leading_quantity(fragment):
+    match = LEADING_QTY_RE.match(fragment)
+    if match:
+        qty = match.group('qty')
+        return (int(qty) if qty.isdigit() else NUMBER_WORDS[qty]), match.group('name').strip()
+    return None
+
+def split_trailing_quantity(fragment):
+    match = TRAILING_QTY_RE.match(fragment)
+    if match:
+        return int(match.group('qty') or match.group('qty2')), match.group('name').strip()
+    return None
+
+def split_quantity(fragment):
+    # Returns (quantity or None, name). A bare number is left alone: in
+    # the browsing state it is an item id, not a quantity.
+    return split_leading_quantity(fragment) or split_trailing_quantity(fragment) or (None, fragment.strip())
+
+class OrderParser:
+    def __init__(self, menu_manager, max_quantity=50):
+        self.menu_manager = menu_manager
+        self.max_quantity = max_quantity
+    def _is_item_name(self, text):
+        # A bare number would match an item id, not a name.
+        if text.strip().isdigit():
+            return False
+        matches = self.menu_manager.match_items(text, limit=1)
+        return bool(matches) and matches[0]['score'] >= 1.0
+    def _split_quantity(self, fragment):
+        # The whole fragment is tried as a name first, so items whose name
+        # starts or ends with a number ("7 Up", "Chicken 65") keep it; then
+        # whichever end's number leaves an exact name ("7 up 2").
+        if self._is_item_name(fragment):
+            return None, fragment.strip()
+        splits = [split for split in (split_leading_quantity(fragment), split_trailing_quantity(fragment)) if split]
+        for quantity, name in splits:
+            if self._is_item_name(name):
+                return quantity, name
+        return splits[0] if splits else (None, fragment.strip())
+    def split(self, text):
+        fragments = []
+        for chunk in HARD_SPLIT_RE.split(text.strip()):
+            if not chunk:
+                continue
+            quantity, name = self._split_quantity(chunk)
+            if SOFT_SPLIT_RE.search(name) and not self._is_item_name(name):
+                parts = [part for part in SOFT_SPLIT_RE.split(chunk) if part]
+                fragments.extend(self._split_quantity(part) for part in parts)
+            else:
+                fragments.append((quantity, name))
+        return fragments
+    def parse(self, text):
+        # ``multi`` tells the caller whether this looked like an order line
+        # at all (several fragments or an explicit quantity); a lone item
+        # name keeps going through the ask-for-quantity flow.
+        fragments = self.split(text)
+        multi = len(fragments) > 1 or any(quantity is not None for quantity, _ in fragments)
+        quantities = {}
+        items = {}
+        unresolved = []
+        for quantity, name in fragments:
+            if not name:
+                continue
+            item, candidates = self.menu_manager.resolve_item(name)
+            if item is None:
+                unresolved.append(Unresolved(name, candidates))
+                continue
+            if quantity is None:
+                quantity = 1
+            if not 0 < quantity <= self.max_quantity:
+                limit = 'at least 1' if quantity < 1 else f'at most {self.max_quantity} at a time'
+                unresolved.append(Unresolved(f"{quantity} x {item['name']} ({limit})", []))
+                continue
+            items[item['id']] = item
+            quantities[item['id']] = quantities.get(item['id'], 0) + quantity
+        lines = [ParsedLine(items[item_id], quantity) for item_id, quantity in quantities.items()]
+        return ParsedOrder(lines, unresolved, multi)
@@ -0,0 +1,97 @@
+import threading
+import time
+
+class _PendingWrite:
+    __slots__ = ('write', 'result', 'error', 'promoted', 'done')
+    def __init__(self, write):
+        self.write = write
+        self.result = None
+        self.error = None
+        self.promoted = False
+        self.done = threading.Event()
+    def outcome(self):
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+class GroupCommitWriter:
+    # Coalesces writes from concurrent threads into one transaction, so a
+    # burst of confirmed orders costs one commit (and one fsync under
+    # synchronous=FULL) instead of one each. There is no writer thread:
+    # the first caller leads, optionally waits ``window`` seconds for
+    # company, commits everything queued and hands leadership to the next
+    # waiter. Writes that arrive during a commit form the next batch, so
+    # batches grow with load even without a window.
+    def __init__(self, database, window=0.0, max_batch=64):
+        self.db = database
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = []
+        self._leading = False
+        self._lock = threading.Lock()
+        self._stats = {'writes': 0, 'failed': 0, 'batches': 0, 'largest_batch': 0}
+    def submit(self, write):
+        # ``write(conn)`` runs inside the shared transaction under its own
+        # savepoint, so one failing write doesn't undo the rest of the batch.
+        pending = _PendingWrite(write)
+        with self._lock:
+            self._queue.append(pending)
+            lead = not self._leading
+            self._leading = True
+        if lead:
+            if self.window > 0:
+                time.sleep(self.window)
+        else:
+            pending.done.wait()
+            if not pending.promoted:
+                return pending.outcome()
+        self._lead()
+        return pending.outcome()
+    def _lead(self):
+        with self._lock:
+            batch = self._queue[:self.max_batch]
+            del self._queue[:self.max_batch]
+        try:
+            self._commit(batch)
+        finally:
+            with self._lock:
+                if self._queue:
+                    successor = self._queue[0]
+                    successor.promoted = True
+                    successor.done.set()
+                else:
+                    self._leading = False
+            for pending in batch:
+                pending.done.set()
+    def _commit(self, batch):
+        failed = 0
+        with self.db.get_connection() as conn:
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                for pending in batch:
+                    conn.execute('SAVEPOINT order_write')
+                    try:
+                        pending.result = pending.write(conn)
+                    except Exception as e:
+                        conn.execute('ROLLBACK TO SAVEPOINT order_write')
+                        pending.error = e
+                        failed += 1
+                    conn.execute('RELEASE SAVEPOINT order_write')
+                conn.commit()
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.rollback()
+                for pending in batch:
+                    if pending.error is None:
+                        pending.result, pending.error = None, e
+                        failed += 1
+        with self._lock:
+            self._stats['writes'] += len(batch)
+            self._stats['failed'] += failed
+            self._stats['batches'] += 1
+            self._stats['largest_batch'] = max(self._stats['largest_batch'], len(batch))
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['queued'] = len(self._queue)
+        return stats
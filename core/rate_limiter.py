@@ -0,0 +1,77 @@
+import threading
+import time
+from collections import OrderedDict
+
+ALLOWED = 'allowed'
+LIMITED = 'limited'
+SHED = 'shed'
+
+class WebhookLimiter:
+    # Token bucket per sender plus a cap on messages handled at once, so a
+    # looping or spamming number (or a bot storm) is turned away before it
+    # reaches the bot and the database. A bucket is a (tokens, updated_at,
+    # warned) tuple in an LRU-ordered dict; a bucket idle long enough to
+    # have refilled is the same as no bucket, so the oldest ones are
+    # dropped lazily as new senders arrive, and max_entries bounds memory
+    # however many distinct numbers show up.
+    def __init__(self, rate=1.0, burst=10, max_concurrent=32, max_entries=100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_entries = max_entries
+        self.max_concurrent = max_concurrent
+        self.refill_seconds = burst / rate if rate > 0 else float('inf')
+        self._buckets = OrderedDict()
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._stats = {'allowed': 0, 'limited': 0, 'shed': 0, 'expired': 0, 'evicted': 0}
+    def acquire(self, key):
+        # Returns (ALLOWED, None), (LIMITED, first) or (SHED, None). An
+        # allowed caller must call release() when done. ``first`` is True
+        # only for the first rejection in a row, so a looping sender gets
+        # one warning instead of a reply to every message.
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if self.rate > 0:
+                tokens, updated_at, warned = self._buckets.pop(key, (self.burst, now, False))
+                tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+                if tokens < 1:
+                    self._store(key, (tokens, now, True))
+                    self._stats['limited'] += 1
+                    return LIMITED, not warned
+            if self.max_concurrent and self._in_flight >= self.max_concurrent:
+                # Shedding doesn't spend the sender's token; the message
+                # never ran.
+                if self.rate > 0:
+                    self._store(key, (tokens, now, warned))
+                self._stats['shed'] += 1
+                return SHED, None
+            if self.rate > 0:
+                self._store(key, (tokens - 1, now, False))
+            self._in_flight += 1
+            self._stats['allowed'] += 1
+            return ALLOWED, None
+    def _store(self, key, bucket):
+        self._buckets[key] = bucket
+        while len(self._buckets) > self.max_entries:
+            self._buckets.popitem(last=False)
+            self._stats['evicted'] += 1
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+    def _expire(self, now, budget=8):
+        # A few entries per call keeps the sweep O(1) per message.
+        for _ in range(budget):
+            if not self._buckets:
+                return
+            key, (tokens, updated_at, warned) = next(iter(self._buckets.items()))
+            if now - updated_at < self.refill_seconds:
+                return
+            del self._buckets[key]
+            self._stats['expired'] += 1
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = self._in_flight
+            stats['tracked_numbers'] = len(self._buckets)
+        return stats
@@ -0,0 +1,146 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from utils.constants import USER_STATES
+
+class Session:
+    __slots__ = ('state', 'cart', 'current_item_id', 'location')
+    def __init__(self, state=USER_STATES['MENU_BROWSING'], cart=None, current_item_id=None, location=None):
+        self.state = state
+        self.cart = cart if cart is not None else {}
+        self.current_item_id = current_item_id
+        self.location = location
+    def is_idle(self):
+        return (self.state == USER_STATES['MENU_BROWSING'] and not self.cart
+                and self.current_item_id is None and self.location is None)
+    def dumps(self):
+        return json.dumps({
+            's': self.state,
+            'c': [[item_id, quantity] for item_id, quantity in self.cart.items()],
+            'i': self.current_item_id,
+            'l': self.location,
+        }, separators=(',', ':'))
+    @classmethod
+    def loads(cls, data):
+        raw = json.loads(data)
+        return cls(raw['s'], {item_id: quantity for item_id, quantity in raw['c']}, raw['i'], raw['l'])
+
+class MemorySessionBackend:
+    def __init__(self, ttl=1800, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'writes': 0, 'expired': 0, 'evicted': 0}
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            session, touched = entry
+            if now - touched > self.ttl:
+                del self._entries[key]
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return session
+    def set(self, key, session):
+        with self._lock:
+            self._entries[key] = (session, time.monotonic())
+            self._entries.move_to_end(key)
+            self._stats['writes'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evicted'] += 1
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        stats['backend'] = 'memory'
+        return stats
+
+class SQLiteSessionBackend:
+    # Shared between gunicorn workers through the sessions table, so any
+    # worker can pick up a conversation without sticky routing.
+    def __init__(self, database, ttl=1800, sweep_interval=60.0):
+        self.db = database
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._swept_at = time.time()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'writes': 0, 'expired': 0, 'evicted': 0}
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+    def get(self, key):
+        with self.db.get_connection() as conn:
+            row = conn.execute('SELECT data, updated_at FROM sessions WHERE phone_number = ?', (key,)).fetchone()
+        if row is None:
+            self._count('misses')
+            return None
+        if time.time() - row['updated_at'] > self.ttl:
+            self._count('expired')
+            self._count('misses')
+            return None
+        self._count('hits')
+        return Session.loads(row['data'])
+    def set(self, key, session):
+        now = time.time()
+        with self.db.get_connection() as conn:
+            conn.execute('''
+                INSERT INTO sessions (phone_number, data, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(phone_number) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at
+            ''', (key, session.dumps(), now))
+            conn.commit()
+        self._count('writes')
+        if now - self._swept_at > self.sweep_interval:
+            self.sweep()
+    def delete(self, key):
+        with self.db.get_connection() as conn:
+            conn.execute('DELETE FROM sessions WHERE phone_number = ?', (key,))
+            conn.commit()
+    def sweep(self):
+        self._swept_at = time.time()
+        with self.db.get_connection() as conn:
+            cursor = conn.execute('DELETE FROM sessions WHERE updated_at < ?', (self._swept_at - self.ttl,))
+            conn.commit()
+        self._count('evicted', cursor.rowcount)
+        return cursor.rowcount
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        with self.db.get_connection() as conn:
+            stats['size'] = conn.execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+        stats['backend'] = 'sqlite'
+        return stats
+
+class SessionStore:
+    def __init__(self, backend):
+        self.backend = backend
+    def get(self, phone_number):
+        session = self.backend.get(phone_number)
+        return session if session is not None else Session()
+    def save(self, phone_number, session):
+        # Idle sessions carry no information, so they are dropped rather
+        # than stored; this keeps one-off "hi" senders out of the store.
+        if session.is_idle():
+            self.backend.delete(phone_number)
+        else:
+            self.backend.set(phone_number, session)
+    def stats(self):
+        return self.backend.stats()
+
+def create_session_store(backend, database=None, ttl=1800, max_entries=10000):
+    if backend == 'sqlite':
+        return SessionStore(SQLiteSessionBackend(database, ttl=ttl))
+    if backend == 'memory':
+        return SessionStore(MemorySessionBackend(ttl=ttl, max_entries=max_entries))
+    raise ValueError(f'Unknown session backend: {backend}')
@@ -0,0 +1,113 @@
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from core.app_services import AppServices
+
+logger = logging.getLogger(__name__)
+
+class Tenant:
+    __slots__ = ('slug', 'name', 'database_path', 'numbers', 'default')
+    def __init__(self, slug, name, database_path, numbers=(), default=False):
+        self.slug = slug
+        self.name = name
+        self.database_path = database_path
+        self.numbers = tuple(number.replace('whatsapp:', '') for number in numbers if number)
+        self.default = default
+    def to_dict(self):
+        return {'slug': self.slug, 'name': self.name, 'numbers': list(self.numbers), 'default': self.default}
+
+def load_tenants(config):
+    # Without a TENANTS_FILE the deployment is a single outlet backed by
+    # DATABASE_PATH, which is how the app has always run.
+    if not config.TENANTS_FILE:
+        return [Tenant('default', config.RESTAURANT_NAME, config.DATABASE_PATH, [config.TWILIO_PHONE_NUMBER], default=True)]
+    with open(config.TENANTS_FILE) as handle:
+        entries = json.load(handle)
+    tenants = [Tenant(entry['slug'], entry['name'], entry['database'], entry.get('numbers', ()), entry.get('default', False))
+               for entry in entries]
+    if not tenants:
+        raise ValueError(f'{config.TENANTS_FILE} defines no tenants')
+    if len({tenant.slug for tenant in tenants}) != len(tenants):
+        raise ValueError(f'{config.TENANTS_FILE} has duplicate tenant slugs')
+    if len(tenants) == 1:
+        tenants[0].default = True
+    return tenants
+
+class ShardMap:
+    # One AppServices per tenant: its own SQLite file, connection pool,
+    # menu cache, session store and outbox, so busy outlets never wait on
+    # each other's write lock.
+    def __init__(self, tenants, build, fanout_workers=8):
+        self.tenants = {tenant.slug: tenant for tenant in tenants}
+        self.shards = {tenant.slug: build(tenant) for tenant in tenants}
+        self.by_number = {number: tenant.slug for tenant in tenants for number in tenant.numbers}
+        defaults = [tenant.slug for tenant in tenants if tenant.default]
+        self.default_slug = defaults[0] if defaults else None
+        self.fanout_workers = fanout_workers
+        self._executor = None
+    @classmethod
+    def from_config(cls, config, transport=None):
+        return cls(load_tenants(config), lambda tenant: AppServices(config, transport=transport, tenant=tenant),
+                   fanout_workers=config.TENANT_FANOUT_WORKERS)
+    def resolve(self, slug=None, number=None):
+        # An explicit URL prefix wins over the receiving number; anything
+        # unmatched goes to the default tenant, if there is one.
+        if slug is not None:
+            return self.shards[slug]
+        if number and number in self.by_number:
+            return self.shards[self.by_number[number]]
+        if self.default_slug is None:
+            raise KeyError(number)
+        return self.shards[self.default_slug]
+    def __iter__(self):
+        return iter(self.shards.items())
+    def select(self, slug=None):
+        # [(slug, services)] for every shard, or just ``slug`` (KeyError if
+        # there is no such tenant); for maintenance commands' --tenant.
+        if slug is None:
+            return list(self.shards.items())
+        return [(slug, self.shards[slug])]
+    def __len__(self):
+        return len(self.shards)
+    def fan_out(self, fn):
+        # Runs ``fn(services)`` on every shard in parallel. Returns
+        # {slug: (result, error)} so one unreachable shard doesn't sink a
+        # cross-outlet report.
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.fanout_workers, thread_name_prefix='tenant-fanout')
+        futures = {slug: self._executor.submit(fn, services) for slug, services in self.shards.items()}
+        results = {}
+        for slug, future in futures.items():
+            try:
+                results[slug] = (future.result(), None)
+            except Exception as e:
+                logger.exception('Fan-out query failed on tenant %s', slug)
+                results[slug] = (None, str(e))
+        return results
+    def register_collectors(self, monitor):
+        single = len(self.shards) == 1
+        for slug, services in self.shards.items():
+            services.register_collectors(monitor, labels=() if single else [('tenant', slug)])
+    def prepare_database(self):
+        for services in self.shards.values():
+            services.prepare_database()
+    def warm_up(self):
+        for services in self.shards.values():
+            services.warm_up()
+    def start(self):
+        for services in self.shards.values():
+            services.start()
+    def reset_after_fork(self):
+        # The fan-out pool's threads don't survive fork(); a new one is
+        # created on first use in the worker.
+        self._executor = None
+        for services in self.shards.values():
+            services.reset_after_fork()
+    def close(self):
+        for services in self.shards.values():
+            services.close()
+
+def prepare_database(config):
+    shards = ShardMap.from_config(config)
+    shards.prepare_database()
+    shards.close()
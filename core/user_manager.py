@@ -1,26 +1,87 @@
+import atexit
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
 class UserManager:
-    def __init__(self, database):
+    def __init__(self, database, flush_interval=1.0, flush_batch_size=500, known_users_max=100000):
         self.db = database
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
+        self.known_users_max = known_users_max
+        self._known = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._flusher = None
+        atexit.register(self.close)
+    def _remember(self, phone_number):
+        with self._lock:
+            self._known[phone_number] = True
+            self._known.move_to_end(phone_number)
+            while len(self._known) > self.known_users_max:
+                self._known.popitem(last=False)
+    def _start_flusher(self):
+        if self._flusher is None and not self._stopped:
+            self._flusher = threading.Thread(target=self._flush_loop, name='user-touch-flusher', daemon=True)
+            self._flusher.start()
+    def _flush_loop(self):
+        while not self._stopped:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+    def touch_user(self, phone_number):
+        # Known users only get their last_interaction buffered; the buffer
+        # is written in one batch by the flusher thread. First contact is
+        # written straight away so orders can reference the users row.
+        with self._lock:
+            known = phone_number in self._known
+            if known:
+                self._known.move_to_end(phone_number)
+                self._pending[phone_number] = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+                pending = len(self._pending)
+                self._start_flusher()
+        if not known:
+            self._upsert_user(phone_number)
+            self._remember(phone_number)
+        elif pending >= self.flush_batch_size:
+            self._wake.set()
+    def _upsert_user(self, phone_number):
+        with self.db.get_connection() as conn:
+            conn.execute('''
+                INSERT INTO users (phone_number) VALUES (?)
+                ON CONFLICT(phone_number) DO UPDATE SET last_interaction = CURRENT_TIMESTAMP
+            ''', (phone_number,))
+            conn.commit()
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            with self.db.get_connection() as conn:
+                conn.executemany('''
+                    UPDATE users SET last_interaction = ? WHERE phone_number = ?
+                ''', [(touched_at, phone_number) for phone_number, touched_at in pending.items()])
+                conn.commit()
+            return len(pending)
+    def close(self):
+        self._stopped = True
+        self._wake.set()
+        self.flush()
     def get_or_create_user(self, phone_number):
+        with self._lock:
+            self._pending.pop(phone_number, None)
         with self.db.get_connection() as conn:
+            self._upsert_user(phone_number)
             cursor = conn.execute('''
                 SELECT * FROM users WHERE phone_number = ?
             ''', (phone_number,))
             user = cursor.fetchone()
-            if user:
-                conn.execute('''
-                    UPDATE users 
-                    SET last_interaction = CURRENT_TIMESTAMP 
-                    WHERE phone_number = ?
-                ''', (phone_number,))
-                conn.commit()
-                return dict(user)
-            else:
-                conn.execute('''
-                    INSERT INTO users (phone_number) VALUES (?)
-                ''', (phone_number,))
-                conn.commit()
-                return self.get_or_create_user(phone_number)
+        self._remember(phone_number)
+        return dict(user)
     def get_user_stats(self, phone_number):
         with self.db.get_connection() as conn:
             cursor = conn.execute('''
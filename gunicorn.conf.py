@@ -0,0 +1,48 @@
+import os
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+workers = int(os.environ.get('WEB_CONCURRENCY', '1'))
+if workers > 1:
+    # Twilio spreads one customer's messages over every worker, so the
+    # conversation and the MessageSid dedup have to live in the database.
+    os.environ.setdefault('SESSION_BACKEND', 'sqlite')
+    os.environ.setdefault('WEBHOOK_DEDUP_BACKEND', 'sqlite')
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+# With preload the app is imported and warmed once in the master, and the
+# workers share the menu snapshot and matcher indexes copy-on-write.
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True').lower() == 'true'
+
+def _shards(server):
+    return server.app.wsgi().extensions['orderbot']
+
+def _check_shared_state(workers):
+    # Checked against the effective worker count, which --workers on the
+    # command line can set without going through WEB_CONCURRENCY.
+    from config import Config
+    if workers > 1:
+        for setting in ('SESSION_BACKEND', 'WEBHOOK_DEDUP_BACKEND'):
+            if getattr(Config, setting) == 'memory':
+                raise RuntimeError(f'{setting}=memory is per process; use sqlite with {workers} workers')
+
+def on_starting(server):
+    # Runs once in the master, before any worker exists.
+    _check_shared_state(server.cfg.workers)
+    if server.cfg.preload_app:
+        shards = _shards(server)
+        shards.prepare_database()
+        shards.warm_up()
+        shards.close()
+    else:
+        from config import Config
+        from core.tenancy import prepare_database
+        prepare_database(Config)
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        _shards(server).reset_after_fork()
+
+def post_worker_init(worker):
+    shards = worker.wsgi.extensions['orderbot']
+    shards.warm_up()
+    # Background threads only in workers: they don't survive the fork.
+    shards.start()
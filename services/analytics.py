@@ -0,0 +1,161 @@
+import sys
+from datetime import datetime, timedelta, timezone
+from core.order_manager import ORDERS_VERSION_KEY
+
+PERIOD_DAYS = {'day': 1, 'week': 7, 'month': 30}
+
+class AnalyticsService:
+    # Rollup tables are updated by OrderManager inside the order's own
+    # transaction, so reports read O(buckets) rows and never drift from
+    # the orders table.
+    def __init__(self, database, archive=None):
+        self.db = database
+        self.archive = archive
+    def record_order(self, conn, created_at, total_amount, status, line_items):
+        hour = created_at[:13] + ':00:00'
+        day = created_at[:10]
+        conn.execute('''
+            INSERT INTO analytics_hourly (bucket, order_count, revenue) VALUES (?, 1, ?)
+            ON CONFLICT(bucket) DO UPDATE SET order_count = order_count + 1, revenue = revenue + excluded.revenue
+        ''', (hour, total_amount))
+        conn.execute('''
+            INSERT INTO analytics_daily (day, order_count, revenue) VALUES (?, 1, ?)
+            ON CONFLICT(day) DO UPDATE SET order_count = order_count + 1, revenue = revenue + excluded.revenue
+        ''', (day, total_amount))
+        conn.executemany('''
+            INSERT INTO analytics_item_daily (day, item_id, name, quantity, revenue) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(day, item_id) DO UPDATE SET
+                name = excluded.name,
+                quantity = quantity + excluded.quantity,
+                revenue = revenue + excluded.revenue
+        ''', [(day, item['item_id'], item['name'], item['quantity'], item['price'] * item['quantity'])
+              for item in line_items])
+        self.record_status_change(conn, created_at, None, status)
+    def record_status_change(self, conn, created_at, old_status, new_status):
+        # Status counts are kept per day the order was placed, so a report
+        # range covers the same orders for totals and statuses.
+        if old_status == new_status:
+            return
+        day = created_at[:10]
+        if old_status is not None:
+            conn.execute('''
+                UPDATE analytics_status_daily SET order_count = order_count - 1 WHERE day = ? AND status = ?
+            ''', (day, old_status))
+        conn.execute('''
+            INSERT INTO analytics_status_daily (day, status, order_count) VALUES (?, ?, 1)
+            ON CONFLICT(day, status) DO UPDATE SET order_count = order_count + 1
+        ''', (day, new_status))
+    def backfill(self):
+        with self.db.get_connection() as conn:
+            for table in ('analytics_hourly', 'analytics_daily', 'analytics_item_daily', 'analytics_status_daily'):
+                conn.execute(f'DELETE FROM {table}')
+            conn.execute('''
+                INSERT INTO analytics_hourly (bucket, order_count, revenue)
+                SELECT strftime('%Y-%m-%d %H:00:00', created_at), COUNT(*), SUM(total_amount)
+                FROM orders GROUP BY 1
+            ''')
+            conn.execute('''
+                INSERT INTO analytics_daily (day, order_count, revenue)
+                SELECT date(created_at), COUNT(*), SUM(total_amount)
+                FROM orders GROUP BY 1
+            ''')
+            conn.execute('''
+                INSERT INTO analytics_status_daily (day, status, order_count)
+                SELECT date(created_at), status, COUNT(*) FROM orders GROUP BY 1, 2
+            ''')
+            conn.execute('''
+                INSERT INTO analytics_item_daily (day, item_id, name, quantity, revenue)
+                SELECT date(o.created_at), i.menu_item_id, MAX(i.name), SUM(i.quantity), SUM(i.unit_price * i.quantity)
+                FROM order_items i
+                JOIN orders o ON o.id = i.order_id
+                GROUP BY 1, 2
+            ''')
+            # Archived orders are no longer in the tables above; add them
+            # back one by one from the monthly files.
+            if self.archive:
+                for order in self.archive.iter_orders():
+                    self.record_order(conn, order['created_at'], order['total_amount'], order['status'], order['items'])
+            # Cached reports are keyed on the orders version.
+            self.db.bump_version(conn, ORDERS_VERSION_KEY)
+            conn.commit()
+            return conn.execute('SELECT COALESCE(SUM(order_count), 0) FROM analytics_daily').fetchone()[0]
+    @staticmethod
+    def resolve_range(period=None, start_date=None, end_date=None):
+        if period:
+            if period not in PERIOD_DAYS:
+                raise ValueError(f"period must be one of {', '.join(PERIOD_DAYS)}")
+            today = datetime.now(timezone.utc).date()
+            return (today - timedelta(days=PERIOD_DAYS[period] - 1)).isoformat(), today.isoformat()
+        return start_date, end_date
+    @staticmethod
+    def _range_clause(column, start_date, end_date):
+        clauses, params = [], []
+        if start_date:
+            clauses.append(f'{column} >= ?')
+            params.append(start_date)
+        if end_date:
+            clauses.append(f'{column} <= ?')
+            params.append(end_date)
+        return (f"WHERE {' AND '.join(clauses)}" if clauses else ''), params
+    def get_summary(self, start_date=None, end_date=None, top_items=10):
+        where, params = self._range_clause('day', start_date, end_date)
+        with self.db.get_read_connection() as conn:
+            totals = conn.execute(f'''
+                SELECT COALESCE(SUM(order_count), 0) AS total_orders, COALESCE(SUM(revenue), 0) AS total_revenue
+                FROM analytics_daily {where}
+            ''', params).fetchone()
+            popular = conn.execute(f'''
+                SELECT item_id, MAX(name) AS name, SUM(quantity) AS quantity, SUM(revenue) AS revenue
+                FROM analytics_item_daily {where}
+                GROUP BY item_id
+                ORDER BY quantity DESC
+                LIMIT ?
+            ''', (*params, top_items)).fetchall()
+            statuses = conn.execute(f'''
+                SELECT status, SUM(order_count) AS order_count FROM analytics_status_daily {where}
+                GROUP BY status HAVING SUM(order_count) > 0
+            ''', params).fetchall()
+        return {
+            'total_orders': totals['total_orders'],
+            'total_revenue': float(totals['total_revenue']),
+            'popular_items': [dict(row) for row in popular],
+            'status_counts': {row['status']: row['order_count'] for row in statuses},
+        }
+    def get_timeseries(self, start_date=None, end_date=None, granularity='day'):
+        if granularity == 'hour':
+            table, column = 'analytics_hourly', 'bucket'
+            # Hourly buckets are timestamps; widen the end date to cover the whole day.
+            end_date = f'{end_date} 23:59:59' if end_date else None
+        elif granularity == 'day':
+            table, column = 'analytics_daily', 'day'
+        else:
+            raise ValueError('granularity must be hour or day')
+        where, params = self._range_clause(column, start_date, end_date)
+        with self.db.get_read_connection() as conn:
+            rows = conn.execute(f'''
+                SELECT {column} AS bucket, order_count, revenue FROM {table} {where} ORDER BY {column}
+            ''', params).fetchall()
+        return [dict(row) for row in rows]
+
+def main(argv):
+    from config import Config
+    from core.tenancy import ShardMap
+    if argv[:1] != ['backfill']:
+        print('usage: python -m services.analytics backfill [--tenant SLUG]')
+        return 1
+    slug = argv[argv.index('--tenant') + 1] if '--tenant' in argv[:-1] else None
+    shards = ShardMap.from_config(Config)
+    try:
+        for slug, services in shards.select(slug):
+            services.db.init_db()
+            services.order_manager.migrate_order_items()
+            print(f'{slug}: rebuilt analytics rollups from {services.analytics.backfill()} orders')
+    except KeyError as e:
+        print(f'Unknown tenant: {e}')
+        return 1
+    finally:
+        shards.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,248 @@
+import logging
+import queue
+import random
+import threading
+import time
+import zlib
+from utils.constants import ORDER_STATUS_MESSAGES
+
+logger = logging.getLogger(__name__)
+
+class TwilioTransport:
+    # The Twilio client (and the twilio.rest import behind it) is created
+    # on the first send rather than at startup.
+    def __init__(self, account_sid, auth_token, from_number):
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.from_number = from_number
+        self._client = None
+        self._lock = threading.Lock()
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from twilio.rest import Client
+                    self._client = Client(self.account_sid, self.auth_token)
+        return self._client
+    def send(self, to_number, body):
+        message = self.client.messages.create(
+            from_=f'whatsapp:{self.from_number}',
+            to=f'whatsapp:{to_number}',
+            body=body,
+        )
+        return message.sid
+
+class FakeTransport:
+    # Records messages instead of sending them; ``fail_times`` makes the
+    # first N sends to a number raise so retry handling can be exercised.
+    def __init__(self, fail_times=0):
+        self.fail_times = fail_times
+        self.sent = []
+        self._failures = {}
+        self._lock = threading.Lock()
+    def send(self, to_number, body):
+        with self._lock:
+            failures = self._failures.get(to_number, 0)
+            if failures < self.fail_times:
+                self._failures[to_number] = failures + 1
+                raise RuntimeError('fake transport failure')
+            self.sent.append((to_number, body))
+            return f'FAKE{len(self.sent)}'
+
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class NotificationManager:
+    def __init__(self, database, transport, workers=4, rate_per_second=1.0, max_attempts=5,
+                 backoff_base=2.0, poll_interval=1.0, claim_timeout=60.0):
+        self.db = database
+        self.transport = transport
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.poll_interval = poll_interval
+        self.claim_timeout = claim_timeout
+        self.limiter = TokenBucket(rate_per_second)
+        self._queues = [queue.Queue() for _ in range(workers)]
+        self._inflight = set()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stopped = threading.Event()
+        self._stats = {'enqueued': 0, 'duplicates': 0, 'sent': 0, 'retried': 0, 'failed': 0}
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+    def start(self):
+        # Threads are started per worker (post_worker_init) or on first
+        # use, never at import, so gunicorn forks workers before any
+        # sender thread exists.
+        with self._lock:
+            if self._threads:
+                return
+            for index, work_queue in enumerate(self._queues):
+                thread = threading.Thread(target=self._worker, args=(work_queue,), name=f'notify-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            thread = threading.Thread(target=self._dispatch_loop, name='notify-dispatch', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+    def stop(self, timeout=5.0):
+        self._stopped.set()
+        for work_queue in self._queues:
+            work_queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+    def enqueue(self, to_number, body, dedup_key=None, conn=None):
+        # With ``conn`` the row is written in the caller's transaction and
+        # nothing is sent until the caller commits and calls submit(); if
+        # it never does, the dispatcher finds the row on its next poll.
+        if conn is None:
+            with self.db.get_connection() as conn:
+                outbox_id = self.enqueue(to_number, body, dedup_key, conn)
+                conn.commit()
+            if outbox_id:
+                self.submit(outbox_id, to_number)
+            return outbox_id
+        now = time.time()
+        cursor = conn.execute('''
+            INSERT OR IGNORE INTO notification_outbox
+                (dedup_key, to_number, body, status, attempts, next_attempt_at, created_at)
+            VALUES (?, ?, ?, 'pending', 0, ?, ?)
+        ''', (dedup_key, to_number, body, now, now))
+        if cursor.rowcount == 0:
+            self._count('duplicates')
+            return None
+        self._count('enqueued')
+        return cursor.lastrowid
+    def submit(self, outbox_id, to_number):
+        self.start()
+        self._submit(outbox_id, to_number)
+    def notify_order_status(self, order_id, to_number, status, conn=None):
+        template = ORDER_STATUS_MESSAGES.get(status)
+        if template is None:
+            return None
+        return self.enqueue(to_number, template.format(order_id=order_id), dedup_key=f'order-{order_id}-{status}',
+                            conn=conn)
+    def _submit(self, outbox_id, to_number):
+        with self._lock:
+            if outbox_id in self._inflight:
+                return
+            self._inflight.add(outbox_id)
+        # Sharding by number keeps each customer's messages on one worker,
+        # which preserves their order without a lock per number.
+        shard = zlib.crc32(to_number.encode()) % self.workers
+        self._queues[shard].put(outbox_id)
+    def _dispatch_loop(self):
+        while not self._stopped.wait(self.poll_interval):
+            try:
+                self.dispatch_due()
+            except Exception:
+                logger.exception('Notification dispatch failed')
+    def dispatch_due(self, limit=100):
+        now = time.time()
+        with self.db.get_connection() as conn:
+            conn.execute('''
+                UPDATE notification_outbox SET status = 'pending'
+                WHERE status = 'sending' AND claimed_at < ?
+            ''', (now - self.claim_timeout,))
+            conn.commit()
+            rows = conn.execute('''
+                SELECT o.id, o.to_number FROM notification_outbox o
+                WHERE o.status = 'pending' AND o.next_attempt_at <= ?
+                  AND NOT EXISTS (
+                      SELECT 1 FROM notification_outbox p
+                      WHERE p.to_number = o.to_number AND p.status IN ('pending', 'sending') AND p.id < o.id
+                  )
+                ORDER BY o.id LIMIT ?
+            ''', (now, limit)).fetchall()
+        for row in rows:
+            self._submit(row['id'], row['to_number'])
+        return len(rows)
+    def _worker(self, work_queue):
+        while True:
+            outbox_id = work_queue.get()
+            if outbox_id is None:
+                return
+            try:
+                self._deliver(outbox_id)
+            except Exception:
+                logger.exception('Notification %s failed', outbox_id)
+            finally:
+                with self._lock:
+                    self._inflight.discard(outbox_id)
+    def _claim(self, outbox_id):
+        now = time.time()
+        with self.db.get_connection() as conn:
+            row = conn.execute('SELECT * FROM notification_outbox WHERE id = ?', (outbox_id,)).fetchone()
+            if row is None or row['status'] != 'pending' or row['next_attempt_at'] > now:
+                return None
+            earlier = conn.execute('''
+                SELECT 1 FROM notification_outbox
+                WHERE to_number = ? AND status IN ('pending', 'sending') AND id < ? LIMIT 1
+            ''', (row['to_number'], outbox_id)).fetchone()
+            if earlier:
+                return None
+            cursor = conn.execute('''
+                UPDATE notification_outbox SET status = 'sending', claimed_at = ?
+                WHERE id = ? AND status = 'pending'
+            ''', (now, outbox_id))
+            conn.commit()
+            return dict(row) if cursor.rowcount else None
+    def _deliver(self, outbox_id):
+        row = self._claim(outbox_id)
+        if row is None:
+            return
+        self.limiter.acquire()
+        try:
+            provider_id = self.transport.send(row['to_number'], row['body'])
+        except Exception as e:
+            self._record_failure(row, e)
+            return
+        with self.db.get_connection() as conn:
+            conn.execute('''
+                UPDATE notification_outbox
+                SET status = 'sent', attempts = attempts + 1, sent_at = ?, provider_id = ?, last_error = NULL
+                WHERE id = ?
+            ''', (time.time(), provider_id, outbox_id))
+            conn.commit()
+        self._count('sent')
+    def _record_failure(self, row, error):
+        attempts = row['attempts'] + 1
+        if attempts >= self.max_attempts:
+            status, next_attempt_at = 'failed', row['next_attempt_at']
+            self._count('failed')
+            logger.warning('Giving up on notification %s to %s: %s', row['id'], row['to_number'], error)
+        else:
+            delay = self.backoff_base ** attempts
+            status, next_attempt_at = 'pending', time.time() + delay + random.uniform(0, delay / 2)
+            self._count('retried')
+        with self.db.get_connection() as conn:
+            conn.execute('''
+                UPDATE notification_outbox
+                SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?
+                WHERE id = ?
+            ''', (status, attempts, next_attempt_at, str(error)[:500], row['id']))
+            conn.commit()
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['inflight'] = len(self._inflight)
+        stats['queued'] = sum(work_queue.qsize() for work_queue in self._queues)
+        return stats
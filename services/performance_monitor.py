@@ -0,0 +1,203 @@
+import logging
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from flask import Response, g, request
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+
+WHITESPACE_RE = re.compile(r'\s+')
+PLACEHOLDER_LIST_RE = re.compile(r'\(\?(?:,\s*\?)+\)')
+
+def normalize_sql(sql):
+    # Collapse whitespace and variable-length IN (?, ?, ...) lists so each
+    # statement in the code maps to exactly one metric series.
+    sql = WHITESPACE_RE.sub(' ', sql).strip()
+    return PLACEHOLDER_LIST_RE.sub('(?...)', sql)[:160]
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{escape_label(value)}"' for key, value in labels) + '}'
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.total += value
+        self.count += 1
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float('inf')
+
+class PerformanceMonitor:
+    def __init__(self, slow_query_ms=100.0, explain_slow_queries=True):
+        self.slow_query_ms = slow_query_ms
+        self.explain_slow_queries = explain_slow_queries
+        self._histograms = {}
+        self._counters = {}
+        self._collectors = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+    def configure(self, slow_query_ms=None, explain_slow_queries=None):
+        if slow_query_ms is not None:
+            self.slow_query_ms = slow_query_ms
+        if explain_slow_queries is not None:
+            self.explain_slow_queries = explain_slow_queries
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        key = (name, tuple(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+    def increment(self, name, labels=(), amount=1):
+        key = (name, tuple(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+    def register_collector(self, name, collect, labels=()):
+        # ``collect`` returns a flat dict of numbers, exported as gauges
+        # named orderbot_<name>_<key> carrying ``labels``, so every tenant
+        # reports under the same metric names with its own tenant label.
+        self._collectors[(name, tuple(labels))] = collect
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, sorted(labels.items()), time.perf_counter() - started)
+    def observe_query(self, conn, sql, parameters, duration):
+        if getattr(self._local, 'explaining', False):
+            return
+        statement = normalize_sql(sql)
+        self.observe('db_query_duration_seconds', [('statement', statement)], duration)
+        if getattr(self._local, 'round_trips', None) is not None:
+            self._local.round_trips += 1
+        if duration * 1000 >= self.slow_query_ms:
+            self.increment('db_slow_queries_total')
+            self._log_slow_query(conn, sql, parameters, statement, duration)
+    def _log_slow_query(self, conn, sql, parameters, statement, duration):
+        plan = ''
+        if self.explain_slow_queries and parameters is not None:
+            self._local.explaining = True
+            try:
+                rows = sqlite3.Connection.execute(conn, f'EXPLAIN QUERY PLAN {sql}', parameters).fetchall()
+                plan = ' | '.join(str(row[-1]) for row in rows)
+            except sqlite3.Error as e:
+                plan = f'unavailable ({e})'
+            finally:
+                self._local.explaining = False
+        logger.warning('Slow query (%.1f ms): %s; plan: %s', duration * 1000, statement, plan)
+    def init_app(self, app):
+        @app.before_request
+        def start_request_timer():
+            g.perf_started = time.perf_counter()
+            self._local.round_trips = 0
+        @app.after_request
+        def record_request(response):
+            started = g.pop('perf_started', None)
+            if started is None:
+                return response
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            duration = time.perf_counter() - started
+            round_trips = self._local.round_trips or 0
+            self._local.round_trips = None
+            self.observe('http_request_duration_seconds', [('method', request.method), ('route', route)], duration)
+            self.observe('db_round_trips_per_request', [('route', route)], round_trips, COUNT_BUCKETS)
+            self.increment('http_requests_total', [('method', request.method), ('route', route), ('status', response.status_code)])
+            response.headers['Server-Timing'] = f'app;dur={duration * 1000:.1f}, db;desc="round trips {round_trips}"'
+            return response
+    def _collect(self):
+        gauges = []
+        for (name, labels), collect in list(self._collectors.items()):
+            try:
+                values = collect()
+            except Exception:
+                logger.exception('Metrics collector %s%s failed', name, format_labels(labels))
+                continue
+            for key, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    gauges.append((f'{name}_{key}', labels, value))
+        # Samples of one metric must be adjacent in the exposition format.
+        gauges.sort(key=lambda gauge: (gauge[0], gauge[1]))
+        return gauges
+    def snapshot(self):
+        with self._lock:
+            histograms = list(self._histograms.items())
+            counters = list(self._counters.items())
+        gauges = {f'{name}{format_labels(labels)}': value for name, labels, value in self._collect()}
+        result = {'histograms': [], 'counters': [], 'gauges': gauges}
+        for (name, labels), histogram in histograms:
+            result['histograms'].append({
+                'name': name,
+                'labels': dict(labels),
+                'count': histogram.count,
+                'sum': round(histogram.total, 6),
+                'p50': histogram.quantile(0.5),
+                'p95': histogram.quantile(0.95),
+                'p99': histogram.quantile(0.99),
+            })
+        for (name, labels), value in counters:
+            result['counters'].append({'name': name, 'labels': dict(labels), 'value': value})
+        result['histograms'].sort(key=lambda entry: entry['sum'], reverse=True)
+        return result
+    def render_prometheus(self):
+        with self._lock:
+            histograms = sorted(self._histograms.items(), key=lambda entry: entry[0])
+            counters = sorted(self._counters.items(), key=lambda entry: (entry[0][0], str(entry[0][1])))
+            histograms = [(key, list(h.buckets), list(h.counts), h.total, h.count) for key, h in histograms]
+        lines = []
+        declared = set()
+        for (name, labels), buckets, counts, total, count in histograms:
+            metric = f'orderbot_{name}'
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f'# TYPE {metric} histogram')
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{metric}_bucket{format_labels(labels + (("le", bound),))} {cumulative}')
+            lines.append(f'{metric}_bucket{format_labels(labels + (("le", "+Inf"),))} {count}')
+            lines.append(f'{metric}_sum{format_labels(labels)} {total}')
+            lines.append(f'{metric}_count{format_labels(labels)} {count}')
+        for (name, labels), value in counters:
+            metric = f'orderbot_{name}'
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f'# TYPE {metric} counter')
+            lines.append(f'{metric}{format_labels(labels)} {value}')
+        for name, labels, value in self._collect():
+            metric = f'orderbot_{name}'
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f'# TYPE {metric} gauge')
+            lines.append(f'{metric}{format_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+    def metrics_response(self):
+        return Response(self.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+monitor = PerformanceMonitor()
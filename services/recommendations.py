@@ -0,0 +1,150 @@
+import heapq
+import threading
+import time
+from collections import Counter, OrderedDict
+from core.order_manager import OrderManager
+
+class UserProfile:
+    __slots__ = ('order_count', 'last_cart', 'last_address', 'carts', 'favourites')
+    def __init__(self, order_count=0, last_cart=(), last_address=None, carts=None, favourites=None):
+        self.order_count = order_count
+        self.last_cart = last_cart
+        self.last_address = last_address
+        self.carts = carts if carts is not None else Counter()
+        self.favourites = favourites if favourites is not None else Counter()
+    def record(self, cart, address):
+        self.order_count += 1
+        self.last_cart = cart
+        self.last_address = address
+        self.carts[cart] += 1
+        for item_id, quantity in cart:
+            self.favourites[item_id] += quantity
+    def usual_cart(self):
+        # The most frequently repeated cart; ties go to the last one ordered.
+        if not self.carts:
+            return ()
+        best = max(self.carts.values())
+        if self.carts.get(self.last_cart) == best:
+            return self.last_cart
+        return next(cart for cart, count in self.carts.items() if count == best)
+
+class RecommendationService:
+    # Keeps "what's popular" and "what does this customer usually order"
+    # in memory, updated by OrderManager after each order commits instead
+    # of re-aggregating order_frequency per request. Other workers' orders
+    # reach the global ranking on the next refresh; per-user profiles are
+    # checked against users.order_count (a primary key read) and reloaded
+    # when another worker took the order.
+    def __init__(self, database, top_k=10, max_users=10000, history_size=20, refresh_interval=300.0):
+        self.db = database
+        self.top_k = top_k
+        self.max_users = max_users
+        self.history_size = history_size
+        self.refresh_interval = refresh_interval
+        self._counts = None
+        self._top = []
+        self._loaded_at = 0.0
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'orders': 0, 'profile_hits': 0, 'profile_loads': 0, 'refreshes': 0}
+    @staticmethod
+    def _cart_key(line_items):
+        quantities = Counter()
+        for item in line_items:
+            quantities[int(item['item_id'])] += item['quantity']
+        return tuple(sorted(quantities.items()))
+    def record_order(self, user_phone, line_items, delivery_address=None):
+        cart = self._cart_key(line_items)
+        with self._lock:
+            self._stats['orders'] += 1
+            if self._counts is not None:
+                for item_id, quantity in cart:
+                    self._bump(item_id, quantity)
+            profile = self._profiles.get(user_phone)
+            if profile is not None:
+                profile.record(cart, delivery_address)
+    def _bump(self, item_id, quantity):
+        # Counts only grow between refreshes, so an item can only enter
+        # the top K by overtaking its current last entry.
+        self._counts[item_id] = self._counts.get(item_id, 0) + quantity
+        count = self._counts[item_id]
+        ranked = [entry for entry in self._top if entry[1] != item_id]
+        if len(ranked) < self.top_k or count > -ranked[-1][0]:
+            ranked.append((-count, item_id))
+            ranked.sort()
+        self._top = ranked[:self.top_k]
+    def _refresh(self):
+        with self.db.get_read_connection() as conn:
+            rows = conn.execute('''
+                SELECT menu_item_id, SUM(frequency) AS total FROM order_frequency GROUP BY menu_item_id
+            ''').fetchall()
+        counts = {row['menu_item_id']: row['total'] for row in rows}
+        with self._lock:
+            self._counts = counts
+            self._top = heapq.nsmallest(self.top_k, ((-total, item_id) for item_id, total in counts.items()))
+            self._loaded_at = time.monotonic()
+            self._stats['refreshes'] += 1
+    def popular(self, limit=None):
+        # [(item_id, total quantity ordered)], best sellers first.
+        if self._counts is None or time.monotonic() - self._loaded_at > self.refresh_interval:
+            self._refresh()
+        with self._lock:
+            return [(item_id, -negated) for negated, item_id in self._top[:limit or self.top_k]]
+    def _load_profile(self, conn, user_phone, order_count):
+        orders = conn.execute('''
+            SELECT id, items, delivery_address FROM orders
+            WHERE user_phone = ?
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        ''', (user_phone, self.history_size)).fetchall()
+        line_items = {row['id']: [] for row in orders}
+        if line_items:
+            placeholders = ', '.join('?' * len(line_items))
+            for row in conn.execute(f'''
+                SELECT order_id, menu_item_id, quantity FROM order_items WHERE order_id IN ({placeholders})
+            ''', list(line_items)).fetchall():
+                line_items[row['order_id']].append({'item_id': row['menu_item_id'], 'quantity': row['quantity']})
+        profile = UserProfile(order_count)
+        for order in reversed(orders):
+            # Orders from before order_items existed only have the JSON blob.
+            cart = self._cart_key(line_items[order['id']] or OrderManager.parse_line_items(order['items']))
+            profile.carts[cart] += 1
+            profile.last_cart = cart
+            profile.last_address = order['delivery_address']
+        rows = conn.execute('SELECT menu_item_id, frequency FROM order_frequency WHERE user_phone = ?',
+                            (user_phone,)).fetchall()
+        profile.favourites.update({row['menu_item_id']: row['frequency'] for row in rows})
+        return profile
+    def _profile(self, user_phone):
+        with self.db.get_connection() as conn:
+            row = conn.execute('SELECT order_count FROM users WHERE phone_number = ?', (user_phone,)).fetchone()
+            order_count = row['order_count'] if row else 0
+            with self._lock:
+                profile = self._profiles.get(user_phone)
+                if profile is not None and profile.order_count == order_count:
+                    self._profiles.move_to_end(user_phone)
+                    self._stats['profile_hits'] += 1
+                    return profile
+            profile = self._load_profile(conn, user_phone, order_count) if order_count else UserProfile()
+        with self._lock:
+            self._stats['profile_loads'] += 1
+            self._profiles[user_phone] = profile
+            self._profiles.move_to_end(user_phone)
+            while len(self._profiles) > self.max_users:
+                self._profiles.popitem(last=False)
+        return profile
+    def last_order(self, user_phone):
+        # ({item_id: quantity}, delivery address) of the latest order.
+        profile = self._profile(user_phone)
+        return dict(profile.last_cart), profile.last_address
+    def usual_order(self, user_phone):
+        profile = self._profile(user_phone)
+        return dict(profile.usual_cart()), profile.last_address
+    def favourites(self, user_phone, limit=5):
+        return self._profile(user_phone).favourites.most_common(limit)
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['profiles'] = len(self._profiles)
+            stats['ranked_items'] = len(self._counts) if self._counts is not None else 0
+        return stats
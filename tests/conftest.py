@@ -0,0 +1,53 @@
+import pytest
+from datetime import datetime, timezone
+from core.database import Database
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / 'test.db'), pool_size=4, pool_timeout=1.0)
+    database.init_db()
+    yield database
+    database.close()
+
+@pytest.fixture
+def app(tmp_path):
+    from app import create_app
+    from config import Config
+    from core.tenancy import ShardMap
+    from services.notification_manager import FakeTransport
+    class TestConfig(Config):
+        TESTING = True
+        TENANTS_FILE = None
+        DATABASE_PATH = str(tmp_path / 'app.db')
+        ORDER_STREAM_MAX_SECONDS = 0.2
+        ORDER_STREAM_MAX_CLIENTS = 1
+    shards = ShardMap.from_config(TestConfig, transport=FakeTransport())
+    app = create_app(TestConfig, shards=shards)
+    shards.prepare_database()
+    yield app
+    shards.close()
+
+@pytest.fixture
+def admin_client(app):
+    client = app.test_client()
+    client.post('/admin/login', data={'username': 'admin', 'password': 'admin123'})
+    return client
+
+@pytest.fixture
+def place_order(app):
+    # Places an order now, or as if at ``when`` ('YYYY-MM-DD HH:MM' UTC).
+    import core.order_manager
+    def place(when=None, item_index=0, quantity=1, phone='+911'):
+        class Frozen(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return datetime.strptime(when, '%Y-%m-%d %H:%M').replace(tzinfo=timezone.utc)
+        shard = app.extensions['orderbot'].resolve()
+        shard.user_manager.get_or_create_user(phone)
+        item = shard.menu_manager.get_all_items()[item_index]
+        cart = {str(item['id']): {'name': item['name'], 'price': item['price'], 'quantity': quantity}}
+        with pytest.MonkeyPatch.context() as patch:
+            if when:
+                patch.setattr(core.order_manager, 'datetime', Frozen)
+            return shard.order_manager.create_order(phone, cart, '12 Main Street')
+    return place
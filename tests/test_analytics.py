@@ -0,0 +1,91 @@
+import threading
+
+def services(app):
+    return app.extensions['orderbot'].resolve()
+
+def seed(app, place_order):
+    ids = [
+        place_order('2024-03-01 09:15', 0, 2),
+        place_order('2024-03-01 09:40', 1, 1),
+        place_order('2024-03-01 18:05', 0, 1),
+        place_order('2024-03-02 12:00', 2, 3),
+        place_order('2024-03-04 20:30', 1, 4),
+    ]
+    order_manager = services(app).order_manager
+    order_manager.update_order_status(ids[0], 'confirmed')
+    order_manager.update_order_status(ids[0], 'delivered')
+    order_manager.update_order_status(ids[3], 'cancelled')
+    order_manager.update_order_status(ids[4], 'confirmed')
+    return ids
+
+def from_orders(app, start_date, end_date):
+    with services(app).db.get_connection() as conn:
+        where, params = 'WHERE date(o.created_at) BETWEEN ? AND ?', (start_date, end_date)
+        totals = conn.execute(f'SELECT COUNT(*), COALESCE(SUM(total_amount), 0) FROM orders o {where}', params).fetchone()
+        statuses = conn.execute(f'SELECT status, COUNT(*) FROM orders o {where} GROUP BY status', params).fetchall()
+        items = conn.execute(f'''
+            SELECT i.menu_item_id, SUM(i.quantity) FROM order_items i JOIN orders o ON o.id = i.order_id {where}
+            GROUP BY i.menu_item_id
+        ''', params).fetchall()
+        daily = conn.execute(f'''
+            SELECT date(created_at), COUNT(*), SUM(total_amount) FROM orders o {where} GROUP BY 1 ORDER BY 1
+        ''', params).fetchall()
+        hourly = conn.execute(f'''
+            SELECT strftime('%Y-%m-%d %H:00:00', created_at), COUNT(*) FROM orders o {where} GROUP BY 1 ORDER BY 1
+        ''', params).fetchall()
+    return {
+        'total_orders': totals[0],
+        'total_revenue': float(totals[1]),
+        'status_counts': {status: count for status, count in statuses},
+        'items': {item_id: quantity for item_id, quantity in items},
+        'daily': [(day, count, float(revenue)) for day, count, revenue in daily],
+        'hourly': [(bucket, count) for bucket, count in hourly],
+    }
+
+def from_rollups(app, start_date, end_date):
+    analytics = services(app).analytics
+    summary = analytics.get_summary(start_date, end_date)
+    return {
+        'total_orders': summary['total_orders'],
+        'total_revenue': summary['total_revenue'],
+        'status_counts': summary['status_counts'],
+        'items': {item['item_id']: item['quantity'] for item in summary['popular_items']},
+        'daily': [(row['bucket'], row['order_count'], float(row['revenue']))
+                  for row in analytics.get_timeseries(start_date, end_date, 'day')],
+        'hourly': [(row['bucket'], row['order_count'])
+                   for row in analytics.get_timeseries(start_date, end_date, 'hour')],
+    }
+
+RANGES = [('2024-03-01', '2024-03-01'), ('2024-03-02', '2024-03-04'), ('2024-01-01', '2024-12-31')]
+
+def test_rollups_match_the_orders_table_and_a_backfill(app, place_order):
+    seed(app, place_order)
+    recorded = {dates: from_rollups(app, *dates) for dates in RANGES}
+    for dates in RANGES:
+        assert recorded[dates] == from_orders(app, *dates)
+    assert services(app).analytics.backfill() == 5
+    for dates in RANGES:
+        assert from_rollups(app, *dates) == recorded[dates]
+
+def test_status_counts_only_cover_orders_placed_in_the_range(app, place_order):
+    seed(app, place_order)
+    analytics = services(app).analytics
+    assert analytics.get_summary('2024-03-01', '2024-03-01')['status_counts'] == {'delivered': 1, 'pending': 2}
+    assert analytics.get_summary('2024-03-02', '2024-03-02')['status_counts'] == {'cancelled': 1}
+    assert analytics.get_summary('2024-04-01', '2024-04-30')['status_counts'] == {}
+
+def test_concurrent_status_changes_keep_the_status_rollup_in_step(app, place_order):
+    order_id = place_order('2024-03-01 09:15')
+    order_manager = services(app).order_manager
+    barrier = threading.Barrier(4)
+    def change(status):
+        barrier.wait()
+        order_manager.update_order_status(order_id, status)
+    threads = [threading.Thread(target=change, args=(status,))
+               for status in ('confirmed', 'preparing', 'cancelled', 'delivered')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    status = order_manager.get_order(order_id)['status']
+    assert services(app).analytics.get_summary('2024-03-01', '2024-03-01')['status_counts'] == {status: 1}
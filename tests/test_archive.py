@@ -0,0 +1,78 @@
+import pytest
+
+def services(app):
+    return app.extensions['orderbot'].resolve()
+
+@pytest.fixture
+def orders(app, place_order):
+    # Three finished orders in January (two in the same second), one still
+    # pending in January and two in February.
+    order_manager = services(app).order_manager
+    ids = [
+        place_order('2024-01-05 10:00'),
+        place_order('2024-01-20 12:30'),
+        place_order('2024-01-20 12:30'),
+        place_order('2024-01-25 08:00'),
+        place_order('2024-02-02 09:00'),
+        place_order('2024-02-10 19:45'),
+    ]
+    for order_id in ids[:3] + ids[4:]:
+        order_manager.update_order_status(order_id, 'delivered')
+    return ids
+
+def hot_ids(app):
+    with services(app).db.get_connection() as conn:
+        return [row[0] for row in conn.execute('SELECT id FROM orders ORDER BY id')]
+
+def all_pages(order_manager, limit, **filters):
+    ids, cursor = [], None
+    while True:
+        orders, cursor = order_manager.list_orders(limit=limit, cursor=cursor, **filters)
+        ids.extend(order['id'] for order in orders)
+        if cursor is None:
+            return ids
+
+def test_archiving_a_month_moves_its_finished_orders_out(app, orders):
+    shard = services(app)
+    summary = shard.analytics.get_summary()
+    assert shard.order_manager.archive_orders('2024-02-01', batch_size=2) == 3
+    assert hot_ids(app) == orders[3:]
+    [month] = shard.order_archive.months()
+    month.pop('updated_at')
+    assert month == {'month': '2024-01', 'orders': 3, 'first_id': orders[0], 'last_id': orders[2],
+                     'newest': '2024-01-20 12:30:00'}
+    with shard.db.get_connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM order_items WHERE order_id IN (?, ?, ?)', orders[:3]).fetchone()[0] == 0
+    assert shard.analytics.get_summary() == summary
+    archived = shard.order_manager.get_order(orders[1])
+    assert archived['status'] == 'delivered' and archived['items'][0]['quantity'] == 1
+
+def test_archived_orders_are_still_listed_in_order(app, orders):
+    order_manager = services(app).order_manager
+    before = [order['id'] for order in order_manager.iter_orders()]
+    newest_first = all_pages(order_manager, limit=2)
+    order_manager.archive_orders('2024-02-01')
+    assert [order['id'] for order in order_manager.iter_orders()] == before
+    assert [order['id'] for order in order_manager.iter_orders(start_date='2024-01-10', end_date='2024-01-31')] == \
+        orders[1:4]
+    for limit in (1, 2, 4, 10):
+        assert all_pages(order_manager, limit=limit) == newest_first
+    assert all_pages(order_manager, limit=1, status='delivered') == [
+        order_id for order_id in newest_first if order_id != orders[3]]
+
+def test_rerunning_after_a_crash_between_append_and_delete_does_not_duplicate(app, orders, monkeypatch):
+    shard = services(app)
+    append = shard.order_archive.append
+    def append_then_crash(conn, batch):
+        append(conn, batch)
+        raise RuntimeError('crashed')
+    monkeypatch.setattr(shard.order_archive, 'append', append_then_crash)
+    with pytest.raises(RuntimeError):
+        shard.order_manager.archive_orders('2024-02-01')
+    assert hot_ids(app) == orders
+    assert shard.order_archive.months() == []
+    monkeypatch.undo()
+    assert shard.order_manager.archive_orders('2024-02-01') == 3
+    assert shard.order_archive.count() == 3
+    assert [order['id'] for order in shard.order_manager.iter_orders()] == orders
+    assert all_pages(shard.order_manager, limit=2) == list(reversed(orders))
@@ -0,0 +1,77 @@
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from core.database import ConnectionPool, PoolTimeout
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'pool.db'), max_size=2, timeout=0.2)
+    yield pool
+    pool.close_all()
+
+@pytest.fixture
+def other_thread():
+    # One long-lived thread, so its thread-local "last connection" survives
+    # between calls.
+    executor = ThreadPoolExecutor(max_workers=1)
+    yield lambda fn, *args: executor.submit(fn, *args).result()
+    executor.shutdown()
+
+def test_each_thread_gets_back_the_connection_it_used_last(pool, other_thread):
+    mine = pool.acquire()
+    theirs = other_thread(pool.acquire)
+    other_thread(pool.release, theirs)
+    pool.release(mine)
+    # ``mine`` is the most recently returned, but the other thread still
+    # gets its own connection back.
+    assert other_thread(pool.acquire) is theirs
+    assert pool.acquire() is mine
+    assert pool.stats()['created'] == 2 and pool.stats()['reused'] == 2
+
+def test_nested_checkouts_share_one_connection(pool):
+    with pool.connection() as outer:
+        with pool.connection() as inner:
+            assert inner is outer
+            assert pool.stats()['in_use'] == 1
+    assert pool.stats()['in_use'] == 0
+
+def test_checkout_past_max_size_waits_then_times_out(pool, other_thread):
+    held = [pool.acquire(), pool.acquire()]
+    with pytest.raises(PoolTimeout):
+        other_thread(pool.acquire)
+    assert pool.stats()['timeouts'] == 1 and pool.stats()['size'] == 2
+    released = threading.Timer(0.05, pool.release, args=(held.pop(),))
+    released.start()
+    assert other_thread(pool.acquire) is not None
+    released.join()
+    assert pool.stats()['waits'] == 1 and pool.stats()['size'] == 2
+
+def test_uncommitted_work_is_rolled_back_on_release(pool):
+    with pool.connection() as conn:
+        conn.execute('CREATE TABLE t (x INTEGER)')
+        conn.commit()
+        conn.execute('INSERT INTO t VALUES (1)')
+    with pool.connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 0
+
+def test_connections_use_wal(pool):
+    with pool.connection() as conn:
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+def test_read_pool_rejects_writes(db):
+    with db.get_read_connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM menu_items').fetchone()[0] == 0
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO app_versions (name, version) VALUES ('x', 1)")
+
+def test_bump_version_is_visible_with_the_transaction(db):
+    with db.get_connection() as conn:
+        assert db.bump_version(conn, 'menu') == 1
+        conn.rollback()
+    assert db.get_version('menu') == 0
+    with db.get_connection() as conn:
+        db.bump_version(conn, 'menu')
+        conn.commit()
+    version, updated_at = db.get_version_info('menu')
+    assert version == 1 and updated_at
@@ -0,0 +1,52 @@
+import os
+import runpy
+from types import SimpleNamespace
+import pytest
+from config import Config
+from core import tenancy
+
+CONF_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'gunicorn.conf.py')
+
+@pytest.fixture
+def environ(monkeypatch):
+    for name in ('WEB_CONCURRENCY', 'SESSION_BACKEND', 'WEBHOOK_DEDUP_BACKEND'):
+        monkeypatch.delenv(name, raising=False)
+    return monkeypatch
+
+def test_single_worker_by_default(environ):
+    assert runpy.run_path(CONF_PATH)['workers'] == 1
+    assert 'SESSION_BACKEND' not in os.environ
+
+def test_several_workers_share_sessions_and_dedup_through_sqlite(environ):
+    environ.setenv('WEB_CONCURRENCY', '3')
+    assert runpy.run_path(CONF_PATH)['workers'] == 3
+    assert os.environ['SESSION_BACKEND'] == os.environ['WEBHOOK_DEDUP_BACKEND'] == 'sqlite'
+
+def test_several_workers_refuse_per_process_sessions(environ):
+    environ.setenv('WEB_CONCURRENCY', '2')
+    environ.setenv('SESSION_BACKEND', 'memory')
+    hooks = runpy.run_path(CONF_PATH)
+    environ.setattr(Config, 'SESSION_BACKEND', 'memory')
+    with pytest.raises(RuntimeError, match='SESSION_BACKEND'):
+        hooks['on_starting'](server(hooks['workers']))
+
+def server(workers, preload_app=False):
+    return SimpleNamespace(cfg=SimpleNamespace(workers=workers, preload_app=preload_app))
+
+def test_workers_set_on_the_command_line_are_checked_too(environ, monkeypatch):
+    # gunicorn --workers 3 leaves WEB_CONCURRENCY unset.
+    hooks = runpy.run_path(CONF_PATH)
+    monkeypatch.setattr(Config, 'SESSION_BACKEND', 'memory')
+    monkeypatch.setattr(Config, 'WEBHOOK_DEDUP_BACKEND', 'sqlite')
+    with pytest.raises(RuntimeError, match='SESSION_BACKEND=memory'):
+        hooks['on_starting'](server(3))
+
+def test_shared_backends_pass_the_startup_check(environ, monkeypatch):
+    prepared = []
+    monkeypatch.setattr(tenancy, 'prepare_database', prepared.append)
+    monkeypatch.setattr(Config, 'SESSION_BACKEND', 'sqlite')
+    monkeypatch.setattr(Config, 'WEBHOOK_DEDUP_BACKEND', 'sqlite')
+    runpy.run_path(CONF_PATH)['on_starting'](server(3))
+    monkeypatch.setattr(Config, 'SESSION_BACKEND', 'memory')
+    runpy.run_path(CONF_PATH)['on_starting'](server(1))
+    assert prepared == [Config, Config]
@@ -0,0 +1,37 @@
+import pytest
+
+def revalidate(client, url):
+    first = client.get(url)
+    assert first.status_code == 200 and first.headers['ETag']
+    again = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert again.data == b''
+    assert again.headers['ETag'] == first.headers['ETag']
+    return first.headers['ETag']
+
+def test_menu_is_revalidated_until_a_menu_sync(admin_client):
+    etag = revalidate(admin_client, '/menu')
+    unchanged = admin_client.post('/api/menu/sync', data='name,price\nChicken Biryani,350\n', content_type='text/csv')
+    assert unchanged.get_json()['unchanged'] == 1
+    assert revalidate(admin_client, '/menu') == etag
+    synced = admin_client.post('/api/menu/sync', data='name,price\nChicken Biryani,399\n', content_type='text/csv')
+    assert synced.get_json()['updated'] == 1
+    response = admin_client.get('/menu', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.headers['ETag'] != etag
+    assert any(item['name'] == 'Chicken Biryani' and item['price'] == 399 for item in response.get_json())
+
+@pytest.mark.parametrize('url', ['/orders', '/api/orders', '/api/orders?limit=1', '/api/analytics?period=week'])
+def test_order_lists_and_reports_change_etag_on_order_writes(admin_client, place_order, url):
+    place_order()
+    etag = revalidate(admin_client, url)
+    order_id = place_order()
+    response = admin_client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.headers['ETag'] != etag
+    etag = response.headers['ETag']
+    admin_client.post(f'/api/orders/{order_id}/status', json={'status': 'confirmed'})
+    response = admin_client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.headers['ETag'] != etag
+
+def test_admin_endpoints_need_a_login_before_revalidation(app):
+    response = app.test_client().get('/api/orders', headers={'If-None-Match': '*'})
+    assert response.status_code != 304
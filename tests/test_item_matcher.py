@@ -0,0 +1,57 @@
+import io
+import pytest
+from core.item_matcher import ItemMatcher
+from core.menu_manager import MenuManager
+from core.menu_sync import read_menu_file
+
+@pytest.fixture
+def menu(db):
+    manager = MenuManager(db)
+    manager.load_sample_menu()
+    return manager
+
+def names(candidates):
+    return sorted(item['name'] for item in candidates)
+
+@pytest.mark.parametrize('text, expected', [
+    ('biriyani chicken', 'Chicken Biryani'),
+    ('chiken biriyani', 'Chicken Biryani'),
+    ('mango lasi', 'Mango Lassi'),
+    ('lasi', 'Mango Lassi'),
+    ('i want a masala chai please', 'Masala Chai'),
+    ('gulab', 'Gulab Jamun'),
+])
+def test_misspelled_and_partial_names_resolve(menu, text, expected):
+    item, candidates = menu.resolve_item(text)
+    assert item['name'] == expected
+    assert candidates[0]['name'] == expected
+
+def test_a_fragment_shared_by_several_items_returns_candidates_not_a_guess(menu):
+    item, candidates = menu.resolve_item('biriyani')
+    assert item is None
+    assert names(candidates) == ['Chicken Biryani', 'Veg Biryani']
+
+def test_unrelated_text_matches_nothing(menu):
+    assert menu.resolve_item('pizza margherita') == (None, [])
+    assert menu.match_items('') == []
+
+def test_menu_sync_reaches_the_matcher(menu):
+    rows = read_menu_file(io.BytesIO(b'name,price,category\nFilter Coffee,60,Beverages\n'), 'csv')
+    assert menu.sync_items(rows)['inserted'] == 1
+    item, _ = menu.resolve_item('filter cofee')
+    assert item['name'] == 'Filter Coffee'
+    rows = read_menu_file(io.BytesIO(b'[{"name": "Veg Biryani", "available": false}]'), 'json')
+    menu.sync_items(rows)
+    item, candidates = menu.resolve_item('biriyani')
+    assert item['name'] == 'Chicken Biryani'
+
+def test_sync_only_reindexes_items_whose_names_changed():
+    matcher = ItemMatcher()
+    items = [{'id': 1, 'name': 'Mango Lassi', 'price': 90}, {'id': 2, 'name': 'Masala Chai', 'price': 40}]
+    assert matcher.sync(items) == 2
+    assert matcher.sync([dict(items[0], price=95), items[1]]) == 0
+    assert matcher.sync([dict(items[0], name='Sweet Lassi'), items[1]]) == 1
+    assert matcher.resolve('sweet lasi').item_id == 1
+    assert matcher.match('mango') == []
+    assert matcher.sync([items[1]]) == 1
+    assert matcher.match('lassi') == []
@@ -0,0 +1,61 @@
+import io
+import json
+import pytest
+from core.menu_manager import MenuManager
+from core.menu_sync import file_format_for, iter_json_items, read_menu_file
+
+@pytest.fixture
+def menu(db):
+    manager = MenuManager(db)
+    manager.load_sample_menu()
+    return manager
+
+def sync(menu, text, file_format, **kwargs):
+    return menu.sync_items(read_menu_file(io.BytesIO(text.encode()), file_format), **kwargs)
+
+def test_name_keyed_rows_update_items_that_have_a_sku(menu):
+    before = len(menu.get_all_items())
+    summary = sync(menu, 'name,price\nchicken biryani,399\n', 'csv')
+    assert summary == {'inserted': 0, 'updated': 1, 'unchanged': 0, 'disabled': 0}
+    assert len(menu.get_all_items()) == before
+    item, candidates = menu.resolve_item('chicken biryani')
+    assert item['price'] == 399 and item['sku']
+
+def test_name_keyed_availability_toggle_needs_no_category(menu):
+    summary = sync(menu, '[{"name": "Veg Biryani", "available": false}]', 'json')
+    assert summary['updated'] == 1
+    assert all(item['name'] != 'Veg Biryani' for item in menu.get_all_items())
+
+def test_row_with_new_sku_does_not_take_over_an_item_with_another_sku(menu):
+    with pytest.raises(ValueError, match='needs'):
+        sync(menu, 'sku,name,price\nNEW-1,Chicken Biryani,300\n', 'csv')
+
+def test_unknown_name_is_inserted_once(menu):
+    summary = sync(menu, '{"name": "Filter Coffee", "price": 60, "category": "Beverages"}\n\n', 'ndjson')
+    assert summary['inserted'] == 1
+    assert sync(menu, '{"name": "Filter Coffee", "price": 60}\n', 'ndjson')['unchanged'] == 1
+
+def test_json_items_are_decoded_across_chunk_boundaries():
+    items = [{'sku': f'S-{n}', 'name': f'Item {n}', 'price': n * 10.5, 'available': n % 2 == 0} for n in range(50)]
+    for document in (items, {'restaurant': {'name': 'x'}, 'items': items}):
+        stream = io.BytesIO(json.dumps(document, indent=1).encode())
+        assert list(iter_json_items(stream, chunk_size=7)) == items
+    assert list(iter_json_items(io.BytesIO(b'[1, 22, 333]'), chunk_size=1)) == [1, 22, 333]
+    assert list(iter_json_items(io.BytesIO(b'{"version": 2}'))) == []
+
+def test_malformed_json_is_a_value_error():
+    for text in (b'[{"sku": "A"} {"sku": "B"}]', b'[{"sku": "A",', b'"items"'):
+        with pytest.raises(ValueError):
+            list(read_menu_file(io.BytesIO(text), 'json'))
+
+def test_file_format_for():
+    assert [file_format_for(p) for p in ('m.CSV', 'm.jsonl', 'm.ndjson', 'm.json')] == ['csv', 'ndjson', 'ndjson', 'json']
+
+def test_a_bad_row_late_in_the_stream_leaves_the_menu_unchanged(menu):
+    def rows():
+        yield {'name': 'Chicken Biryani', 'price': 999}
+        raise ValueError('item 2: price must not be negative')
+    with pytest.raises(ValueError, match='item 2'):
+        menu.sync_items(rows())
+    item, _ = menu.resolve_item('chicken biryani')
+    assert item['price'] != 999
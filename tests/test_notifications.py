@@ -0,0 +1,90 @@
+import time
+import pytest
+from services.notification_manager import FakeTransport, NotificationManager
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+def outbox(db):
+    with db.get_connection() as conn:
+        return [dict(row) for row in conn.execute('SELECT * FROM notification_outbox ORDER BY id')]
+
+@pytest.fixture
+def manager():
+    started = []
+    def build(db, transport, **kwargs):
+        options = dict(workers=2, rate_per_second=1000, backoff_base=0.01, poll_interval=0.01)
+        options.update(kwargs)
+        started.append(NotificationManager(db, transport, **options))
+        return started[-1]
+    yield build
+    for notifications in started:
+        notifications.stop()
+
+def test_failed_sends_are_retried_until_delivered(db, manager):
+    transport = FakeTransport(fail_times=2)
+    notifications = manager(db, transport)
+    notifications.enqueue('+911', 'hello')
+    wait_for(lambda: transport.sent)
+    wait_for(lambda: outbox(db)[0]['status'] == 'sent')
+    row = outbox(db)[0]
+    assert transport.sent == [('+911', 'hello')]
+    assert row['attempts'] == 3 and row['provider_id'] == 'FAKE1' and row['last_error'] is None
+    assert notifications.stats()['retried'] == 2
+
+def test_a_failure_backs_off_before_the_next_attempt(db, manager):
+    notifications = manager(db, FakeTransport(fail_times=1), backoff_base=60)
+    notifications.enqueue('+911', 'hello')
+    wait_for(lambda: outbox(db)[0]['attempts'] == 1)
+    row = outbox(db)[0]
+    assert row['status'] == 'pending' and row['last_error'] == 'fake transport failure'
+    assert row['next_attempt_at'] >= time.time() + 55
+    assert notifications.dispatch_due() == 0
+
+def test_gives_up_after_max_attempts(db, manager):
+    transport = FakeTransport(fail_times=10)
+    notifications = manager(db, transport, max_attempts=3)
+    notifications.enqueue('+911', 'hello')
+    wait_for(lambda: outbox(db)[0]['status'] == 'failed')
+    assert outbox(db)[0]['attempts'] == 3 and not transport.sent
+
+def test_pending_rows_from_a_previous_process_are_sent_after_start(db, manager):
+    with db.get_connection() as conn:
+        manager(db, FakeTransport()).enqueue('+911', 'left over', conn=conn)
+        conn.commit()
+    transport = FakeTransport()
+    manager(db, transport).start()
+    wait_for(lambda: transport.sent)
+    assert transport.sent == [('+911', 'left over')]
+
+def test_a_number_gets_its_messages_in_order_despite_retries(db, manager):
+    transport = FakeTransport(fail_times=1)
+    notifications = manager(db, transport)
+    for text in ('one', 'two', 'three'):
+        notifications.enqueue('+911', text)
+    wait_for(lambda: len(transport.sent) == 3)
+    assert [body for _, body in transport.sent] == ['one', 'two', 'three']
+
+def test_status_change_and_customer_update_share_a_transaction(app):
+    shard = app.extensions['orderbot'].resolve()
+    shard.user_manager.get_or_create_user('+911')
+    item = shard.menu_manager.get_all_items()[0]
+    order_id = shard.order_manager.create_order(
+        '+911', {str(item['id']): {'name': item['name'], 'price': item['price'], 'quantity': 1}}, 'addr')
+    original = shard.order_manager._mark_changed
+    def fail(conn, order_id):
+        raise RuntimeError('crash before commit')
+    shard.order_manager._mark_changed = fail
+    with pytest.raises(RuntimeError):
+        shard.order_manager.update_order_status(order_id, 'confirmed')
+    assert outbox(shard.db) == []
+    shard.order_manager._mark_changed = original
+    shard.order_manager.update_order_status(order_id, 'confirmed')
+    shard.order_manager.update_order_status(order_id, 'confirmed')
+    rows = outbox(shard.db)
+    assert [row['dedup_key'] for row in rows] == [f'order-{order_id}-confirmed']
+    wait_for(lambda: shard.notification_manager.transport.sent)
+    shard.notification_manager.stop()
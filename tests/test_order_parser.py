@@ -0,0 +1,71 @@
+import pytest
+from core.menu_manager import MenuManager
+from core.order_parser import OrderParser, split_quantity
+
+@pytest.fixture
+def menu(db):
+    manager = MenuManager(db)
+    manager.load_sample_menu()
+    manager.sync_items([
+        {'sku': 'STR-65', 'name': 'Chicken 65', 'price': 240, 'category': 'Starters'},
+        {'sku': 'BEV-7UP', 'name': '7 Up', 'price': 40, 'category': 'Beverages'},
+        {'sku': 'STR-KEBAB-47', 'name': 'Classic Prawn Kebab 47', 'price': 420, 'category': 'Starters'},
+    ])
+    return manager
+
+@pytest.fixture
+def parser(menu):
+    return OrderParser(menu, max_quantity=50)
+
+def lines(order):
+    return {item['name']: quantity for item, quantity in order.lines}
+
+def test_multi_item_message(parser):
+    order = parser.parse('2 chicken biryani, 1 mango lassi and 3 gulab jamun')
+    assert lines(order) == {'Chicken Biryani': 2, 'Mango Lassi': 1, 'Gulab Jamun': 3}
+    assert order.multi and not order.unresolved
+
+@pytest.mark.parametrize('text', ['2x chicken biryani', '2 x chicken biryani', 'chicken biryani x2',
+                                  'chicken biryani 2', 'two chicken biryani', '2 plates of chicken biryani'])
+def test_quantity_forms(parser, text):
+    assert lines(parser.parse(text)) == {'Chicken Biryani': 2}
+
+def test_repeated_items_are_added_up(parser):
+    assert lines(parser.parse('1 mango lassi, mango lassi x2')) == {'Mango Lassi': 3}
+
+def test_a_lone_item_name_is_not_an_order_line(parser):
+    order = parser.parse('chicken biryani')
+    assert not order.multi and lines(order) == {'Chicken Biryani': 1}
+
+def test_zero_quantity_is_unresolved(parser):
+    order = parser.parse('0 chicken biryani, 1 mango lassi')
+    assert lines(order) == {'Mango Lassi': 1}
+    assert [fragment.text for fragment in order.unresolved] == ['0 x Chicken Biryani (at least 1)']
+
+def test_quantity_above_the_limit_is_unresolved(parser):
+    order = parser.parse('51 gulab jamun')
+    assert order.lines == [] and order.multi
+    assert order.unresolved[0].text == '51 x Gulab Jamun (at most 50 at a time)'
+    assert lines(parser.parse('50 gulab jamun')) == {'Gulab Jamun': 50}
+
+@pytest.mark.parametrize('text, expected', [
+    ('Classic Prawn Kebab 47', {'Classic Prawn Kebab 47': 1}),
+    ('chicken 65', {'Chicken 65': 1}),
+    ('7 up', {'7 Up': 1}),
+    ('2 chicken 65', {'Chicken 65': 2}),
+    ('chicken 65 x3', {'Chicken 65': 3}),
+    ('3 7 up, 2 Classic Prawn Kebab 47', {'7 Up': 3, 'Classic Prawn Kebab 47': 2}),
+    ('7 up 2', {'7 Up': 2}),
+])
+def test_item_names_containing_numbers(parser, text, expected):
+    order = parser.parse(text)
+    assert lines(order) == expected and not order.unresolved
+
+def test_unknown_fragments_are_reported(parser):
+    order = parser.parse('2 chicken biryani, 3 pizzas')
+    assert lines(order) == {'Chicken Biryani': 2}
+    assert [fragment.text for fragment in order.unresolved] == ['pizzas']
+
+def test_split_quantity_leaves_bare_numbers_alone():
+    assert split_quantity('12') == (None, '12')
+    assert split_quantity('three lassi') == (3, 'lassi')
@@ -0,0 +1,81 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from core.order_writer import GroupCommitWriter
+
+@pytest.fixture
+def table(db):
+    with db.get_connection() as conn:
+        conn.execute('CREATE TABLE writes (n INTEGER UNIQUE)')
+        conn.commit()
+    return db
+
+def insert(n):
+    def write(conn):
+        conn.execute('INSERT INTO writes (n) VALUES (?)', (n,))
+        return n
+    return write
+
+def stored(db):
+    with db.get_connection() as conn:
+        return sorted(row[0] for row in conn.execute('SELECT n FROM writes'))
+
+def test_a_single_write_commits_and_returns_its_result(table):
+    writer = GroupCommitWriter(table)
+    assert writer.submit(insert(1)) == 1
+    assert stored(table) == [1]
+    assert writer.stats()['batches'] == 1
+
+def test_concurrent_writes_share_commits(table):
+    writer = GroupCommitWriter(table, window=0.05, max_batch=64)
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(lambda n: writer.submit(insert(n)), range(16)))
+    assert results == list(range(16))
+    assert stored(table) == list(range(16))
+    stats = writer.stats()
+    assert stats['writes'] == 16 and stats['batches'] < 16 and stats['largest_batch'] > 1
+
+def test_batches_are_capped_at_max_batch(table):
+    writer = GroupCommitWriter(table, window=0.05, max_batch=3)
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        list(executor.map(lambda n: writer.submit(insert(n)), range(10)))
+    assert stored(table) == list(range(10))
+    assert writer.stats()['largest_batch'] <= 3
+
+def test_a_failed_write_does_not_undo_the_rest_of_its_batch(table):
+    writer = GroupCommitWriter(table, window=0.1)
+    def duplicate_then_fail(conn):
+        conn.execute('INSERT INTO writes (n) VALUES (100)')
+        raise ValueError('bad order')
+    outcomes = {}
+    def run(name, write):
+        try:
+            outcomes[name] = writer.submit(write)
+        except ValueError as e:
+            outcomes[name] = e
+    threads = [threading.Thread(target=run, args=(name, write))
+               for name, write in (('a', insert(1)), ('bad', duplicate_then_fail), ('b', insert(2)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert outcomes['a'] == 1 and outcomes['b'] == 2
+    assert isinstance(outcomes['bad'], ValueError)
+    # The failing write's own statements are rolled back with it.
+    assert stored(table) == [1, 2]
+    stats = writer.stats()
+    assert stats['failed'] == 1 and stats['batches'] == 1
+
+def test_a_failed_commit_fails_every_write_in_the_batch(table, monkeypatch):
+    writer = GroupCommitWriter(table)
+    def commit(conn):
+        raise RuntimeError('disk full')
+    with table.get_connection() as conn:
+        # The writer reuses this thread's checked-out connection.
+        monkeypatch.setattr(type(conn), 'commit', commit)
+        with pytest.raises(RuntimeError, match='disk full'):
+            writer.submit(insert(1))
+    monkeypatch.undo()
+    assert stored(table) == []
+    assert writer.submit(insert(2)) == 2
+    assert writer.stats()['failed'] == 1
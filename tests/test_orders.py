@@ -0,0 +1,104 @@
+import csv
+import gzip
+import io
+import json
+import pytest
+
+def services(app):
+    return app.extensions['orderbot'].resolve()
+
+def place_order(app, phone='+911'):
+    shard = services(app)
+    shard.user_manager.get_or_create_user(phone)
+    item = shard.menu_manager.get_all_items()[0]
+    return shard.order_manager.create_order(
+        phone, {str(item['id']): {'name': item['name'], 'price': item['price'], 'quantity': 2}}, '12 Main Street')
+
+def stream_events(response):
+    events = []
+    for block in b''.join(response.response).decode().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if ': ' in line and not line.startswith(':'))
+        if fields.get('event') == 'order':
+            events.append(json.loads(fields['data']))
+    return events
+
+def test_stream_sends_orders_with_the_same_line_items_as_the_order_list(app, admin_client):
+    place_order(app)
+    listed = admin_client.get('/api/orders').get_json()['orders']
+    streamed = stream_events(admin_client.get('/api/orders/stream?since=0'))
+    assert [order['id'] for order in streamed] == [order['id'] for order in listed]
+    assert streamed[0]['items'] == listed[0]['items']
+    assert streamed[0]['items'][0]['quantity'] == 2 and streamed[0]['items'][0]['name']
+
+def test_streams_over_the_per_worker_cap_get_a_retry_hint(app, admin_client):
+    first = admin_client.get('/api/orders/stream', buffered=False)
+    assert first.status_code == 200
+    refused = admin_client.get('/api/orders/stream')
+    assert refused.status_code == 503
+    assert refused.headers['Retry-After']
+    assert refused.get_data(as_text=True).startswith('retry: ')
+    first.close()
+    again = admin_client.get('/api/orders/stream', buffered=False)
+    assert again.status_code == 200
+    again.close()
+    assert app.extensions['order_stream_limiter'].stats()['in_flight'] == 0
+
+def test_order_pages_continue_across_identical_timestamps(app, admin_client, place_order):
+    ids = [place_order('2024-05-01 10:00') for _ in range(5)] + [place_order('2024-05-02 09:30') for _ in range(2)]
+    ids.append(place_order('2024-04-30 23:59'))
+    expected = [ids[6], ids[5], *reversed(ids[:5]), ids[7]]
+    for limit in (1, 2, 3, 8, 9):
+        seen, cursor = [], None
+        while True:
+            url = f'/api/orders?limit={limit}' + (f'&cursor={cursor}' if cursor else '')
+            body = admin_client.get(url).get_json()
+            assert len(body['orders']) <= limit
+            seen.extend(order['id'] for order in body['orders'])
+            cursor = body['next_cursor']
+            if cursor is None:
+                break
+        assert seen == expected
+    first = app.test_client().get('/orders?limit=3')
+    rest = app.test_client().get(f"/orders?limit=10&cursor={first.headers['X-Next-Cursor']}")
+    assert [order['id'] for order in first.get_json() + rest.get_json()] == expected
+    assert 'X-Next-Cursor' not in rest.headers
+
+@pytest.mark.parametrize('cursor', ['not-a-cursor', 'WzFd', 'WyIyMDI0LTA1LTAxIiwieCJd'])
+def test_invalid_cursor_is_a_bad_request(app, admin_client, place_order, cursor):
+    place_order()
+    assert admin_client.get(f'/api/orders?cursor={cursor}').status_code == 400
+    assert app.test_client().get(f'/orders?cursor={cursor}').status_code == 400
+
+def export_rows(client, query):
+    response = client.get(f'/api/orders/export?{query}')
+    assert response.status_code == 200
+    data = b''.join(response.response)
+    if 'gzip=1' in query:
+        assert response.mimetype == 'application/gzip'
+        data = gzip.decompress(data)
+    if 'format=ndjson' in query:
+        return [json.loads(line) for line in data.decode().splitlines()]
+    return list(csv.DictReader(io.StringIO(data.decode())))
+
+def order_count(app, status=None):
+    with services(app).db.get_connection() as conn:
+        if status:
+            return conn.execute('SELECT COUNT(*) FROM orders WHERE status = ?', (status,)).fetchone()[0]
+        return conn.execute('SELECT COUNT(*) FROM orders').fetchone()[0]
+
+@pytest.mark.parametrize('query', ['format=csv', 'format=ndjson', 'format=csv&gzip=1', 'format=ndjson&gzip=1'])
+def test_export_has_one_row_per_order(app, admin_client, place_order, query):
+    ids = [place_order(f'2024-05-0{day} 1{day}:00', quantity=day) for day in range(1, 8)]
+    for order_id in ids[:3]:
+        services(app).order_manager.update_order_status(order_id, 'delivered')
+    rows = export_rows(admin_client, query)
+    assert len(rows) == order_count(app) == 7
+    key = 'id' if 'ndjson' in query else 'Order ID'
+    assert [int(row[key]) for row in rows] == ids
+    assert len(export_rows(admin_client, f'{query}&status=delivered')) == order_count(app, 'delivered') == 3
+    services(app).order_manager.archive_orders('2024-06-01')
+    assert order_count(app) == 4
+    assert len(export_rows(admin_client, query)) == 7
+
+def test_export_rejects_unknown_formats(admin_client):
+    assert admin_client.get('/api/orders/export?format=xml').status_code == 400
@@ -0,0 +1,82 @@
+import os
+from types import SimpleNamespace
+import pytest
+from core import rate_limiter
+from core.rate_limiter import ALLOWED, LIMITED, SHED, WebhookLimiter
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter, 'time', SimpleNamespace(monotonic=clock))
+    return clock
+
+def send(limiter, key):
+    outcome, first = limiter.acquire(key)
+    if outcome == ALLOWED:
+        limiter.release()
+    return outcome, first
+
+def test_burst_then_limited_with_a_single_warning(clock):
+    limiter = WebhookLimiter(rate=1.0, burst=3)
+    assert [send(limiter, '+911')[0] for _ in range(3)] == [ALLOWED] * 3
+    assert send(limiter, '+911') == (LIMITED, True)
+    assert send(limiter, '+911') == (LIMITED, False)
+    assert send(limiter, '+912') == (ALLOWED, None)
+    assert limiter.stats()['limited'] == 2
+
+def test_tokens_refill_at_the_configured_rate(clock):
+    limiter = WebhookLimiter(rate=2.0, burst=2)
+    send(limiter, '+911')
+    send(limiter, '+911')
+    assert send(limiter, '+911')[0] == LIMITED
+    clock.now += 0.5
+    assert send(limiter, '+911') == (ALLOWED, None)
+    assert send(limiter, '+911')[0] == LIMITED
+    clock.now += 10
+    assert [send(limiter, '+911')[0] for _ in range(3)] == [ALLOWED, ALLOWED, LIMITED]
+    # Back under the limit, the next rejection warns again.
+    assert limiter.acquire('+911') == (LIMITED, False)
+    clock.now += 0.5
+    send(limiter, '+911')
+    assert limiter.acquire('+911') == (LIMITED, True)
+
+def test_messages_past_the_concurrency_cap_are_shed_without_spending_tokens(clock):
+    limiter = WebhookLimiter(rate=1.0, burst=2, max_concurrent=1)
+    assert limiter.acquire('+911') == (ALLOWED, None)
+    assert limiter.acquire('+912') == (SHED, None)
+    assert limiter.acquire('+912') == (SHED, None)
+    limiter.release()
+    assert [send(limiter, '+912')[0] for _ in range(3)] == [ALLOWED, ALLOWED, LIMITED]
+    assert limiter.stats()['shed'] == 2 and limiter.stats()['in_flight'] == 0
+
+def test_zero_rate_and_cap_disable_the_limits(clock):
+    limiter = WebhookLimiter(rate=0, max_concurrent=0)
+    assert all(limiter.acquire('+911')[0] == ALLOWED for _ in range(100))
+    assert limiter.stats()['tracked_numbers'] == 0
+
+def test_idle_buckets_expire_and_the_table_is_bounded(clock):
+    limiter = WebhookLimiter(rate=1.0, burst=5, max_entries=3)
+    for n in range(5):
+        send(limiter, f'+91{n}')
+    assert limiter.stats()['tracked_numbers'] == 3 and limiter.stats()['evicted'] == 2
+    clock.now += 5
+    send(limiter, '+999')
+    stats = limiter.stats()
+    assert stats['tracked_numbers'] == 1 and stats['expired'] == 3
+
+def test_webhook_tells_a_flooding_number_to_slow_down_once(app):
+    app.extensions['webhook_limiter'] = WebhookLimiter(rate=0.001, burst=2)
+    client = app.test_client()
+    def post(body):
+        return client.post('/webhook', data={'From': 'whatsapp:+911', 'Body': body,
+                                             'MessageSid': os.urandom(6).hex()}).get_data(as_text=True)
+    assert 'Welcome' in post('hi')
+    post('menu')
+    assert 'too fast' in post('hi')
+    assert '<Message>' not in post('hi')
@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+import pytest
+from core import session_store
+from core.session_store import MemorySessionBackend, Session, SessionStore, create_session_store
+from utils.constants import USER_STATES
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(session_store, 'time', SimpleNamespace(monotonic=clock, time=clock))
+    return clock
+
+def cart_session(item_id=1, quantity=2):
+    return Session(USER_STATES['ADDING_TO_CART'], {item_id: quantity})
+
+def test_session_round_trips_through_json():
+    session = Session(USER_STATES['ADDING_TO_CART'], {3: 2, 7: 1}, current_item_id=3, location='12 Main Street')
+    loaded = Session.loads(session.dumps())
+    assert (loaded.state, loaded.cart, loaded.current_item_id, loaded.location) == \
+        (session.state, session.cart, session.current_item_id, session.location)
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_sessions_expire_after_ttl(backend, db, clock):
+    store = create_session_store(backend, database=db, ttl=60)
+    store.save('+911', cart_session())
+    clock.now += 59
+    assert store.get('+911').cart == {1: 2}
+    store.save('+911', cart_session(quantity=3))
+    clock.now += 59
+    assert store.get('+911').cart == {1: 3}
+    clock.now += 2
+    assert store.get('+911').cart == {}
+    assert store.stats()['expired'] == 1
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_idle_sessions_are_not_stored(backend, db):
+    store = create_session_store(backend, database=db)
+    store.save('+911', cart_session())
+    store.save('+911', Session())
+    assert store.stats()['size'] == 0
+
+def test_memory_backend_evicts_least_recently_used(clock):
+    store = SessionStore(MemorySessionBackend(ttl=60, max_entries=2))
+    store.save('+911', cart_session(1))
+    store.save('+912', cart_session(2))
+    store.get('+911')
+    store.save('+913', cart_session(3))
+    assert store.get('+912').cart == {}
+    assert store.get('+911').cart == {1: 2} and store.get('+913').cart == {3: 2}
+    assert store.stats()['evicted'] == 1 and store.stats()['size'] == 2
+
+def test_sqlite_sessions_are_shared_and_swept(db, clock):
+    worker_a = create_session_store('sqlite', database=db, ttl=60)
+    worker_b = create_session_store('sqlite', database=db, ttl=60)
+    worker_a.save('+911', cart_session())
+    assert worker_b.get('+911').cart == {1: 2}
+    clock.now += 61
+    assert worker_b.backend.sweep() == 1
+    assert worker_a.stats()['size'] == 0
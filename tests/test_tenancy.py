@@ -0,0 +1,52 @@
+import json
+import re
+import pytest
+from config import Config
+from core import order_manager
+from core.tenancy import ShardMap
+from services import analytics
+from services.performance_monitor import PerformanceMonitor
+
+@pytest.fixture
+def tenants(tmp_path, monkeypatch):
+    entries = [{'slug': slug, 'name': slug, 'database': str(tmp_path / f'{slug}.db')} for slug in ('north', 'south')]
+    entries.append({'slug': 'east-side', 'name': 'East Side', 'database': str(tmp_path / 'east-side.db')})
+    (tmp_path / 'tenants.json').write_text(json.dumps(entries))
+    monkeypatch.setattr(Config, 'TENANTS_FILE', str(tmp_path / 'tenants.json'))
+    monkeypatch.setattr(Config, 'ORDER_ARCHIVE_DIR', str(tmp_path / 'archive'))
+    return tmp_path
+
+def test_select_returns_every_shard_or_one(tenants):
+    shards = ShardMap.from_config(Config)
+    assert [slug for slug, _ in shards.select()] == ['north', 'south', 'east-side']
+    assert [slug for slug, _ in shards.select('south')] == ['south']
+    with pytest.raises(KeyError):
+        shards.select('east')
+    shards.close()
+
+def test_maintenance_commands_cover_every_tenant(tenants, capsys):
+    assert order_manager.main(['migrate-items']) == 0
+    assert analytics.main(['backfill']) == 0
+    output = capsys.readouterr().out
+    assert 'north: migrated' in output and 'south: rebuilt' in output
+    assert (tenants / 'north.db').exists() and (tenants / 'south.db').exists()
+
+def test_tenant_option_limits_a_command_to_one_outlet(tenants, capsys):
+    assert analytics.main(['backfill', '--tenant', 'south']) == 0
+    assert capsys.readouterr().out.startswith('south:')
+    assert not (tenants / 'north.db').exists()
+    assert order_manager.main(['archive', '--tenant', 'east']) == 1
+
+def test_tenant_metrics_share_names_and_carry_a_tenant_label(tenants):
+    shards = ShardMap.from_config(Config)
+    monitor = PerformanceMonitor()
+    shards.register_collectors(monitor)
+    lines = monitor.render_prometheus().splitlines()
+    shards.close()
+    samples = [line for line in lines if not line.startswith('#')]
+    assert all(re.match(r'[a-zA-Z_:][a-zA-Z0-9_:]*(\{[^}]*\})? \S+$', line) for line in samples)
+    pool = [line.split(' ')[0] for line in samples if line.startswith('orderbot_db_pool_checkouts{')]
+    assert pool == [f'orderbot_db_pool_checkouts{{tenant="{slug}"}}' for slug in ('east-side', 'north', 'south')]
+    types = [line for line in lines if line.startswith('# TYPE')]
+    assert len(types) == len(set(types))
+    assert '# TYPE orderbot_db_pool_checkouts gauge' in types
@@ -0,0 +1,20 @@
+USER_STATES = {
+    'MENU_BROWSING': 'menu_browsing',
+    'ADDING_TO_CART': 'adding_to_cart',
+    'QUANTITY_INPUT': 'quantity_input',
+    'LOCATION_INPUT': 'location_input',
+    'ORDER_CONFIRMATION': 'order_confirmation'
+}
+
+ORDER_STATUSES = ['pending', 'confirmed', 'preparing', 'out_for_delivery', 'delivered', 'cancelled']
+
+# Only orders that can no longer change are moved to the archive.
+ARCHIVED_ORDER_STATUSES = ['delivered', 'cancelled']
+
+ORDER_STATUS_MESSAGES = {
+    'confirmed': "👍 Your order #{order_id} has been confirmed by the restaurant.",
+    'preparing': "👨‍🍳 Your order #{order_id} is being prepared.",
+    'out_for_delivery': "🛵 Your order #{order_id} is out for delivery!",
+    'delivered': "✅ Your order #{order_id} has been delivered. Enjoy your meal!",
+    'cancelled': "❌ Your order #{order_id} has been cancelled. Reply 'menu' to order again.",
+}
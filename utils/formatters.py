@@ -0,0 +1,50 @@
+import csv
+import io
+import json
+import zlib
+
+def format_line_items(items):
+    return '; '.join(f"{item['quantity']}x {item['name']}" for item in items)
+
+def iter_csv(header, rows, rows_per_chunk=500):
+    # Yields the CSV a chunk of rows at a time so the full export never has
+    # to exist in memory.
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % rows_per_chunk == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def iter_ndjson(records, records_per_chunk=500):
+    lines = []
+    for record in records:
+        lines.append(json.dumps(record, default=str, separators=(',', ':')))
+        if len(lines) >= records_per_chunk:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+def iter_gzip(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def format_sse_event(event, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append('data: ' + json.dumps(data, default=str, separators=(',', ':')))
+    return '\n'.join(lines) + '\n\n'
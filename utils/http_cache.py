@@ -0,0 +1,61 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from flask import Response, request
+
+class ResponseCache:
+    # Serialized JSON bodies keyed by request and data version. A request
+    # whose If-None-Match still matches is answered with 304 before the
+    # body is built; otherwise the bytes for the current version are
+    # reused until a write bumps the version.
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'not_modified': 0}
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+    def respond(self, key, version, build, updated_at=None, cache_control='no-cache'):
+        # ``build`` returns (payload, headers) and only runs on a miss.
+        etag = hashlib.sha1(f'{key}\0{version}'.encode()).hexdigest()
+        last_modified = datetime.fromtimestamp(int(updated_at), timezone.utc) if updated_at else None
+        if self._not_modified(etag, last_modified):
+            self._count('not_modified')
+            response = Response(status=304)
+        else:
+            with self._lock:
+                entry = self._entries.get((key, version))
+                if entry is not None:
+                    self._entries.move_to_end((key, version))
+            if entry is None:
+                self._count('misses')
+                payload, headers = build()
+                entry = (json.dumps(payload, default=str, separators=(',', ':')).encode(), tuple((headers or {}).items()))
+                with self._lock:
+                    self._entries[(key, version)] = entry
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            else:
+                self._count('hits')
+            body, headers = entry
+            response = Response(body, mimetype='application/json')
+            response.headers.extend(headers)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = cache_control
+        if last_modified:
+            response.last_modified = last_modified
+        return response
+    @staticmethod
+    def _not_modified(etag, last_modified):
+        if request.if_none_match:
+            return request.if_none_match.contains(etag)
+        since = request.if_modified_since
+        return bool(since and last_modified and last_modified <= since)
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        return stats
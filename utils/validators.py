@@ -0,0 +1,35 @@
+from datetime import datetime
+from utils.constants import ORDER_STATUSES
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def parse_date(value, field):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f'{field} must be a date in YYYY-MM-DD format')
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError('limit must be a number')
+    if limit <= 0:
+        raise ValueError('limit must be greater than 0')
+    return min(limit, maximum)
+
+def parse_order_filters(args):
+    status = args.get('status') or None
+    if status is not None and status not in ORDER_STATUSES:
+        raise ValueError(f'Unknown order status: {status}')
+    return {
+        'status': status,
+        'user_phone': args.get('phone') or None,
+        'start_date': parse_date(args.get('start_date'), 'start_date'),
+        'end_date': parse_date(args.get('end_date'), 'end_date'),
+    }